@@ -0,0 +1,124 @@
+"""
+Admission control under a burst of chat requests (``clinical_rag.admission``).
+
+A simulated upstream LLM slows down linearly once more than ``--capacity``
+calls run at once and answers "429 rate limited" above ``--rate-limit``
+concurrent calls. One client bursts ``--burst`` requests while a second,
+interactive client sends a request every 200 ms. Runs with and without the
+admission controller; per client: completed, shed (Overloaded) and upstream
+errors, latency percentiles and queue wait.
+
+Usage:
+    python benchmarks/bench_admission.py [--burst 200] [--capacity 8] [--rate-limit 24]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict
+
+from common import latency_summary
+
+
+class SimulatedUpstream:
+    """LLM endpoint whose latency grows with concurrency and which rate-limits."""
+
+    def __init__(self, base_s: float, capacity: int, rate_limit: int):
+        self.base_s = base_s
+        self.capacity = capacity
+        self.rate_limit = rate_limit
+        self.running = 0
+        self.peak = 0
+
+    async def call(self):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            if self.running > self.rate_limit:
+                await asyncio.sleep(0.01)
+                raise RuntimeError("429 rate limited")
+            await asyncio.sleep(self.base_s * max(1.0, self.running / self.capacity))
+        finally:
+            self.running -= 1
+
+
+async def run(args, admission) -> dict:
+    from clinical_rag.admission import Overloaded
+
+    upstream = SimulatedUpstream(args.base_ms / 1000, args.capacity, args.rate_limit)
+    latencies, waits = defaultdict(list), defaultdict(list)
+    counts = defaultdict(lambda: defaultdict(int))
+
+    async def request(client: str):
+        t0 = time.perf_counter()
+        try:
+            if admission is None:
+                await upstream.call()
+            else:
+                async with admission.slot(client) as waited:
+                    waits[client].append(waited)
+                    await upstream.call()
+            latencies[client].append(time.perf_counter() - t0)
+            counts[client]["ok"] += 1
+        except Overloaded:
+            counts[client]["shed"] += 1
+        except RuntimeError:
+            counts[client]["upstream_error"] += 1
+
+    async def interactive():
+        tasks = []
+        for _ in range(args.interactive):
+            tasks.append(asyncio.create_task(request("interactive")))
+            await asyncio.sleep(0.2)
+        await asyncio.gather(*tasks)
+
+    start = time.perf_counter()
+    await asyncio.gather(interactive(), *(request("burst") for _ in range(args.burst)))
+    return {
+        "admission": admission is not None,
+        "elapsed_s": round(time.perf_counter() - start, 2),
+        "upstream_peak_concurrency": upstream.peak,
+        "clients": {
+            client: {
+                **dict(counts[client]),
+                "latency": latency_summary(latencies[client]) if latencies[client] else None,
+                "queue_wait": latency_summary(waits[client]) if waits[client] else None,
+            }
+            for client in ("burst", "interactive")
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--burst", type=int, default=200)
+    parser.add_argument("--interactive", type=int, default=20)
+    parser.add_argument("--base-ms", type=float, default=500)
+    parser.add_argument("--capacity", type=int, default=8, help="Upstream calls before latency grows")
+    parser.add_argument("--rate-limit", type=int, default=24, help="Upstream calls before 429s")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--queue-depth", type=int, default=32)
+    parser.add_argument("--max-per-client", type=int, default=24)
+    parser.add_argument("--queue-timeout", type=float, default=10)
+    args = parser.parse_args()
+
+    from clinical_rag.admission import AdmissionController
+
+    results = [asyncio.run(run(args, None))]
+    results.append(asyncio.run(run(args, AdmissionController(
+        args.max_in_flight, args.queue_depth, args.max_per_client, args.queue_timeout,
+    ))))
+
+    print(f"\n{'admission':<11}{'client':<13}{'ok':>6}{'shed':>6}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'wait p99':>10}")
+    for r in results:
+        for client, c in r["clients"].items():
+            latency, wait = c["latency"] or {}, c["queue_wait"] or {}
+            print(f"{str(r['admission']):<11}{client:<13}{c.get('ok', 0):>6}{c.get('shed', 0):>6}"
+                  f"{c.get('upstream_error', 0):>8}{latency.get('p50_ms', 0):>10.0f}{latency.get('p99_ms', 0):>10.0f}"
+                  f"{wait.get('p99_ms', 0):>10.0f}")
+    print(json.dumps({"benchmark": "admission", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Section-aware chunking (``clinical_rag.chunking``): embedding coverage and
+retrieval precision / prompt size.
+
+Coverage: per doc type, the share of documents longer than the embedding
+model's input limit and the share of their tokens that actually get
+embedded, for whole documents vs ``##`` sections (model tokenizer).
+
+With ``--index whole=<folder> --index sections=<folder>`` (builds with and
+without ``--no-section-chunks``) the labelled questions of
+``bench_retrieval_quality`` are run against each index: recall@k / nDCG@k
+on source documents and the context tokens sent to the LLM.
+
+Usage:
+    python benchmarks/bench_chunking.py [--index whole=faiss_index_whole --index sections=faiss_index_optimized] [--k 12]
+"""
+
+import argparse
+import json
+import os
+from collections import defaultdict
+
+from common import EMBEDDING_MODEL, ROOT, load_embeddings, load_store, parent_key
+
+
+def coverage(tokenizer, max_tokens: int) -> list:
+    from clinical_rag.chunking import CHUNKED_DOC_TYPES, split_document
+    from clinical_rag.corpus import load_documents
+
+    documents, _ = load_documents(os.path.join(ROOT, "consolidated_data"), chunk_sections=False)
+    stats = defaultdict(lambda: defaultdict(int))
+    for doc in documents:
+        doc_type = doc.metadata.get("doc_type")
+        if doc_type not in CHUNKED_DOC_TYPES:
+            continue
+        for mode, texts in (("whole", [doc.page_content]),
+                            ("sections", [c.page_content for c in split_document(doc)])):
+            s = stats[(doc_type, mode)]
+            s["documents"] += 1
+            lengths = [len(tokenizer.tokenize(t)) for t in texts]
+            s["entries"] += len(texts)
+            s["tokens"] += sum(lengths)
+            s["embedded_tokens"] += sum(min(n, max_tokens) for n in lengths)
+            s["truncated"] += any(n > max_tokens for n in lengths)
+    return [
+        {
+            "doc_type": doc_type,
+            "mode": mode,
+            "documents": s["documents"],
+            "index_entries": s["entries"],
+            "truncated_pct": round(100 * s["truncated"] / s["documents"], 1),
+            "embedded_pct": round(100 * s["embedded_tokens"] / s["tokens"], 1),
+        }
+        for (doc_type, mode), s in sorted(stats.items())
+    ]
+
+
+def retrieval(name: str, folder: str, embeddings, labels: list, k: int) -> dict:
+    from bench_retrieval_quality import ndcg_at_k, recall_at_k
+    from clinical_rag.prompts import estimate_tokens
+    from clinical_rag.retrieval import RetrievalConfig, RetrievalEngine
+
+    engine = RetrievalEngine(load_store(folder, embeddings), RetrievalConfig(k=k, cache_size=0))
+    recalls, ndcgs, tokens = [], [], []
+    for label in labels:
+        docs = engine.retrieve(label["question"], k=k, study_filter=label["study_filter"])
+        keys = list(dict.fromkeys(parent_key(d) for d in docs))
+        recalls.append(recall_at_k(keys, label["relevant"], k))
+        ndcgs.append(ndcg_at_k(keys, label["relevant"], k))
+        tokens.append(estimate_tokens(engine.format_context(docs)))
+    return {
+        "index": name,
+        "entries": engine.vector_store.index.ntotal,
+        f"recall@{k}": round(sum(recalls) / len(recalls), 4),
+        f"ndcg@{k}": round(sum(ndcgs) / len(ndcgs), 4),
+        "context_tokens_mean": round(sum(tokens) / len(tokens)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--index", action="append", default=[], help="Index to compare: name=folder")
+    parser.add_argument("--k", type=int, default=12)
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+    max_tokens = 256  # all-MiniLM-L6-v2 max_seq_length (incl. special tokens, ignored here)
+    coverage_results = coverage(tokenizer, max_tokens)
+    print(f"\n{'doc_type':<16}{'mode':<10}{'docs':>7}{'entries':>9}{'truncated':>11}{'embedded':>10}")
+    for r in coverage_results:
+        print(f"{r['doc_type']:<16}{r['mode']:<10}{r['documents']:>7}{r['index_entries']:>9}"
+              f"{r['truncated_pct']:>10.1f}%{r['embedded_pct']:>9.1f}%")
+
+    retrieval_results = []
+    if args.index:
+        from bench_retrieval_quality import build_labels
+
+        labels = build_labels()
+        embeddings = load_embeddings()
+        retrieval_results = [
+            retrieval(name, folder, embeddings, labels, args.k)
+            for name, folder in (spec.split("=", 1) for spec in args.index)
+        ]
+        print(f"\n{'index':<12}{'entries':>9}{'recall':>9}{'ndcg':>8}{'ctx tokens':>12}")
+        for r in retrieval_results:
+            print(f"{r['index']:<12}{r['entries']:>9}{r[f'recall@{args.k}']:>9.3f}{r[f'ndcg@{args.k}']:>8.3f}"
+                  f"{r['context_tokens_mean']:>12}")
+
+    print(json.dumps({"benchmark": "chunking", "coverage": coverage_results,
+                      "retrieval": retrieval_results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
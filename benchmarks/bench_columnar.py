@@ -0,0 +1,122 @@
+"""
+Load time of the consolidated subject tables per storage format:
+
+- csv_dictreader: ``csv.DictReader`` + ``int(float(...))`` casts per cell
+  (the serverless ``api/subjects.py``)
+- csv_pandas: ``pd.read_csv`` with type inference (the old ``/api/subjects``)
+- parquet: ``pd.read_parquet`` of the typed table
+- arrow_mmap: ``pa.memory_map`` + IPC read (no parsing, no copy)
+- arrow_mmap_pandas: the same, converted to a DataFrame
+
+Also reports file size and DataFrame memory (CSV-inferred vs typed). The
+.arrow/.parquet files are written to a temporary folder from the CSV, so the
+benchmark runs on a fresh checkout.
+
+Usage:
+    python benchmarks/bench_columnar.py [consolidated_data/global_clinical_data.csv ...] [--rounds 20]
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from common import ROOT, latency_summary
+
+DEFAULT_TABLES = ("consolidated_data/global_clinical_data.csv", "consolidated_data/all_subjects_full.csv")
+
+
+def read_dictreader(path: str) -> int:
+    with open(path, "r", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        for key, value in row.items():
+            try:
+                row[key] = int(float(value or 0))
+            except ValueError:
+                pass
+    return len(rows)
+
+
+def timed(fn, rounds: int) -> dict:
+    timings = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return latency_summary(timings)
+
+
+def bench_table(csv_path: str, tmpdir: str, rounds: int) -> dict:
+    import pandas as pd
+    import pyarrow as pa
+
+    from clinical_rag.columnar import stem, write_dataset
+
+    base = os.path.join(tmpdir, os.path.basename(stem(csv_path)))
+    inferred = pd.read_csv(csv_path)
+    arrow_path, parquet_path = write_dataset(inferred, base)
+
+    def read_arrow():
+        # Fresh map every round: the cached load_table would only time a dict lookup
+        with pa.memory_map(arrow_path, "r") as source:
+            return pa.ipc.open_file(source).read_all()
+
+    typed = read_arrow().to_pandas()
+    return {
+        "table": os.path.relpath(csv_path, ROOT),
+        "rows": len(inferred),
+        "columns": len(inferred.columns),
+        "bytes": {
+            "csv": os.path.getsize(csv_path),
+            "parquet": os.path.getsize(parquet_path),
+            "arrow": os.path.getsize(arrow_path),
+        },
+        "dataframe_bytes": {
+            "csv_inferred": int(inferred.memory_usage(deep=True).sum()),
+            "typed": int(typed.memory_usage(deep=True).sum()),
+        },
+        "load": {
+            "csv_dictreader": timed(lambda: read_dictreader(csv_path), rounds),
+            "csv_pandas": timed(lambda: pd.read_csv(csv_path), rounds),
+            "parquet": timed(lambda: pd.read_parquet(parquet_path), rounds),
+            "arrow_mmap": timed(read_arrow, rounds),
+            "arrow_mmap_pandas": timed(lambda: read_arrow().to_pandas(), rounds),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("tables", nargs="*", default=[os.path.join(ROOT, t) for t in DEFAULT_TABLES])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    tables = [t for t in args.tables if os.path.exists(t)]
+    if not tables:
+        raise SystemExit("No CSV tables found")
+
+    tmpdir = tempfile.mkdtemp(prefix="bench-columnar-")
+    try:
+        results = [bench_table(path, tmpdir, args.rounds) for path in tables]
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    for r in results:
+        sizes = r["bytes"]
+        memory = r["dataframe_bytes"]
+        print(f"\n{r['table']}: {r['rows']:,} rows x {r['columns']} columns")
+        print(f"  files: csv {sizes['csv'] / 1024:,.0f} KB, parquet {sizes['parquet'] / 1024:,.0f} KB, "
+              f"arrow {sizes['arrow'] / 1024:,.0f} KB")
+        print(f"  DataFrame: inferred {memory['csv_inferred'] / 1024:,.0f} KB, typed {memory['typed'] / 1024:,.0f} KB")
+        print(f"  {'format':<20}{'p50 ms':>10}{'p95 ms':>10}")
+        for fmt, summary in r["load"].items():
+            print(f"  {fmt:<20}{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}")
+    print(json.dumps({"benchmark": "columnar", "rounds": args.rounds, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Docstore load-time and memory benchmark: pickled InMemoryDocstore vs compact store.
+
+Each format is loaded in a fresh subprocess so that RSS numbers are not polluted
+by the other format or by the benchmark harness itself.
+
+Usage:
+    python benchmarks/bench_docstore.py [faiss_index_optimized] [--reads 100]
+
+The index folder must contain ``index.pkl``; the compact docstore is created
+from it with ``convert_pickle_store`` if it does not exist yet.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_CHILD = r"""
+import json, os, random, sys, time
+sys.path.insert(0, {root!r})
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+fmt, folder, reads = sys.argv[1], sys.argv[2], int(sys.argv[3])
+
+if fmt == "pickle":
+    import pickle
+    from langchain_community.docstore.in_memory import InMemoryDocstore  # noqa: F401
+else:
+    from clinical_rag.docstore import CompactDocstore, DOCSTORE_DIRNAME
+
+rss_before = rss_kb()
+t0 = time.perf_counter()
+if fmt == "pickle":
+    with open(os.path.join(folder, "index.pkl"), "rb") as f:
+        docstore, ids = pickle.load(f)
+    lookup = lambda i: docstore.search(ids[i])
+    n = len(ids)
+else:
+    docstore = CompactDocstore(os.path.join(folder, DOCSTORE_DIRNAME))
+    lookup = docstore.get
+    n = len(docstore)
+load_s = time.perf_counter() - t0
+rss_loaded = rss_kb()
+
+rng = random.Random(42)
+positions = [rng.randrange(n) for _ in range(reads)]
+t0 = time.perf_counter()
+chars = sum(len(lookup(i).page_content) for i in positions)
+read_s = time.perf_counter() - t0
+
+print(json.dumps({{
+    "format": fmt,
+    "documents": n,
+    "load_ms": round(load_s * 1000, 2),
+    "rss_load_delta_mb": round((rss_loaded - rss_before) / 1024, 2),
+    "reads": reads,
+    "read_ms_per_doc": round(read_s * 1000 / max(reads, 1), 4),
+    "rss_after_reads_delta_mb": round((rss_kb() - rss_before) / 1024, 2),
+    "chars_read": chars,
+}}))
+"""
+
+
+def run_child(fmt: str, folder: str, reads: int) -> dict:
+    code = _CHILD.format(root=ROOT)
+    out = subprocess.run(
+        [sys.executable, "-c", code, fmt, folder, str(reads)],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("folder", nargs="?", default="faiss_index_optimized")
+    parser.add_argument("--reads", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    from clinical_rag.docstore import convert_pickle_store, is_compact_store
+    from clinical_rag.snapshots import snapshot_path
+
+    args.folder = snapshot_path(args.folder)
+    if not is_compact_store(args.folder):
+        print(f"🔄 Creating compact docstore in {args.folder}/ ...")
+        convert_pickle_store(args.folder)
+
+    results = []
+    for fmt in ("pickle", "compact"):
+        runs = [run_child(fmt, args.folder, args.reads) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["load_ms"])
+        results.append(best)
+
+    print(f"\n{'format':<10}{'docs':>8}{'load ms':>12}{'RSS load MB':>14}{'read ms/doc':>14}{'RSS read MB':>14}")
+    for r in results:
+        print(f"{r['format']:<10}{r['documents']:>8,}{r['load_ms']:>12.2f}{r['rss_load_delta_mb']:>14.2f}"
+              f"{r['read_ms_per_doc']:>14.4f}{r['rss_after_reads_delta_mb']:>14.2f}")
+    print(json.dumps({"benchmark": "docstore", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
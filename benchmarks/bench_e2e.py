@@ -0,0 +1,232 @@
+"""
+End-to-end RAG benchmark over the fixed CRA question corpus, against the
+local stub LLM (no remote endpoint, no API key).
+
+Phases:
+- build: a sample of the persisted docstore re-embedded and indexed into a
+  temporary folder (``--build-docs``, 0 to skip); reported as docs/s
+- load: embedding model and vector store load time
+- retrieval: per-stage latency p50/p95/p99 (embed, faiss_search, mmr,
+  rerank, format_context) from the request tracing spans, caches cleared
+  before every question
+- context: documents, characters and estimated tokens per question
+- end to end: retrieval + prompt + stub LLM call per question at several
+  concurrency levels; throughput (questions/s) and latency
+
+Results are printed as JSON (``--output`` also writes them to a file);
+``--compare`` prints the change of every latency against a previous run, so
+regressions show up between commits.
+
+Usage:
+    python benchmarks/bench_e2e.py [faiss_index_optimized] [--concurrency 1 4 8 16] \
+        [--output bench_e2e.json] [--compare previous.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+
+from common import ROOT, latency_summary, load_embeddings, load_questions, percentile
+
+STAGES = ("embed", "faiss_search", "mmr", "rerank", "format_context")
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def bench_build(folder: str, n_docs: int) -> dict:
+    from clinical_rag.docstore import CompactDocstore, DOCSTORE_DIRNAME
+    from clinical_rag.embedding_pipeline import build_compact_index
+
+    source = CompactDocstore(os.path.join(folder, DOCSTORE_DIRNAME))
+    n_docs = min(n_docs, len(source))
+    documents = [source.get(i) for i in range(n_docs)]
+    tmpdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    try:
+        t0 = time.perf_counter()
+        build_compact_index(documents, tmpdir)
+        build_s = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return {
+        "documents": n_docs,
+        "build_s": round(build_s, 3),
+        "docs_per_s": round(n_docs / build_s, 1) if build_s else None,
+        "corpus_documents": len(source),
+    }
+
+
+def bench_retrieval(engine, questions, k: int, rounds: int):
+    from clinical_rag.prompts import estimate_tokens
+    from clinical_rag.tracing import local_trace
+
+    stages = defaultdict(list)
+    totals, docs_n, chars, tokens = [], [], [], []
+    for _ in range(rounds):
+        for q in questions:
+            engine.clear_cache()
+            with local_trace("bench_retrieval") as trace:
+                t0 = time.perf_counter()
+                docs = engine.retrieve(q["question"], k=k, study_filter=q["study_filter"])
+                context = engine.format_context(docs)
+                totals.append(time.perf_counter() - t0)
+            for stage, seconds in trace.stage_totals().items():
+                stages[stage].append(seconds)
+            docs_n.append(len(docs))
+            chars.append(len(context))
+            tokens.append(estimate_tokens(context))
+
+    return (
+        {
+            "total": latency_summary(totals),
+            **{stage: latency_summary(stages[stage]) for stage in STAGES if stages[stage]},
+        },
+        {
+            "docs_mean": round(sum(docs_n) / len(docs_n), 2),
+            "chars_mean": round(sum(chars) / len(chars)),
+            "chars_p95": percentile(chars, 95),
+            "tokens_mean": round(sum(tokens) / len(tokens)),
+            "tokens_p95": percentile(tokens, 95),
+        },
+    )
+
+
+async def run_concurrency(engine, client, questions, k: int, concurrency: int, requests: int) -> dict:
+    from clinical_rag.prompts import build_messages, select_profile
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(q):
+        nonlocal errors
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                docs = await asyncio.to_thread(engine.retrieve, q["question"], k, q["study_filter"])
+                messages = build_messages(select_profile(q["question"]), engine.format_context(docs), q["question"])
+                await client.chat(messages)
+                latencies.append(time.perf_counter() - t0)
+            except Exception:
+                errors += 1
+
+    batch = [questions[i % len(questions)] for i in range(requests)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in batch))
+    elapsed = time.perf_counter() - t0
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "questions_per_s": round(len(latencies) / elapsed, 2) if elapsed else None,
+        **latency_summary(latencies),
+    }
+
+
+def compare(current: dict, previous: dict):
+    """Print the relative change of every *_ms value present in both runs."""
+    def flatten(d, prefix=""):
+        for key, value in d.items():
+            path = f"{prefix}{key}"
+            if isinstance(value, dict):
+                yield from flatten(value, path + ".")
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, dict) and "concurrency" in item:
+                        yield from flatten(item, f"{path}[c={item['concurrency']}].")
+            elif key.endswith("_ms") or key in ("load_s", "build_s", "embeddings_load_s"):
+                yield path, value
+
+    before = dict(flatten(previous))
+    print(f"\nChange vs {previous.get('commit', 'previous run')}:")
+    for path, value in flatten(current):
+        old = before.get(path)
+        if old:
+            delta = (value - old) / old * 100
+            flag = "  ⚠️" if delta > 10 else ""
+            print(f"  {path:<48}{old:>10.2f} -> {value:>10.2f}  ({delta:+.1f}%){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("folder", nargs="?", default="faiss_index_optimized")
+    parser.add_argument("--k", type=int, default=12)
+    parser.add_argument("--rounds", type=int, default=3, help="Retrieval passes over the corpus")
+    parser.add_argument("--build-docs", type=int, default=2000, help="Docs to re-index (0 = skip build)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=64, help="Requests per concurrency level")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-output-tokens", type=int, default=400)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    parser.add_argument("--compare", help="Previous JSON results to diff against")
+    args = parser.parse_args()
+
+    from clinical_rag.llm_client import LLMClient, LLMClientConfig
+    from clinical_rag.retrieval import RetrievalConfig, RetrievalEngine, load_vector_store
+    from clinical_rag.snapshots import snapshot_path
+    from clinical_rag.stub_llm import StubLLMServer
+
+    questions = load_questions()
+    results = {"benchmark": "e2e", "commit": git_commit(), "questions": len(questions), "k": args.k}
+
+    if args.build_docs:
+        results["build"] = bench_build(snapshot_path(args.folder), args.build_docs)
+
+    t0 = time.perf_counter()
+    embeddings = load_embeddings()
+    embeddings_load_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    store = load_vector_store(args.folder, embeddings)
+    results["load"] = {
+        "embeddings_load_s": round(embeddings_load_s, 3),
+        "load_s": round(time.perf_counter() - t0, 3),
+        "documents": store.index.ntotal,
+    }
+
+    engine = RetrievalEngine(store, RetrievalConfig(k=args.k))
+    engine.retrieve(questions[0]["question"])  # Warm up the encoder
+    results["retrieval"], results["context"] = bench_retrieval(engine, questions, args.k, args.rounds)
+
+    with StubLLMServer(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_latency_ms / 5,
+                       output_tokens=args.llm_output_tokens, seed=7) as stub:
+        client = LLMClient(LLMClientConfig(base_url=stub.base_url, model="stub", api_key=None,
+                                           max_connections=max(args.concurrency)))
+        end_to_end = []
+        for concurrency in args.concurrency:
+            engine.clear_cache()
+            end_to_end.append(asyncio.run(
+                run_concurrency(engine, client, questions, args.k, concurrency, args.requests)
+            ))
+        client.close()
+    results["end_to_end"] = end_to_end
+
+    print(f"\n{'stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, summary in results["retrieval"].items():
+        print(f"{stage:<16}{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}")
+    print(f"\n{'concurrency':<12}{'q/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for r in end_to_end:
+        print(f"{r['concurrency']:<12}{r['questions_per_s']:>8}{r['p50_ms']:>10.0f}{r['p95_ms']:>10.0f}{r['errors']:>8}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+CPID workbook loading over all study folders: the notebook's original loader
+(openpyxl, EDC Metrics read twice) vs ``ExcelReader`` with each available
+engine, cold and with the parsed-frame cache warm.
+
+Reported per variant:
+- total load time and per file kind
+- workbooks and sheets parsed
+- files whose subject column was found (the original loader misses e.g.
+  Study 11's Visit Projection Tracker, whose header is on row 3)
+- data rows loaded
+
+Usage:
+    python benchmarks/bench_excel_reader.py ["QC Anonymized Study Files"] [--engines calamine openpyxl]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+from common import ROOT
+
+SUBJECT_COLUMNS = ("subject", "patient id", "subject name", "patient", "subjectid", "subject id")
+
+
+def legacy_load_study_files(study_path):
+    """``load_study_files`` as it was in consolidated_analysis.ipynb."""
+    import pandas as pd
+
+    from clinical_rag.excel_reader import FILE_KINDS, find_file_by_keyword
+
+    dfs = {}
+    for key, keywords in FILE_KINDS.items():
+        file_path = find_file_by_keyword(study_path, keywords)
+        if not file_path:
+            continue
+        try:
+            if key == "EDC":
+                temp_df = pd.read_excel(file_path, header=None, nrows=10)
+                header_row = 0
+                for i in range(10):
+                    row_values = temp_df.iloc[i].astype(str).values
+                    if any("Subject" in v for v in row_values) or any("Patient" in v for v in row_values):
+                        header_row = i
+                        break
+                dfs[key] = pd.read_excel(file_path, skiprows=header_row) if header_row > 0 else pd.read_excel(file_path)
+            else:
+                dfs[key] = pd.read_excel(file_path)
+        except Exception as e:
+            print(f"  Error loading {key} ({os.path.basename(file_path)}): {e}")
+    return dfs
+
+
+def has_subject(df) -> bool:
+    return any(str(c).lower().strip() in SUBJECT_COLUMNS for c in df.columns)
+
+
+def run(folders, load) -> dict:
+    files = found = rows = 0
+    t0 = time.perf_counter()
+    for folder in folders:
+        for kind, df in load(folder).items():
+            files += 1
+            found += has_subject(df)
+            rows += len(df)
+    elapsed = time.perf_counter() - t0
+    return {"load_s": round(elapsed, 3), "files": files, "subject_column_found": found, "rows": rows}
+
+
+def timed_reader(reader):
+    """load_study_files with per-kind timings."""
+    from clinical_rag.excel_reader import FILE_KINDS, find_file_by_keyword
+
+    timings = defaultdict(float)
+
+    def load(folder):
+        dfs = {}
+        for kind, keywords in FILE_KINDS.items():
+            path = find_file_by_keyword(folder, keywords)
+            if path:
+                t0 = time.perf_counter()
+                dfs[kind] = reader.read(path, kind)
+                timings[kind] += time.perf_counter() - t0
+        return dfs
+
+    return load, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root", nargs="?", default=os.path.join(ROOT, "QC Anonymized Study Files"))
+    parser.add_argument("--engines", nargs="+", default=["calamine", "openpyxl"])
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    from clinical_rag.excel_reader import ExcelReader
+
+    folders = sorted(
+        os.path.join(args.root, f) for f in os.listdir(args.root) if os.path.isdir(os.path.join(args.root, f))
+    )
+    results = []
+
+    if not args.skip_legacy:
+        results.append({"variant": "legacy_openpyxl", **run(folders, legacy_load_study_files)})
+
+    tmpdir = tempfile.mkdtemp(prefix="bench-excel-")
+    try:
+        for engine in args.engines:
+            if engine == "calamine" and not importlib.util.find_spec("python_calamine"):
+                print("⚠️ python-calamine not installed, skipping the calamine engine")
+                continue
+            cache_dir = os.path.join(tmpdir, engine)
+            reader = ExcelReader(engine=engine, schema_cache=os.path.join(tmpdir, f"{engine}.json"),
+                                 frame_cache_dir=cache_dir)
+            for variant in ("cold", "schema_cached", "frame_cached"):
+                if variant == "schema_cached":
+                    # Layouts known, frames not: every workbook parsed once, no detection
+                    shutil.rmtree(cache_dir)
+                    os.makedirs(cache_dir)
+                reader.stats.clear()
+                load, timings = timed_reader(reader)
+                result = run(folders, load)
+                result["per_kind_s"] = {kind: round(s, 3) for kind, s in sorted(timings.items())}
+                results.append({"variant": f"reader_{engine}_{variant}", **result, "stats": dict(reader.stats)})
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    print(f"\n{len(folders)} study folders")
+    print(f"{'variant':<34}{'load s':>9}{'files':>7}{'subject col':>13}{'rows':>10}{'sheets':>8}")
+    for r in results:
+        sheets = r.get("stats", {}).get("sheets_parsed", "-")
+        print(f"{r['variant']:<34}{r['load_s']:>9.2f}{r['files']:>7}{r['subject_column_found']:>13}"
+              f"{r['rows']:>10,}{sheets:>8}")
+    print(json.dumps({"benchmark": "excel_reader", "folders": len(folders), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
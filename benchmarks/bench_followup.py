@@ -0,0 +1,114 @@
+"""
+Multi-turn retrieval: every turn retrieved from scratch vs FollowUpRetriever
+(follow-ups rewritten with the study under discussion; previous documents
+reused or merged).
+
+Reported per turn position and overall:
+- retrieval latency p50/p95
+- mode counts (new / reuse / merge)
+- on-topic share: fraction of retrieved docs from the session's study, a
+  quality proxy for vague follow-ups such as "what about its sites?"
+- context size in characters
+
+Usage:
+    python benchmarks/bench_followup.py [faiss_index_optimized] [--rounds 3]
+"""
+
+import argparse
+import json
+import time
+from collections import Counter, defaultdict
+
+from common import latency_summary, load_store
+
+# (study under discussion, turns)
+SESSIONS = [
+    ("Study 10", ["Tell me about Study 10. What are the key issues?",
+                  "What about its sites?",
+                  "Which of those have missing lab records?",
+                  "And the safety discrepancies?"]),
+    ("Study 16", ["What's the status of Study 16?",
+                  "Why is the DQI so low there?",
+                  "Which subjects need attention first?",
+                  "What should the CRA do this week?"]),
+    ("Study 22", ["Show the DQI summary for Study 22",
+                  "How does it compare to the portfolio average?",
+                  "What are the open EDRR issues in Study 22?",
+                  "And their coding backlog?"]),
+    ("Study 5", ["Which subjects have outstanding visits in Study 5?",
+                 "Which sites are they at?",
+                 "Same question for missing pages",
+                 "Summarize the actions for those sites"]),
+    ("Study 1", ["Give me an overview of Study 1's performance",
+                 "What are its biggest risks?",
+                 "Give me an overview of Study 1's performance again, briefly",
+                 "More detail on the sites please"]),
+]
+
+
+def on_topic(engine, ids, study) -> float:
+    if not ids:
+        return 0.0
+    target = study.lower()
+    return sum(engine.doc_meta(i)[1].lower() == target for i in ids) / len(ids)
+
+
+def run(engine, retrieve, rounds, k):
+    by_turn = defaultdict(list)
+    topic, context_chars, modes = [], [], Counter()
+    for round_no in range(rounds):
+        for session_no, (study, turns) in enumerate(SESSIONS):
+            engine.clear_cache()
+            session_id = f"bench-{round_no}-{session_no}"
+            for turn, question in enumerate(turns):
+                t0 = time.perf_counter()
+                ids, mode = retrieve(session_id, question, k)
+                by_turn[turn].append(time.perf_counter() - t0)
+                modes[mode] += 1
+                topic.append(on_topic(engine, ids, study))
+                context_chars.append(sum(len(engine.document(i).page_content) for i in ids))
+    all_times = [t for times in by_turn.values() for t in times]
+    return {
+        **latency_summary(all_times),
+        "per_turn_p50_ms": [latency_summary(by_turn[t])["p50_ms"] for t in sorted(by_turn)],
+        "modes": dict(modes),
+        "on_topic_share": round(sum(topic) / len(topic), 3),
+        "mean_context_chars": round(sum(context_chars) / len(context_chars)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("folder", nargs="?", default="faiss_index_optimized")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--k", type=int, default=12)
+    args = parser.parse_args()
+
+    from clinical_rag.followup import FollowUpRetriever
+    from clinical_rag.retrieval import RetrievalConfig, RetrievalEngine
+
+    engine = RetrievalEngine(load_store(args.folder), RetrievalConfig(k=args.k))
+    followup = FollowUpRetriever(engine)
+
+    def fresh(session_id, question, k):
+        return engine.retrieve_ids(question, k), "new"
+
+    def session_aware(session_id, question, k):
+        ids, info = followup.retrieve_ids(session_id, question, k)
+        return ids, info["mode"]
+
+    results = [
+        {"strategy": "fresh_per_turn", **run(engine, fresh, args.rounds, args.k)},
+        {"strategy": "followup", **run(engine, session_aware, args.rounds, args.k)},
+    ]
+
+    print(f"\n{'strategy':<16}{'p50 ms':>9}{'p95 ms':>9}{'on-topic':>10}{'ctx chars':>11}  per-turn p50 ms / modes")
+    for r in results:
+        turns = " ".join(f"{t:.1f}" for t in r["per_turn_p50_ms"])
+        print(f"{r['strategy']:<16}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['on_topic_share']:>10}"
+              f"{r['mean_context_chars']:>11}  [{turns}] {r['modes']}")
+    print(json.dumps({"benchmark": "followup_retrieval", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Latency and answer quality per LLM backend on the fixed question set.
+
+Every configured backend (hf, groq, local - see clinical_rag.llm_backends)
+answers every question with its own document budget. Reported per backend:
+- latency p50/p95/p99
+- grounding: share of numbers in the answer that appear in the context
+  (a cheap hallucination proxy for these number-heavy documents)
+- agreement: token F1 against the ``--reference`` backend's answers
+
+The ``routed`` row replays the questions through ``LLMRouter`` (simple
+questions to the fastest backend) and shows which backend each class got.
+
+Usage:
+    python benchmarks/bench_llm_backends.py [faiss_index_optimized] [--backends hf,local] [--reference hf]
+"""
+
+import argparse
+import json
+import re
+import time
+from collections import Counter
+
+from common import latency_summary, load_questions, load_store
+
+PROMPT = """You are ClinicalAI, an expert assistant for clinical trial data analysis.
+
+CONTEXT FROM RETRIEVED DOCUMENTS:
+{context}
+
+USER QUESTION: {question}
+
+Answer based ONLY on the provided context, using specific numbers. Be concise."""
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_TOKEN = re.compile(r"\w+")
+
+
+def grounding(answer: str, context: str) -> float:
+    numbers = set(_NUMBER.findall(answer))
+    if not numbers:
+        return 1.0
+    context_numbers = set(_NUMBER.findall(context))
+    return len(numbers & context_numbers) / len(numbers)
+
+
+def token_f1(a: str, b: str) -> float:
+    ta, tb = Counter(_TOKEN.findall(a.lower())), Counter(_TOKEN.findall(b.lower()))
+    common = sum((ta & tb).values())
+    if not common:
+        return 0.0
+    precision, recall = common / sum(ta.values()), common / sum(tb.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("folder", nargs="?", default="faiss_index_optimized")
+    parser.add_argument("--backends", default=None, help="Comma-separated subset (default: all configured)")
+    parser.add_argument("--reference", default="hf")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--max-tokens", type=int, default=512)
+    args = parser.parse_args()
+
+    from clinical_rag.llm_backends import build_router, classify_complexity
+    from clinical_rag.retrieval import RetrievalConfig, RetrievalEngine, format_context
+
+    router = build_router(max_tokens=args.max_tokens)
+    names = args.backends.split(",") if args.backends else list(router.backends)
+    engine = RetrievalEngine(load_store(args.folder), RetrievalConfig(k=args.k))
+    questions = load_questions()
+
+    contexts = {}
+    for backend_name in names:
+        backend = router.backends[backend_name]
+        k = backend.limit_k(args.k)
+        if k not in contexts:
+            contexts[k] = {
+                q["id"]: format_context(engine.retrieve(q["question"], k=k, study_filter=q["study_filter"]))
+                for q in questions
+            }
+
+    answers, results = {}, []
+    for backend_name in names:
+        backend = router.backends[backend_name]
+        ctx = contexts[backend.limit_k(args.k)]
+        timings, grounded, answers[backend_name] = [], [], {}
+        errors = 0
+        for q in questions:
+            messages = [{"role": "user", "content": PROMPT.format(context=ctx[q["id"]], question=q["question"])}]
+            t0 = time.perf_counter()
+            try:
+                text = backend.generate(messages, args.max_tokens)
+            except Exception as e:
+                errors += 1
+                print(f"⚠️ {backend_name} {q['id']}: {e}")
+                continue
+            timings.append(time.perf_counter() - t0)
+            answers[backend_name][q["id"]] = text
+            grounded.append(grounding(text, ctx[q["id"]]))
+        results.append({
+            "backend": backend_name,
+            "context_k": backend.limit_k(args.k),
+            "errors": errors,
+            **(latency_summary(timings) if timings else {}),
+            "grounding": round(sum(grounded) / len(grounded), 3) if grounded else None,
+        })
+
+    reference = answers.get(args.reference, {})
+    for r in results:
+        pairs = [(a, reference[qid]) for qid, a in answers[r["backend"]].items() if qid in reference]
+        r["agreement"] = round(sum(token_f1(a, b) for a, b in pairs) / len(pairs), 3) if pairs else None
+
+    routing = Counter(
+        (classify_complexity(q["question"], q["study_filter"]), router.select(q["question"], q["study_filter"]).name)
+        for q in questions
+    )
+
+    print(f"\n{'backend':<8}{'k':>4}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'grounding':>11}{'agreement':>11}{'errors':>8}")
+    for r in results:
+        print(f"{r['backend']:<8}{r['context_k']:>4}{r.get('p50_ms', 0):>10.0f}{r.get('p95_ms', 0):>10.0f}"
+              f"{r.get('p99_ms', 0):>10.0f}{str(r['grounding']):>11}{str(r['agreement']):>11}{r['errors']:>8}")
+    print("\nRouting (complexity -> backend):")
+    for (complexity, backend_name), count in sorted(routing.items()):
+        print(f"  {complexity:<8} -> {backend_name:<6} {count} questions")
+    print(json.dumps({
+        "benchmark": "llm_backends",
+        "results": results,
+        "routing": [{"complexity": c, "backend": b, "questions": n} for (c, b), n in sorted(routing.items())],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
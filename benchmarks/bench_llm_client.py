@@ -0,0 +1,91 @@
+"""
+LLM client resilience benchmark against the local stub server.
+
+Scenarios (each ``--requests`` calls at ``--concurrency``):
+- baseline:  tail-latency upstream, no hedging
+- hedged:    same upstream, hedge after the p90 latency
+- flaky:     10% HTTP 503s, retries with backoff
+- outage:    every call fails; the circuit breaker starts rejecting fast
+
+Usage:
+    python benchmarks/bench_llm_client.py [--requests 200] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from common import latency_summary
+
+MESSAGES = [
+    {"role": "system", "content": "You are a clinical trial data analyst."},
+    {"role": "user", "content": "Which sites in Study 10 have the most open queries?"},
+]
+
+SCENARIOS = {
+    "baseline": (dict(latency_ms=80, jitter_ms=40, tail_ms=1500, tail_rate=0.05), dict()),
+    "hedged": (dict(latency_ms=80, jitter_ms=40, tail_ms=1500, tail_rate=0.05),
+               dict(hedge_percentile=90, hedge_min_samples=20)),
+    "flaky": (dict(latency_ms=80, jitter_ms=40, error_rate=0.1), dict(backoff_base_s=0.05)),
+    "outage": (dict(latency_ms=10, error_rate=1.0),
+               dict(max_retries=1, backoff_base_s=0.01, breaker_failures=5, breaker_reset_s=60)),
+}
+
+
+async def run_scenario(client, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                await client.chat(MESSAGES, max_tokens=128)
+                latencies.append(time.perf_counter() - t0)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    from clinical_rag.llm_client import LLMClient, LLMClientConfig
+    from clinical_rag.stub_llm import StubLLMServer
+
+    results = []
+    for name, (stub_kwargs, client_kwargs) in SCENARIOS.items():
+        with StubLLMServer(seed=0, **stub_kwargs) as stub:
+            client = LLMClient(LLMClientConfig(base_url=stub.base_url, model="stub", **client_kwargs))
+            latencies, errors, elapsed = asyncio.run(run_scenario(client, args.requests, args.concurrency))
+            snapshot = client.snapshot()
+            client.close()
+            results.append({
+                "scenario": name,
+                "ok": len(latencies),
+                "errors": errors,
+                "upstream_requests": stub.requests,
+                "elapsed_s": round(elapsed, 2),
+                **(latency_summary(latencies) if latencies else {}),
+                **{key: snapshot[key] for key in ("retries", "hedges", "hedge_wins", "rejected", "breaker")},
+            })
+
+    print(f"\n{'scenario':<10}{'ok':>6}{'err':>6}{'upstream':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'retries':>9}{'hedges':>8}{'rejected':>10}")
+    for r in results:
+        print(f"{r['scenario']:<10}{r['ok']:>6}{r['errors']:>6}{r['upstream_requests']:>10}"
+              f"{r.get('p50_ms', 0):>9.1f}{r.get('p95_ms', 0):>9.1f}{r.get('p99_ms', 0):>9.1f}"
+              f"{r['retries']:>9}{r['hedges']:>8}{r['rejected']:>10}")
+    print(json.dumps({"benchmark": "llm_client", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
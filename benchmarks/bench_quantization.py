@@ -0,0 +1,93 @@
+"""
+Memory vs. recall trade-off of the quantized vector indexes.
+
+Ground truth is exact float32 L2 search over ``embeddings.npy``. Queries are
+the CRA questions in ``questions.jsonl`` (encoded with MiniLM) plus a sample
+of document vectors, so both question-style and document-style neighbourhoods
+of the clinical corpus are covered.
+
+Usage:
+    python benchmarks/bench_quantization.py [faiss_index_optimized] [--k 10] [--doc-queries 200]
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from common import load_questions
+
+
+def encode_questions(model_name: str) -> np.ndarray:
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        return np.zeros((0, 0), dtype=np.float32)
+    model = SentenceTransformer(model_name, device="cpu")
+    questions = [q["question"] for q in load_questions()]
+    return np.asarray(model.encode(questions, normalize_embeddings=True), dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("folder", nargs="?", default="faiss_index_optimized")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--doc-queries", type=int, default=200)
+    parser.add_argument("--rerank-factors", default="1,2,4,8")
+    args = parser.parse_args()
+
+    import faiss
+    from clinical_rag.embedding_pipeline import EMBEDDINGS_FILE, EMBEDDING_MODEL
+    from clinical_rag.quantization import QUANTIZATION_KINDS, RerankingIndex, build_quantized_index
+    from clinical_rag.snapshots import snapshot_path
+
+    vectors_path = os.path.join(snapshot_path(args.folder), EMBEDDINGS_FILE)
+    vectors = np.load(vectors_path, mmap_mode="r")
+    n, d = vectors.shape
+
+    rng = np.random.default_rng(0)
+    doc_queries = np.asarray(vectors[np.sort(rng.choice(n, min(args.doc_queries, n), replace=False))])
+    question_queries = encode_questions(EMBEDDING_MODEL)
+    queries = doc_queries if not question_queries.size else np.vstack([question_queries, doc_queries])
+
+    flat = build_quantized_index(vectors, "flat")
+    _, truth = flat.search(queries, args.k)
+
+    results = []
+    for kind in QUANTIZATION_KINDS:
+        t0 = time.perf_counter()
+        index = build_quantized_index(vectors, kind)
+        build_s = time.perf_counter() - t0
+        index_bytes = int(faiss.serialize_index(index).nbytes)
+
+        factors = [1] if kind == "flat" else [int(f) for f in args.rerank_factors.split(",")]
+        for factor in factors:
+            searcher = index if kind == "flat" else RerankingIndex(index, vectors_path, rerank_factor=factor)
+            t0 = time.perf_counter()
+            _, found = searcher.search(queries, args.k)
+            search_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+            recall = np.mean([
+                len(set(f[f >= 0]) & set(t)) / args.k for f, t in zip(found, truth)
+            ])
+            results.append({
+                "kind": kind,
+                "rerank_factor": factor if kind != "flat" else None,
+                "index_mb": round(index_bytes / 1024 / 1024, 3),
+                "bytes_per_doc": round(index_bytes / n, 1),
+                f"recall@{args.k}": round(float(recall), 4),
+                "search_ms_per_query": round(search_ms, 3),
+                "build_s": round(build_s, 2),
+            })
+
+    print(f"\n{n:,} vectors x {d} dims, {len(queries)} queries, k={args.k}\n")
+    print(f"{'kind':<6}{'rerank':>8}{'index MB':>10}{'B/doc':>8}{'recall':>9}{'ms/query':>10}")
+    for r in results:
+        print(f"{r['kind']:<6}{str(r['rerank_factor'] or '-'):>8}{r['index_mb']:>10.2f}"
+              f"{r['bytes_per_doc']:>8.0f}{r[f'recall@{args.k}']:>9.3f}{r['search_ms_per_query']:>10.3f}")
+    print(json.dumps({"benchmark": "quantization", "documents": n, "k": args.k, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
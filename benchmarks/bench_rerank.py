@@ -0,0 +1,94 @@
+"""
+Microbenchmark of the re-ranking stages: legacy Document-based ranking
+(``doc not in final_docs``, O(n^2) Document comparisons) vs integer-id
+``rank_candidates``.
+
+Candidates are synthetic but shaped like the corpus: 23 studies, the real
+priority mix and ~1.5 KB of content per document. The worst case for the old
+code is a study filter that leaves few matches, so the backfill loop runs.
+
+Usage:
+    python benchmarks/bench_rerank.py [--repeat 20]
+"""
+
+import argparse
+import json
+import random
+import time
+
+from common import latency_summary, legacy_rerank
+
+K_VALUES = (5, 12, 25, 50, 100)
+FETCH_K_VALUES = (60, 250, 500, 1000)
+STUDIES = [f"Study {i}" for i in (1, 2, 4, 5, 6, 7, 8, 9, 10, 11, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25)]
+PRIORITY_MIX = [1] * 2 + [2] * 18 + [3] * 80
+
+
+def make_candidates(n: int, seed: int = 0):
+    from langchain_core.documents import Document
+
+    rng = random.Random(seed)
+    filler = "Site performance metrics and subject issue breakdown. " * 28
+    docs = []
+    for pos in range(n):
+        docs.append(Document(
+            page_content=f"# Document {pos}\n{filler}",
+            metadata={
+                "pos": pos,
+                "study": rng.choice(STUDIES),
+                "priority": rng.choice(PRIORITY_MIX),
+                "doc_type": "site_summary",
+            },
+        ))
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    from clinical_rag.retrieval import RetrievalConfig, rank_candidates
+
+    config = RetrievalConfig()
+    results = []
+    for fetch_k in FETCH_K_VALUES:
+        docs = make_candidates(fetch_k)
+        meta = {d.metadata["pos"]: (d.metadata["priority"], d.metadata["study"]) for d in docs}
+        ids = [d.metadata["pos"] for d in docs]
+        for k in K_VALUES:
+            if k > fetch_k:
+                continue
+            for study_filter in (None, "Study 14"):
+                legacy_t, new_t = [], []
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    legacy = legacy_rerank(docs, k, study_filter)
+                    legacy_t.append(time.perf_counter() - t0)
+
+                    t0 = time.perf_counter()
+                    ranked = rank_candidates(ids, meta.__getitem__, k, config, study_filter)
+                    new_t.append(time.perf_counter() - t0)
+
+                legacy_ids = [d.metadata["pos"] for d in legacy]
+                legacy_ms = latency_summary(legacy_t)["p50_ms"]
+                new_ms = latency_summary(new_t)["p50_ms"]
+                results.append({
+                    "k": k,
+                    "fetch_k": fetch_k,
+                    "study_filter": study_filter,
+                    "legacy_p50_ms": legacy_ms,
+                    "int_ids_p50_ms": new_ms,
+                    "speedup": round(legacy_ms / new_ms, 1) if new_ms else None,
+                    "same_result": legacy_ids == ranked,
+                })
+
+    print(f"\n{'k':>5}{'fetch_k':>9}{'filter':>10}{'legacy ms':>12}{'int ids ms':>12}{'speedup':>9}{'same':>6}")
+    for r in results:
+        print(f"{r['k']:>5}{r['fetch_k']:>9}{str(r['study_filter'] or '-'):>10}{r['legacy_p50_ms']:>12.3f}"
+              f"{r['int_ids_p50_ms']:>12.3f}{str(r['speedup']):>9}{str(r['same_result']):>6}")
+    print(json.dumps({"benchmark": "rerank", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
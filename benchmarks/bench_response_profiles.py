@@ -0,0 +1,87 @@
+"""
+Tokens in / tokens out and latency per response profile (brief, standard, full).
+
+Each profile answers the fixed question set with the same retrieved context.
+Token counts come from the server's ``usage``; servers that report none fall
+back to a ~4 chars/token estimate (marked ``estimated``). ``static_prefix``
+is the size of the system message every call of the profile shares, i.e.
+what a prefix-caching server does not recompute.
+
+``--stub`` runs against the local stub LLM with a per-token decode cost, so
+the effect of the max_tokens limits is visible without a remote endpoint.
+
+Usage:
+    python benchmarks/bench_response_profiles.py [faiss_index_optimized] [--stub] [--limit 12]
+"""
+
+import argparse
+import json
+
+from common import latency_summary, load_questions, load_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("folder", nargs="?", default="faiss_index_optimized")
+    parser.add_argument("--stub", action="store_true", help="Use the local stub LLM server")
+    parser.add_argument("--ms-per-token", type=float, default=5.0, help="Stub decode cost")
+    parser.add_argument("--limit", type=int, default=None, help="Only the first N questions")
+    parser.add_argument("--k", type=int, default=12)
+    args = parser.parse_args()
+
+    from clinical_rag.llm_client import LLMClient, LLMClientConfig
+    from clinical_rag.prompts import RESPONSE_PROFILES, build_messages, estimate_tokens
+    from clinical_rag.retrieval import RetrievalConfig, RetrievalEngine, format_context
+    from clinical_rag.stub_llm import StubLLMServer
+
+    questions = load_questions()[:args.limit]
+    engine = RetrievalEngine(load_store(args.folder), RetrievalConfig(k=args.k))
+    contexts = {
+        q["id"]: format_context(engine.retrieve(q["question"], k=args.k, study_filter=q["study_filter"]))
+        for q in questions
+    }
+
+    stub = None
+    if args.stub:
+        stub = StubLLMServer(latency_ms=50, output_tokens=4096, ms_per_token=args.ms_per_token).start()
+        client = LLMClient(LLMClientConfig(base_url=stub.base_url, model="stub"))
+    else:
+        client = LLMClient(LLMClientConfig.from_env())
+
+    results = []
+    for name, profile in RESPONSE_PROFILES.items():
+        latencies, tokens_in, tokens_out, estimated = [], [], [], False
+        for q in questions:
+            messages = build_messages(profile, contexts[q["id"]], q["question"])
+            completion = client.complete_sync(messages, max_tokens=profile.max_tokens)
+            latencies.append(completion.latency_s)
+            if completion.prompt_tokens is None or completion.completion_tokens is None:
+                estimated = True
+                tokens_in.append(sum(estimate_tokens(m["content"]) for m in messages))
+                tokens_out.append(estimate_tokens(completion.text))
+            else:
+                tokens_in.append(completion.prompt_tokens)
+                tokens_out.append(completion.completion_tokens)
+        results.append({
+            "profile": name,
+            "max_tokens": profile.max_tokens,
+            "static_prefix_tokens": estimate_tokens(profile.system_prompt),
+            "tokens_in_mean": round(sum(tokens_in) / len(tokens_in), 1),
+            "tokens_out_mean": round(sum(tokens_out) / len(tokens_out), 1),
+            "estimated": estimated,
+            **latency_summary(latencies),
+        })
+
+    client.close()
+    if stub:
+        stub.stop()
+
+    print(f"\n{'profile':<10}{'max_tok':>9}{'prefix':>8}{'tok in':>9}{'tok out':>9}{'p50 ms':>10}{'p95 ms':>10}")
+    for r in results:
+        print(f"{r['profile']:<10}{r['max_tokens']:>9}{r['static_prefix_tokens']:>8}{r['tokens_in_mean']:>9}"
+              f"{r['tokens_out_mean']:>9}{r['p50_ms']:>10.0f}{r['p95_ms']:>10.0f}")
+    print(json.dumps({"benchmark": "response_profiles", "stub": args.stub, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Replay the fixed question set against retrieval configurations and report
+latency and result overlap.
+
+Configurations:
+    backend_legacy  - advanced_retrieve as it was in rag_pipeline_new.py (k=12)
+    space_legacy    - the Space's old plain MMR (k=8, fetch_k=24)
+    shared_k12      - RetrievalEngine, backend defaults
+    shared_k8       - RetrievalEngine, Space defaults
+    shared_cached   - RetrievalEngine replayed a second time (warm cache)
+
+Overlap is the mean Jaccard similarity of retrieved doc ids versus
+``--reference`` (default: backend_legacy).
+
+Usage:
+    python benchmarks/bench_retrieval_configs.py [faiss_index_optimized] [--rounds 3]
+"""
+
+import argparse
+import json
+import time
+
+from common import doc_key, latency_summary, legacy_rerank, load_questions, load_store
+
+
+def legacy_space_retrieve(vector_store, question, k=8, study_filter=None):
+    return vector_store.max_marginal_relevance_search(question, k=k, fetch_k=k * 3, lambda_mult=0.7)
+
+
+def legacy_backend_retrieve(vector_store, question, k=12, study_filter=None):
+    return legacy_rerank(
+        vector_store.max_marginal_relevance_search(question, k=k * 3, fetch_k=k * 5, lambda_mult=0.7),
+        k,
+        study_filter,
+    )
+
+
+def run_config(name, retrieve, questions, rounds):
+    timings, results = [], {}
+    for _ in range(rounds):
+        for q in questions:
+            t0 = time.perf_counter()
+            docs = retrieve(q["question"], study_filter=q["study_filter"])
+            timings.append(time.perf_counter() - t0)
+            results[q["id"]] = [doc_key(d) for d in docs]
+    return {"config": name, **latency_summary(timings)}, results
+
+
+def jaccard(a, b):
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("folder", nargs="?", default="faiss_index_optimized")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--reference", default="backend_legacy")
+    args = parser.parse_args()
+
+    from clinical_rag.retrieval import RetrievalConfig, RetrievalEngine
+
+    vector_store = load_store(args.folder)
+    questions = load_questions()
+    vector_store.similarity_search("warm up", k=1)
+
+    shared_k12 = RetrievalEngine(vector_store, RetrievalConfig(k=12, cache_size=0))
+    shared_k8 = RetrievalEngine(vector_store, RetrievalConfig(k=8, cache_size=0))
+    cached = RetrievalEngine(vector_store, RetrievalConfig(k=12))
+    for q in questions:
+        cached.retrieve(q["question"], study_filter=q["study_filter"])
+
+    configs = {
+        "backend_legacy": lambda q, study_filter=None: legacy_backend_retrieve(vector_store, q, 12, study_filter),
+        "space_legacy": lambda q, study_filter=None: legacy_space_retrieve(vector_store, q, 8),
+        "shared_k12": lambda q, study_filter=None: shared_k12.retrieve(q, study_filter=study_filter),
+        "shared_k8": lambda q, study_filter=None: shared_k8.retrieve(q, study_filter=study_filter),
+        "shared_cached": lambda q, study_filter=None: cached.retrieve(q, study_filter=study_filter),
+    }
+
+    summaries, all_results = [], {}
+    for name, retrieve in configs.items():
+        summary, results = run_config(name, retrieve, questions, args.rounds)
+        summaries.append(summary)
+        all_results[name] = results
+
+    reference = all_results[args.reference]
+    for summary in summaries:
+        results = all_results[summary["config"]]
+        summary[f"overlap_vs_{args.reference}"] = round(
+            sum(jaccard(results[qid], reference[qid]) for qid in reference) / len(reference), 3
+        )
+
+    print(f"\n{'config':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'overlap':>10}")
+    for s in summaries:
+        print(f"{s['config']:<16}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}"
+              f"{s[f'overlap_vs_{args.reference}']:>10.3f}")
+    print(json.dumps({"benchmark": "retrieval_configs", "questions": len(questions), "results": summaries}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
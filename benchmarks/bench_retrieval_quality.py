@@ -0,0 +1,259 @@
+"""
+Retrieval quality vs cost: sweep the RetrievalConfig knobs and report
+recall@k, nDCG@k, latency and context size per configuration, plus the
+Pareto front (no other configuration has both better nDCG and lower p95).
+
+Relevance labels are derived from the structured data in
+``consolidated_data/`` (document ids, issue counts, DQI scores), e.g.:
+- "Which sites in Study 10 have the most issues?" -> every
+  ``site_Study 10_*`` id, the 5 sites with most issues graded 2, the rest 1
+- "What's the status of Study 10?" -> ``study_Study 10`` and
+  ``cra_report_Study 10`` (2), ``dqi_summary_Study 10`` (1)
+- "Which studies have the lowest average DQI?" -> every ``dqi_summary_*``,
+  the 3 lowest graded 2
+
+Swept knobs: fetch_multiplier, candidate_multiplier, lambda_mult,
+study_share_divisor, min_per_study, priority_boost and the subject cap.
+``MAX_SUBJECTS_PER_STUDY`` is applied at index build time; here lower caps
+are approximated by dropping the excluded subject docs from the MMR
+candidates. For an exact comparison build indexes with different caps (or
+``--no-section-chunks``) and pass them with ``--index name=folder``.
+
+Latency excludes the query embedding (identical for every configuration):
+questions are embedded once, then FAISS search + MMR + re-ranking are timed.
+
+Usage:
+    python benchmarks/bench_retrieval_quality.py [faiss_index_optimized] [--grid one-at-a-time|full]
+        [--index cap50=faiss_index_cap50] [--dump-labels labels.jsonl]
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import time
+from collections import defaultdict
+
+from common import ROOT, latency_summary, load_embeddings, load_store, parent_key
+
+DATA_PATH = os.path.join(ROOT, "consolidated_data")
+
+PRIORITY_BOOSTS = {
+    "default": {0: 100, 1: 50, 2: 25, 3: 10},
+    "flat": {0: 10, 1: 10, 2: 10, 3: 10},
+    "steep": {0: 1000, 1: 100, 2: 10, 3: 1},
+}
+
+# Default values first; "one-at-a-time" varies one knob around the defaults
+SWEEP = {
+    "fetch_multiplier": [5, 3, 8],
+    "candidate_multiplier": [3, 2, 5],
+    "lambda_mult": [0.7, 0.5, 0.9],
+    "study_share_divisor": [5, 3, 8],
+    "min_per_study": [2, 1, 4],
+    "priority_boost": ["default", "flat", "steep"],
+    "subject_cap": [100, 50, 20],
+}
+
+
+def _read_jsonl(filename: str) -> list:
+    path = os.path.join(DATA_PATH, filename)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def build_labels() -> list:
+    """Labelled questions: {id, question, study_filter, relevant: {doc id: grade}}."""
+    studies = {d["study"]: d for d in _read_jsonl("rag_study_documents.jsonl")}
+    dqi = {d["study"]: d for d in _read_jsonl("rag_study_dqi_summaries.jsonl")}
+    cra = {d["study"] for d in _read_jsonl("rag_cra_reports.jsonl")}
+    sites = defaultdict(list)
+    for d in _read_jsonl("rag_site_documents.jsonl"):
+        sites[d["study"]].append(d)
+
+    labels = []
+    for study in sorted(studies, key=lambda s: int(s.split()[-1]) if s.split()[-1].isdigit() else 0):
+        relevant = {f"study_{study}": 2}
+        if study in cra:
+            relevant[f"cra_report_{study}"] = 2
+        if study in dqi:
+            relevant[f"dqi_summary_{study}"] = 1
+        labels.append({"id": f"status_{study}", "question": f"What's the status of {study}? What are the key issues?",
+                       "study_filter": None, "relevant": relevant})
+
+        if study in dqi:
+            labels.append({"id": f"dqi_{study}",
+                           "question": f"What is the average DQI score and clean patient rate for {study}?",
+                           "study_filter": None,
+                           "relevant": {f"dqi_summary_{study}": 2, f"study_{study}": 1}})
+
+        if sites[study]:
+            ranked = sorted(sites[study], key=lambda d: -d.get("total_issues", 0))
+            labels.append({"id": f"sites_{study}", "question": f"Which sites in {study} have the most issues?",
+                           "study_filter": study,
+                           "relevant": {d["id"]: 2 if i < 5 else 1 for i, d in enumerate(ranked)}})
+            worst = ranked[0]
+            labels.append({"id": f"site_{study}", "question": f"How is {worst['site']} in {study} performing?",
+                           "study_filter": None,
+                           "relevant": {worst["id"]: 2, f"study_{study}": 1}})
+
+    if dqi:
+        lowest = sorted(dqi.values(), key=lambda d: d.get("avg_dqi", 100))
+        labels.append({"id": "cross_lowest_dqi", "question": "Which studies have the lowest average DQI scores?",
+                       "study_filter": None,
+                       "relevant": {d["id"]: 2 if i < 3 else 1 for i, d in enumerate(lowest)}})
+    if studies:
+        most = sorted(studies.values(), key=lambda d: -d.get("total_issues", 0))
+        labels.append({"id": "cross_most_issues", "question": "Which studies have the most total issues?",
+                       "study_filter": None,
+                       "relevant": {d["id"]: 2 if i < 3 else 1 for i, d in enumerate(most)}})
+    return labels
+
+
+def recall_at_k(retrieved: list, relevant: dict, k: int) -> float:
+    hits = sum(1 for key in retrieved[:k] if key in relevant)
+    return hits / min(k, len(relevant)) if relevant else 0.0
+
+
+def ndcg_at_k(retrieved: list, relevant: dict, k: int) -> float:
+    dcg = sum((2 ** relevant.get(key, 0) - 1) / math.log2(i + 2) for i, key in enumerate(retrieved[:k]))
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+
+def subject_exclusions(engine, cap: int) -> set:
+    """Doc ids of subject-level docs beyond ``cap`` per study (by total_issues)."""
+    by_study = defaultdict(list)
+    for doc_id in range(engine.vector_store.index.ntotal):
+        priority, study = engine.doc_meta(doc_id)
+        if priority >= 3:
+            doc = engine.document(doc_id)
+            by_study[study].append((-doc.metadata.get("total_issues", 0), doc_id))
+    excluded = set()
+    for entries in by_study.values():
+        excluded.update(doc_id for _, doc_id in sorted(entries)[cap:])
+    return excluded
+
+
+def configurations(grid: str) -> list:
+    defaults = {knob: values[0] for knob, values in SWEEP.items()}
+    if grid == "full":
+        knobs = list(SWEEP)
+        combos = [dict(zip(knobs, values)) for values in itertools.product(*SWEEP.values())]
+        return [c for c in combos if c["candidate_multiplier"] <= c["fetch_multiplier"]]
+    configs = [defaults]
+    for knob, values in SWEEP.items():
+        configs += [{**defaults, knob: value} for value in values[1:]]
+    return configs
+
+
+def config_name(config: dict) -> str:
+    defaults = {knob: values[0] for knob, values in SWEEP.items()}
+    changed = [f"{knob}={value}" for knob, value in config.items() if value != defaults[knob]]
+    return ",".join(changed) or "default"
+
+
+def evaluate(engine, labels, embeddings, k: int, excluded: set, rounds: int) -> dict:
+    recalls, ndcgs, chars, timings = [], [], [], []
+    for round_no in range(rounds):
+        for label, embedding in zip(labels, embeddings):
+            t0 = time.perf_counter()
+            candidates = engine.candidate_ids_by_vector(embedding, k)
+            if excluded:
+                candidates = [i for i in candidates if i not in excluded]
+            ids = engine.rank(candidates, k, label["study_filter"])
+            timings.append(time.perf_counter() - t0)
+            if round_no:
+                continue
+            docs = [engine.document(i) for i in ids]
+            # Labels name source documents; sections of one document count once
+            keys = list(dict.fromkeys(parent_key(d) for d in docs))
+            recalls.append(recall_at_k(keys, label["relevant"], k))
+            ndcgs.append(ndcg_at_k(keys, label["relevant"], k))
+            chars.append(sum(len(d.page_content) for d in docs))
+    return {
+        f"recall@{k}": round(sum(recalls) / len(recalls), 4),
+        f"ndcg@{k}": round(sum(ndcgs) / len(ndcgs), 4),
+        "context_chars_mean": round(sum(chars) / len(chars)),
+        **latency_summary(timings),
+    }
+
+
+def pareto_front(results: list, quality_key: str) -> None:
+    """Mark results not dominated on (quality higher, p95 lower)."""
+    for r in results:
+        r["pareto"] = not any(
+            o is not r and o[quality_key] >= r[quality_key] and o["p95_ms"] <= r["p95_ms"]
+            and (o[quality_key] > r[quality_key] or o["p95_ms"] < r["p95_ms"])
+            for o in results
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("folder", nargs="?", default="faiss_index_optimized")
+    parser.add_argument("--index", action="append", default=[], help="Extra index to compare: name=folder")
+    parser.add_argument("--grid", choices=("one-at-a-time", "full"), default="one-at-a-time")
+    parser.add_argument("--k", type=int, default=12)
+    parser.add_argument("--rounds", type=int, default=3, help="Timing passes (quality from the first)")
+    parser.add_argument("--dump-labels", help="Write the derived labels as JSONL and continue")
+    args = parser.parse_args()
+
+    from clinical_rag.retrieval import RetrievalConfig, RetrievalEngine
+
+    labels = build_labels()
+    if not labels:
+        raise SystemExit(f"No labelled questions: {DATA_PATH}/rag_*.jsonl not found")
+    if args.dump_labels:
+        with open(args.dump_labels, "w", encoding="utf-8") as f:
+            for label in labels:
+                f.write(json.dumps(label) + "\n")
+
+    embeddings_model = load_embeddings()
+    indexes = [("main", args.folder)] + [tuple(spec.split("=", 1)) for spec in args.index]
+    query_vectors = embeddings_model.embed_documents([label["question"] for label in labels])
+
+    results = []
+    for index_name, folder in indexes:
+        store = load_store(folder, embeddings_model)
+        probe = RetrievalEngine(store, RetrievalConfig(cache_size=0))
+        exclusions = {}
+        for config in configurations(args.grid):
+            cap = config["subject_cap"]
+            if cap not in exclusions:
+                exclusions[cap] = subject_exclusions(probe, cap) if cap < SWEEP["subject_cap"][0] else set()
+            engine = RetrievalEngine(store, RetrievalConfig(
+                k=args.k,
+                fetch_multiplier=config["fetch_multiplier"],
+                candidate_multiplier=config["candidate_multiplier"],
+                lambda_mult=config["lambda_mult"],
+                study_share_divisor=config["study_share_divisor"],
+                min_per_study=config["min_per_study"],
+                priority_boost=dict(PRIORITY_BOOSTS[config["priority_boost"]]),
+                cache_size=0,
+            ))
+            results.append({
+                "index": index_name,
+                "config": config_name(config),
+                "params": config,
+                **evaluate(engine, labels, query_vectors, args.k, exclusions[cap], args.rounds),
+            })
+
+    quality = f"ndcg@{args.k}"
+    pareto_front(results, quality)
+    recall = f"recall@{args.k}"
+    print(f"\n{'index':<8}{'config':<42}{recall:>11}{quality:>10}{'p50 ms':>9}{'p95 ms':>9}{'ctx chars':>11}")
+    for r in sorted(results, key=lambda r: -r[quality]):
+        mark = " *" if r["pareto"] else ""
+        print(f"{r['index']:<8}{r['config'][:41]:<42}{r[recall]:>11.3f}{r[quality]:>10.3f}"
+              f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['context_chars_mean']:>11}{mark}")
+    print("\n* Pareto-optimal (nDCG vs p95 latency)")
+    print(json.dumps({"benchmark": "retrieval_quality", "labels": len(labels), "k": args.k, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
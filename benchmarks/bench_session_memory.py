@@ -0,0 +1,91 @@
+"""
+Request payload and prompt history size per turn: client-sent chat_history
+(last 10 messages, 500 chars each) vs server-side session memory (summary +
+recent turns, capped in tokens).
+
+Answers are synthetic ~2.5 KB markdown blocks (a typical "standard" answer);
+summaries use the extractive summarizer so no LLM is needed.
+
+Usage:
+    python benchmarks/bench_session_memory.py [--turns 20] [--store memory|sqlite]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from common import load_questions
+
+
+def client_history_prompt(messages, max_messages=10):
+    """format_chat_history from rag_pipeline_new.py."""
+    if not messages:
+        return "**Previous Conversation:** None (this is a new conversation)"
+    formatted = ["**Previous Conversation (for context):**"]
+    for role, content in messages[-max_messages:]:
+        label = "User" if role == "user" else "Assistant"
+        content = content[:500] + "..." if len(content) > 500 else content
+        formatted.append(f"\n**{label}:** {content}")
+    return "\n".join(formatted)
+
+
+def synthetic_answer(question: str, turn: int) -> str:
+    rows = "\n".join(f"- Site {100 + i}: {3 * i + turn} open queries, {i % 4} missing pages" for i in range(40))
+    return f"## Summary\nRegarding '{question}': {turn * 7} subjects need attention.\n\n## Key Findings\n{rows}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--store", choices=("memory", "sqlite"), default="memory")
+    args = parser.parse_args()
+
+    from clinical_rag.prompts import estimate_tokens
+    from clinical_rag.sessions import ConversationMemory, MemorySessionStore, SQLiteSessionStore
+
+    tmpdir = tempfile.mkdtemp()
+    store = SQLiteSessionStore(os.path.join(tmpdir, "sessions.sqlite")) if args.store == "sqlite" else MemorySessionStore()
+    memory = ConversationMemory(store)
+    questions = [q["question"] for q in load_questions()]
+
+    history, rows = [], []
+    for turn in range(args.turns):
+        question = questions[turn % len(questions)]
+
+        client_payload = len(json.dumps({
+            "question": question, "k": 12,
+            "chat_history": [{"role": r, "content": c} for r, c in history[-10:]],
+        }))
+        client_prompt = estimate_tokens(client_history_prompt(history))
+
+        server_payload = len(json.dumps({"question": question, "k": 12, "session_id": "bench-session"}))
+        t0 = time.perf_counter()
+        server_history = memory.history("bench-session")
+        history_ms = (time.perf_counter() - t0) * 1000
+        server_prompt = estimate_tokens(server_history)
+
+        answer = synthetic_answer(question, turn)
+        history += [("user", question), ("assistant", answer)]
+        memory.record("bench-session", question, answer)
+        memory.flush()
+
+        rows.append({
+            "turn": turn + 1,
+            "client_payload_bytes": client_payload,
+            "server_payload_bytes": server_payload,
+            "client_history_tokens": client_prompt,
+            "server_history_tokens": server_prompt,
+            "history_lookup_ms": round(history_ms, 3),
+        })
+
+    print(f"\n{'turn':>5}{'client B':>10}{'server B':>10}{'client tok':>12}{'server tok':>12}{'lookup ms':>11}")
+    for r in rows:
+        print(f"{r['turn']:>5}{r['client_payload_bytes']:>10}{r['server_payload_bytes']:>10}"
+              f"{r['client_history_tokens']:>12}{r['server_history_tokens']:>12}{r['history_lookup_ms']:>11.3f}")
+    print(json.dumps({"benchmark": "session_memory", "store": args.store, "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
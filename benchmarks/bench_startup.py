@@ -0,0 +1,87 @@
+"""
+Start-up cost of the backend, each phase measured in a fresh interpreter:
+
+- import_app: ``import rag_pipeline_new`` (FastAPI app, no models)
+- llm_router / embeddings / index: the lazily created singletons of
+  ``clinical_rag.runtime`` (index = vector store + retrieval engine of the
+  active snapshot), via ``warm_up()``
+- first_retrieval: one question once everything is loaded
+- build (``--build``): ``python -m clinical_rag.build`` into a temporary
+  folder, per phase
+
+Usage:
+    python benchmarks/bench_startup.py [--rounds 3] [--build]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+from common import ROOT, latency_summary
+
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import rag_pipeline_new
+timings = {"import_app": time.perf_counter() - t0}
+from clinical_rag.runtime import STARTUP_TIMINGS, warm_up
+warm_up()
+timings.update(STARTUP_TIMINGS)
+t0 = time.perf_counter()
+rag_pipeline_new.advanced_retrieve("Which sites have the most open issues?", k=12)
+timings["first_retrieval"] = time.perf_counter() - t0
+print("TIMINGS " + json.dumps(timings))
+"""
+
+BUILD_PROBE = """
+import json, sys
+from clinical_rag.build import build_index
+print("TIMINGS " + json.dumps(build_index(sys.argv[1])))
+"""
+
+
+def run_probe(code: str, *args: str) -> dict:
+    env = dict(os.environ, WARMUP_ON_STARTUP="0", REPORT_JOBS_ENABLED="0")
+    out = subprocess.run([sys.executable, "-c", code, *args], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    line = next(l for l in out.splitlines() if l.startswith("TIMINGS "))
+    return json.loads(line[len("TIMINGS "):])
+
+
+def summarize(runs: list) -> dict:
+    phases = defaultdict(list)
+    for run in runs:
+        for phase, seconds in run.items():
+            phases[phase].append(seconds)
+    return {phase: latency_summary(values) for phase, values in phases.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--build", action="store_true", help="Also time the index build")
+    args = parser.parse_args()
+
+    results = {"serve": summarize([run_probe(PROBE) for _ in range(args.rounds)])}
+    if args.build:
+        tmpdir = tempfile.mkdtemp(prefix="bench-startup-")
+        try:
+            results["build"] = summarize([run_probe(BUILD_PROBE, os.path.join(tmpdir, "index"))])
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    for name, phases in results.items():
+        print(f"\n{name}")
+        print(f"  {'phase':<20}{'p50 ms':>12}{'max ms':>12}")
+        for phase, summary in phases.items():
+            print(f"  {phase:<20}{summary['p50_ms']:>12.0f}{summary['p99_ms']:>12.0f}")
+    print(json.dumps({"benchmark": "startup", "rounds": args.rounds, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
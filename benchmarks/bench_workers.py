@@ -0,0 +1,130 @@
+"""
+Retrieval throughput and memory vs number of worker processes, the way
+``python -m clinical_rag.serve`` runs them: every process loads the persisted
+index read-only (FAISS index memory-mapped where supported, mmapped docstore)
+and runs the question corpus in a loop (result / embedding caches off) for a
+fixed time.
+
+Two embedding setups per worker count:
+
+- local: each worker loads its own embedding model
+- shared: one ``clinical_rag.embedding_server`` process for all workers
+  (its memory is reported separately)
+
+Memory is RSS and PSS (proportional set size, shared pages divided between
+the processes mapping them) per worker, from /proc (Linux only; 0 elsewhere).
+Near-linear scaling shows as questions/s growing with the worker count while
+the summed PSS grows much slower than workers x single-worker RSS.
+
+Usage:
+    python benchmarks/bench_workers.py [faiss_index_optimized] [--workers 1 2 4] [--seconds 20]
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+
+from common import ROOT, load_embeddings, load_questions
+
+
+def memory_kb(pid: str = "self") -> dict:
+    """RSS / PSS in KB from /proc/<pid>/smaps_rollup."""
+    usage = {"rss_kb": 0, "pss_kb": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    usage[f"{key.lower()}_kb"] = int(value.split()[0])
+    except OSError:
+        pass
+    return usage
+
+
+def worker(folder: str, questions: list, seconds: float, shared: bool, start, results):
+    from clinical_rag.embedding_server import embeddings_from_env
+    from clinical_rag.retrieval import RetrievalConfig, RetrievalEngine, load_vector_store
+
+    embeddings = embeddings_from_env() if shared else load_embeddings()
+    store = load_vector_store(folder, embeddings, mmap_index=True)
+    engine = RetrievalEngine(store, RetrievalConfig(k=12, cache_size=0))
+    engine.retrieve(questions[0]["question"])
+
+    start.wait()
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        q = questions[done % len(questions)]
+        engine.retrieve(q["question"], study_filter=q.get("study_filter"))
+        done += 1
+    results.put({"questions": done, **memory_kb()})
+
+
+def run(folder: str, workers: int, seconds: float, shared: bool, questions: list) -> dict:
+    ctx = mp.get_context("spawn")
+    start = ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(folder, questions, seconds, shared, start, results))
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    start.wait()
+    per_worker = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    total = sum(r["questions"] for r in per_worker)
+    return {
+        "workers": workers,
+        "embeddings": "shared" if shared else "local",
+        "questions_per_s": round(total / seconds, 2),
+        "worker_rss_mb": round(sum(r["rss_kb"] for r in per_worker) / 1024, 1),
+        "worker_pss_mb": round(sum(r["pss_kb"] for r in per_worker) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("folder", nargs="?", default=os.path.join(ROOT, "faiss_index_optimized"))
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--no-shared", action="store_true", help="Skip the shared embedding server runs")
+    args = parser.parse_args()
+
+    from clinical_rag.retrieval import persisted_index_exists
+    from clinical_rag.serve import start_embedding_server
+
+    if not persisted_index_exists(args.folder):
+        raise SystemExit(f"No persisted index at {args.folder}")
+    questions = load_questions()
+
+    results = [run(args.folder, n, args.seconds, False, questions) for n in args.workers]
+    server_memory = None
+    if not args.no_shared:
+        env = dict(os.environ)
+        server = start_embedding_server(env)
+        os.environ.update(env)
+        try:
+            results += [run(args.folder, n, args.seconds, True, questions) for n in args.workers]
+            server_memory = memory_kb(str(server.pid))
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    base = {r["embeddings"]: r["questions_per_s"] for r in results if r["workers"] == args.workers[0]}
+    print(f"{'embeddings':<12}{'workers':>8}{'q/s':>10}{'scaling':>9}{'RSS MB':>10}{'PSS MB':>10}")
+    for r in results:
+        scaling = r["questions_per_s"] / base[r["embeddings"]] if base.get(r["embeddings"]) else 0.0
+        print(f"{r['embeddings']:<12}{r['workers']:>8}{r['questions_per_s']:>10.1f}{scaling:>8.2f}x"
+              f"{r['worker_rss_mb']:>10.1f}{r['worker_pss_mb']:>10.1f}")
+    if server_memory:
+        print(f"embedding server: RSS {server_memory['rss_kb'] / 1024:.1f} MB, PSS {server_memory['pss_kb'] / 1024:.1f} MB")
+    print(json.dumps({"benchmark": "workers", "seconds": args.seconds, "results": results,
+                      "embedding_server": server_memory}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
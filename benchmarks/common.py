@@ -0,0 +1,127 @@
+"""
+Shared helpers for the benchmark scripts: question corpus, percentiles and
+loading the persisted vector store.
+"""
+
+import hashlib
+import json
+import math
+import os
+import sys
+from collections import defaultdict
+from typing import List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions.jsonl")
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def load_questions(path: str = QUESTIONS_PATH, scope: Optional[str] = None) -> List[dict]:
+    """Load the fixed CRA question corpus, optionally only one scope."""
+    with open(path, "r", encoding="utf-8") as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+    if scope:
+        questions = [q for q in questions if q["scope"] == scope]
+    return questions
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (no numpy needed)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def latency_summary(seconds: List[float]) -> dict:
+    """p50/p95/p99/mean in milliseconds."""
+    ms = [s * 1000 for s in seconds]
+    return {
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        "n": len(ms),
+    }
+
+
+def doc_key(doc) -> str:
+    """Stable identity of a retrieved document across index formats."""
+    doc_id = doc.metadata.get("id")
+    if doc_id:
+        return str(doc_id)
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()[:16]
+
+
+def parent_key(doc) -> str:
+    """Identity of the source document: the parent of a section chunk, else ``doc_key``."""
+    parent_id = doc.metadata.get("parent_id")
+    return str(parent_id) if parent_id else doc_key(doc)
+
+
+def load_embeddings(model_name: str = EMBEDDING_MODEL):
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"normalize_embeddings": True, "batch_size": 64},
+    )
+
+
+def load_store(folder: str, embeddings=None, quantization: str = "flat"):
+    """Load the persisted vector store used by the backend."""
+    from clinical_rag.retrieval import load_vector_store
+
+    return load_vector_store(folder, embeddings or load_embeddings(), quantization=quantization)
+
+
+def legacy_rerank(candidates, k: int, study_filter: Optional[str] = None):
+    """
+    Stages 2-4 of the original ``advanced_retrieve`` on Document objects
+    (priority dict rebuilt per candidate, ``doc not in final_docs`` backfill).
+    Kept as the baseline for the retrieval benchmarks.
+    """
+    if study_filter:
+        study_filter_normalized = study_filter.strip().lower()
+        filtered = [
+            doc for doc in candidates
+            if doc.metadata.get('study', '').lower().strip() == study_filter_normalized
+            or doc.metadata.get('study', '').lower().strip().replace('study ', '') == study_filter_normalized.replace('study ', '')
+        ]
+        if len(filtered) >= k // 2:
+            candidates = filtered
+
+    def get_priority_score(doc):
+        priority = doc.metadata.get('priority', 3)
+        priority_boost = {0: 100, 1: 50, 2: 25, 3: 10}
+        return priority_boost.get(priority, 0)
+
+    candidates_sorted = sorted(candidates, key=get_priority_score, reverse=True)
+
+    final_docs = []
+    study_count = defaultdict(int)
+    max_per_study = max(2, k // 5)
+    for doc in candidates_sorted:
+        study = doc.metadata.get('study', 'Unknown')
+        if doc.metadata.get('priority', 3) <= 1:
+            final_docs.append(doc)
+            study_count[study] += 1
+        elif study_count[study] < max_per_study:
+            final_docs.append(doc)
+            study_count[study] += 1
+        if len(final_docs) >= k:
+            break
+
+    if len(final_docs) < k:
+        for doc in candidates_sorted:
+            if doc not in final_docs:
+                final_docs.append(doc)
+            if len(final_docs) >= k:
+                break
+
+    return final_docs[:k]
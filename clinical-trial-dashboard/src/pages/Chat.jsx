@@ -5,6 +5,12 @@ import { streamChat } from '../services/api'
 
 const STORAGE_KEY = 'clinical-trial-chat-history'
 
+// Server-side memory session; history is sent only to restore a saved conversation
+const newSession = (id = null) => ({
+  id: id || `chat-${Date.now()}-${Math.random().toString(36).slice(2, 10)}`,
+  synced: false
+})
+
 const suggestedQuestions = [
   "What are the overall data quality trends?",
   "Which sites have the highest deviation rates?",
@@ -118,6 +124,7 @@ export default function Chat() {
   const [emailSending, setEmailSending] = useState(false)
   const messagesEndRef = useRef(null)
   const inputRef = useRef(null)
+  const sessionRef = useRef(newSession())
 
   // Load saved conversations on mount
   useEffect(() => {
@@ -171,6 +178,7 @@ export default function Chat() {
   const loadConversation = (conv) => {
     setMessages(conv.messages)
     setActiveConversationId(conv.id)
+    sessionRef.current = newSession(`conv-${conv.id}`)
   }
 
   const startNewConversation = () => {
@@ -181,6 +189,7 @@ export default function Chat() {
       }
     ])
     setActiveConversationId(null)
+    sessionRef.current = newSession()
   }
 
   const deleteConversation = (id, e) => {
@@ -233,8 +242,12 @@ export default function Chat() {
     let finalSources = []
     let extractedEmail = null
 
+    // The server remembers the conversation; send history only until it has it
+    const session = sessionRef.current
+    const historyToSync = session.synced ? null : currentMessages
+    session.synced = true
+
     try {
-      // Pass chat history (last 10 messages) for memory feature
       await streamChat(
         question.trim(),
         (accumulatedText) => {
@@ -290,7 +303,8 @@ export default function Chat() {
             setTimeout(() => setShowEmailModal(true), 500)
           }
         },
-        currentMessages  // Pass chat history for memory (last 10 will be used)
+        historyToSync,
+        session.id
       )
     } catch (error) {
       setMessages((prev) => {
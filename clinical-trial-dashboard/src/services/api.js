@@ -31,6 +31,16 @@ export async function fetchMLResults() {
   return res.json()
 }
 
+export async function queryAnalytics({ groupBy = [], filters = {}, measures = null, sortBy = null, descending = true, limit = null } = {}) {
+  const res = await fetch(`${API_BASE}/analytics/query`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ group_by: groupBy, filters, measures, sort_by: sortBy, descending, limit })
+  })
+  if (!res.ok) throw new Error('Failed to query analytics')
+  return res.json()
+}
+
 export async function sendChatMessage(question, studyFilter = null, k = 12) {
   const res = await fetch(`${API_BASE}/chat`, {
     method: 'POST',
@@ -93,8 +103,9 @@ async function handleStreamResponse(res, onChunk, onComplete) {
 }
 
 // Simple streaming function for Chat page - returns accumulated text
-// Now supports chat_history for conversation memory (last 10 messages)
-export async function streamChat(question, onChunk, onComplete, chatHistory = null) {
+// Conversation memory lives on the server per sessionId; chatHistory is only
+// needed to restore a conversation the server has not seen yet
+export async function streamChat(question, onChunk, onComplete, chatHistory = null, sessionId = null) {
   // Format chat history for the API (last 10 messages)
   const formattedHistory = chatHistory 
     ? chatHistory.slice(-10).map(msg => ({ role: msg.role, content: msg.content }))
@@ -107,7 +118,8 @@ export async function streamChat(question, onChunk, onComplete, chatHistory = nu
       question, 
       study_filter: null, 
       k: 12,
-      chat_history: formattedHistory
+      chat_history: formattedHistory,
+      session_id: sessionId
     })
   })
   
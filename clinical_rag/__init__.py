@@ -0,0 +1,7 @@
+"""
+ClinicalAI RAG building blocks shared by the FastAPI backend
+(``rag_pipeline_new.py``) and the Hugging Face Space (``huggingface-space/app.py``).
+
+Submodules are imported explicitly (``from clinical_rag.docstore import ...``)
+so that importing the package itself never pulls in FAISS, LangChain or torch.
+"""
@@ -0,0 +1,205 @@
+"""
+Admission control for LLM calls: bounded concurrency, a bounded fair queue
+and load shedding.
+
+Without it every chat request goes straight to the upstream endpoint; under a
+burst latency grows for everyone until upstream rate limits turn requests
+into errors. ``AdmissionController`` lets ``max_in_flight`` LLM calls run at
+once (per server process). Further requests wait in a queue of at most
+``max_queue`` entries, served round-robin across clients so one client
+firing many requests cannot starve the others; a client may hold at most
+``max_per_client`` requests (running + waiting) while the queue is in use.
+
+A request that cannot be queued (queue full, client over its share) or waits
+longer than ``queue_timeout_s`` raises ``Overloaded`` with a ``retry_after``
+estimate (recent LLM call time x queue length / slots). The API turns it
+into 429 + ``Retry-After`` or a retrieval-only answer (``LLM_OVERLOAD_MODE``).
+
+Queue wait times go to ``rag_llm_queue_wait_seconds`` and admission outcomes
+to ``rag_llm_admission_total`` (``clinical_rag.tracing.METRICS``); the wait
+is also an ``llm_queue`` span of the request trace.
+
+The controller is asyncio-only: acquire and release from the server's event
+loop (sync callers such as the report jobs have their own rate limit).
+
+Usage:
+    admission = AdmissionController.from_env()
+    admission.check(client)           # optional fast-fail before retrieval
+    async with admission.slot(client):
+        answer = await llm_call()
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from clinical_rag.tracing import METRICS, span
+
+
+class Overloaded(Exception):
+    """No LLM slot is available within the admission limits."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server is busy ({reason.replace('_', ' ')}); retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded, per-client round-robin wait queue.
+
+    Args:
+        max_in_flight: LLM calls running at once
+        max_queue: Requests waiting for a slot (beyond it: rejected)
+        max_per_client: Requests one client may hold while others wait
+        queue_timeout_s: Longest wait for a slot before giving up
+    """
+
+    def __init__(self, max_in_flight: int = 8, max_queue: int = 32, max_per_client: int = 4,
+                 queue_timeout_s: float = 30.0):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.max_per_client = max(1, max_per_client)
+        self.queue_timeout_s = queue_timeout_s
+        self.in_flight = 0
+        self.queued = 0
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._per_client: Counter = Counter()
+        self._service_s = 5.0  # EWMA of slot hold time, seeds Retry-After
+        self._counts: Counter = Counter()
+
+    @classmethod
+    def from_env(cls, prefix: str = "LLM_") -> "AdmissionController":
+        """Build from ``LLM_MAX_IN_FLIGHT``, ``LLM_QUEUE_DEPTH``, ``LLM_MAX_PER_CLIENT`` and ``LLM_QUEUE_TIMEOUT_S``."""
+        env = os.environ
+        return cls(
+            max_in_flight=int(env.get(f"{prefix}MAX_IN_FLIGHT", "8")),
+            max_queue=int(env.get(f"{prefix}QUEUE_DEPTH", "32")),
+            max_per_client=int(env.get(f"{prefix}MAX_PER_CLIENT", "4")),
+            queue_timeout_s=float(env.get(f"{prefix}QUEUE_TIMEOUT_S", "30")),
+        )
+
+    def retry_after(self) -> int:
+        """Seconds until a new request would likely get a slot (1-60)."""
+        estimate = self._service_s * (self.queued + 1) / self.max_in_flight
+        return int(min(60, max(1, math.ceil(estimate))))
+
+    def _rejection(self, client: str) -> Optional[str]:
+        if self.in_flight < self.max_in_flight and not self.queued:
+            return None
+        if self.queued >= self.max_queue:
+            return "queue_full"
+        if self._per_client[client] >= self.max_per_client:
+            return "client_limit"
+        return None
+
+    def _reject(self, reason: str):
+        self._counts[reason] += 1
+        METRICS.inc("rag_llm_admission_total", outcome=reason)
+        raise Overloaded(reason, self.retry_after())
+
+    def check(self, client: str):
+        """Raise ``Overloaded`` if a request from ``client`` would be turned away now."""
+        reason = self._rejection(client)
+        if reason:
+            self._reject(reason)
+
+    @asynccontextmanager
+    async def slot(self, client: str):
+        """Hold one LLM slot for the body; yields the seconds spent waiting."""
+        waited = await self._acquire(client)
+        start = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            self._release(client, time.perf_counter() - start)
+
+    async def _acquire(self, client: str) -> float:
+        with span("llm_queue") as info:
+            start = time.perf_counter()
+            if self.in_flight < self.max_in_flight and not self.queued:
+                self.in_flight += 1
+                self._per_client[client] += 1
+            else:
+                self.check(client)
+                await self._wait(client)
+            waited = time.perf_counter() - start
+            info.update(wait_ms=round(waited * 1000, 1), queued=self.queued)
+        self._counts["admitted"] += 1
+        METRICS.inc("rag_llm_admission_total", outcome="admitted")
+        METRICS.observe("rag_llm_queue_wait_seconds", waited)
+        return waited
+
+    async def _wait(self, client: str):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(client, deque()).append(future)
+        self.queued += 1
+        self._per_client[client] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout_s)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done():
+                # The slot was handed over just as the wait ended: give it back
+                self._release(client, 0.0, record=False)
+            else:
+                future.cancel()
+                self._dequeue(client, future)
+                self._drop_client(client)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("queue_timeout")
+            raise
+
+    def _dequeue(self, client: str, future: asyncio.Future):
+        waiters = self._waiters.get(client)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            self.queued -= 1
+            if not waiters:
+                del self._waiters[client]
+
+    def _drop_client(self, client: str):
+        self._per_client[client] -= 1
+        if self._per_client[client] <= 0:
+            del self._per_client[client]
+
+    def _release(self, client: str, held_s: float, record: bool = True):
+        self.in_flight -= 1
+        self._drop_client(client)
+        if record:
+            self._service_s = 0.8 * self._service_s + 0.2 * held_s
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to waiters, one client at a time in rotation."""
+        while self.in_flight < self.max_in_flight and self._waiters:
+            client, waiters = next(iter(self._waiters.items()))
+            future = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self._waiters.move_to_end(client)
+            else:
+                del self._waiters[client]
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def status(self) -> Dict[str, object]:
+        """Limits, current load and admission counts."""
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "max_per_client": self.max_per_client,
+            "queue_timeout_s": self.queue_timeout_s,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "waiting_clients": len(self._waiters),
+            "avg_llm_s": round(self._service_s, 3),
+            "retry_after_s": self.retry_after(),
+            "outcomes": dict(self._counts),
+        }
@@ -0,0 +1,122 @@
+"""
+Build the persisted vector index, separately from serving.
+
+Loads the RAG documents (``clinical_rag.corpus``, documents longer than
+the encoder window split into ``##`` sections by ``clinical_rag.chunking``),
+writes the compact docstore, embeds it with the multi-process pipeline
+(``clinical_rag.embedding_pipeline``, resumable) and builds the FAISS index;
+with ``--quantization`` also the compressed index. Each build is a new
+snapshot (``clinical_rag.snapshots``), published atomically when complete;
+running servers swap to it in the background (``clinical_rag.runtime``).
+Phase timings are printed at the end.
+
+Usage:
+    python -m clinical_rag.build [--folder faiss_index_optimized] [--quantization int8] [--processes 8]
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, Optional
+
+from clinical_rag.corpus import (
+    BASE_PATH,
+    CORPUS_FILES,
+    MAX_SUBJECTS_PER_STUDY,
+    document_distribution,
+    load_documents,
+)
+from clinical_rag.data_version import compute_data_version
+from clinical_rag.embedding_pipeline import EMBEDDING_MODEL, available_cores, build_compact_index
+from clinical_rag.quantization import QUANTIZATION_KINDS, write_quantized_index
+from clinical_rag.runtime import VECTORSTORE_PATH
+from clinical_rag.snapshots import publish, staging_dir
+
+
+def build_index(
+    folder: str = VECTORSTORE_PATH,
+    base_path: str = BASE_PATH,
+    quantization: Optional[str] = None,
+    processes: Optional[int] = None,
+    max_subjects_per_study: int = MAX_SUBJECTS_PER_STUDY,
+    keep: int = 3,
+    chunk_sections: bool = True,
+) -> Dict[str, float]:
+    """
+    Build a new snapshot under ``folder`` from the documents in ``base_path``
+    and make it the active one.
+
+    Args:
+        keep: Published snapshots kept (see ``clinical_rag.snapshots.publish``)
+        chunk_sections: Index long multi-section documents per ``##`` section
+
+    Returns:
+        Phase -> seconds
+    """
+    timings = {}
+    data_hash = compute_data_version(base_path, CORPUS_FILES)
+    staging = staging_dir(folder, data_hash)
+
+    start = time.perf_counter()
+    distribution = document_distribution(base_path)
+    documents, doc_counts = load_documents(base_path, max_subjects_per_study, chunk_sections)
+    timings["load_documents"] = time.perf_counter() - start
+
+    totals = {study: sum(counts.values()) for study, counts in distribution.items()}
+    print(f"📚 Loaded {sum(doc_counts.values()):,} of {sum(totals.values()):,} documents "
+          f"(subject documents capped at {max_subjects_per_study} per study):")
+    for doc_type, count in sorted(doc_counts.items(), key=lambda x: -x[1]):
+        print(f"  • {doc_type}: {count:,}")
+    if chunk_sections:
+        print(f"✂️  {len(documents):,} index entries after splitting into sections")
+
+    start = time.perf_counter()
+    print(f"🔄 Embedding {len(documents):,} documents with {processes or available_cores()} worker(s)...")
+    build_compact_index(documents, staging, model_name=EMBEDDING_MODEL, batch_size=64, processes=processes)
+    timings["embed_and_index"] = time.perf_counter() - start
+
+    if quantization and quantization != "flat":
+        start = time.perf_counter()
+        path = write_quantized_index(staging, quantization)
+        timings["quantized_index"] = time.perf_counter() - start
+        print(f"🗜️  {quantization} index -> {os.path.basename(path)}")
+
+    version = publish(folder, staging, {
+        "data_hash": data_hash,
+        "model": EMBEDDING_MODEL,
+        "documents": len(documents),
+        "doc_counts": doc_counts,
+        "chunking": "sections" if chunk_sections else "none",
+        "max_subjects_per_study": max_subjects_per_study,
+        "quantization": quantization or "flat",
+        "build_s": {phase: round(seconds, 3) for phase, seconds in timings.items()},
+    }, keep=keep)
+    print(f"💾 Snapshot {version} is now active in {folder}/ (index.faiss + docstore/ + embeddings.npy)")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the persisted vector index")
+    parser.add_argument("--folder", default=VECTORSTORE_PATH)
+    parser.add_argument("--data", default=BASE_PATH, help="Folder with the rag_*.jsonl files")
+    parser.add_argument("--quantization", choices=QUANTIZATION_KINDS, default=os.environ.get("VECTOR_QUANTIZATION"),
+                        help="Also build a compressed index (see clinical_rag.quantization)")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--max-subjects-per-study", type=int, default=MAX_SUBJECTS_PER_STUDY)
+    parser.add_argument("--keep", type=int, default=3, help="Snapshots kept, the new one included")
+    parser.add_argument("--no-section-chunks", action="store_true",
+                        help="Index study/site/CRA documents whole instead of per ## section")
+    args = parser.parse_args()
+
+    timings = build_index(
+        args.folder, args.data, quantization=args.quantization, processes=args.processes,
+        max_subjects_per_study=args.max_subjects_per_study, keep=args.keep,
+        chunk_sections=not args.no_section_chunks,
+    )
+    print("⏱️ Build timings:")
+    for phase, seconds in timings.items():
+        print(f"   {phase:<22}{seconds:>10.1f} s")
+
+
+if __name__ == "__main__":
+    main()
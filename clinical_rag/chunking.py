@@ -0,0 +1,175 @@
+"""
+Section-aware chunking of the long markdown documents.
+
+Site reports, study summaries and CRA reports are multi-section markdown
+(``## Issue Breakdown``, ``## Priority Subjects``, ``## Recommended Actions``).
+Indexed whole, everything past all-MiniLM-L6-v2's input limit (256 word
+pieces) was never embedded, and the whole document went to the LLM whenever
+any part of it matched.
+
+``split_document`` cuts such a document at its ``##`` headings when it is
+longer than the encoder window (``MAX_WHOLE_TOKENS``); shorter ones, e.g.
+the ~140-token site reports, stay whole so that ``k`` keeps counting
+documents. Text before the first heading becomes an "Overview" section, and
+very short sections (e.g. a report date block) are folded into their
+neighbour. Each section becomes its own index entry, prefixed with a
+one-line header (title, study, site) so it is identifiable on its own, with
+metadata linking it to its parent document:
+
+- ``parent_id``: id of the source record (the chunk's ``id`` is ``<parent_id>#<n>``)
+- ``section``: heading text
+- ``section_index`` / ``section_count``: position among the parent's sections
+
+A parent's sections are indexed at consecutive positions, so the whole
+document can be rebuilt from any of them (``RetrievalEngine.parent_documents``).
+``merge_sections`` folds retrieved sections of one parent into a single
+context block that carries the header once.
+
+Usage:
+    chunks = split_document(document)   # [document] for other doc types
+    blocks = merge_sections(docs)
+"""
+
+import re
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+from clinical_rag.prompts import estimate_tokens
+
+# Multi-section markdown documents (doc_type values of clinical_rag.corpus)
+CHUNKED_DOC_TYPES = ("study_summary", "cra_report", "site_summary")
+MIN_SECTION_CHARS = 80  # Shorter section bodies are merged with a neighbour
+# all-MiniLM-L6-v2 embeds at most 256 word pieces; shorter documents are indexed whole
+MAX_WHOLE_TOKENS = 256
+PREAMBLE_HEADING = "Overview"
+
+_SECTION = re.compile(r"^## +(.+?)\s*$", re.MULTILINE)
+_RULE = re.compile(r"^\s*-{3,}\s*$", re.MULTILINE)
+
+
+def section_header(doc: Document) -> str:
+    """One-line header: the document title plus study / site when the title lacks them."""
+    first_line = doc.page_content.lstrip().split("\n", 1)[0]
+    title = first_line if first_line.startswith("# ") else f"# {doc.metadata.get('doc_type', 'document')}"
+    extra = [
+        str(doc.metadata[key]) for key in ("study", "site")
+        if doc.metadata.get(key) and str(doc.metadata[key]) not in title
+    ]
+    return f"{title} | {' | '.join(extra)}" if extra else title
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """
+    (heading, section text incl. its ``##`` line) per section. Text before
+    the first heading, without the ``#`` title line (it is in every chunk's
+    header), is returned as an "Overview" section when not empty.
+    """
+    matches = list(_SECTION.finditer(text))
+    sections = []
+    lines = (text[:matches[0].start()] if matches else "").strip().splitlines()
+    if lines and lines[0].startswith("# "):
+        lines = lines[1:]
+    preamble = _RULE.sub("", "\n".join(lines)).strip()
+    if preamble:
+        sections.append((PREAMBLE_HEADING, preamble))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = _RULE.sub("", text[match.start():end]).strip()
+        sections.append((match.group(1).strip(), body))
+    return sections
+
+
+def _merge_short(sections: List[Tuple[str, str]], min_chars: int) -> List[Tuple[str, str]]:
+    merged: List[Tuple[str, str]] = []
+    pending = None
+    for heading, body in sections:
+        if pending is not None:
+            heading, body = f"{pending[0]} / {heading}", f"{pending[1]}\n\n{body}"
+            pending = None
+        if len(body) - len(body.split("\n", 1)[0]) < min_chars:
+            pending = (heading, body)
+        else:
+            merged.append((heading, body))
+    if pending is not None:
+        if merged:
+            heading, body = merged.pop()
+            merged.append((f"{heading} / {pending[0]}", f"{body}\n\n{pending[1]}"))
+        else:
+            merged.append(pending)
+    return merged
+
+
+def split_document(doc: Document, min_section_chars: int = MIN_SECTION_CHARS,
+                   max_whole_tokens: int = MAX_WHOLE_TOKENS) -> List[Document]:
+    """
+    Section chunks of a long multi-section document, or ``[doc]`` unchanged.
+
+    Documents of other doc types, that fit the encoder window
+    (``max_whole_tokens``, estimated) or with fewer than two sections are
+    returned as they are.
+    """
+    if doc.metadata.get("doc_type") not in CHUNKED_DOC_TYPES:
+        return [doc]
+    if estimate_tokens(doc.page_content) <= max_whole_tokens:
+        return [doc]
+    sections = _merge_short(split_sections(doc.page_content), min_section_chars)
+    if len(sections) < 2:
+        return [doc]
+
+    header = section_header(doc)
+    parent_id = str(doc.metadata.get("id", header))
+    chunks = []
+    for i, (heading, body) in enumerate(sections):
+        metadata = dict(
+            doc.metadata,
+            id=f"{parent_id}#{i}",
+            parent_id=parent_id,
+            section=heading,
+            section_index=i,
+            section_count=len(sections),
+        )
+        chunks.append(Document(page_content=f"{header}\n\n{body}", metadata=metadata))
+    return chunks
+
+
+def _split_header(content: str) -> Tuple[str, str]:
+    header, _, body = content.partition("\n\n")
+    return header, body
+
+
+def merge_sections(docs) -> List[Document]:
+    """
+    Fold section chunks of the same parent into one document (header once,
+    sections in document order), at the position of the parent's first
+    chunk. Whole documents pass through unchanged.
+    """
+    groups: Dict[str, List[Document]] = {}
+    order = []
+    for doc in docs:
+        parent_id = doc.metadata.get("parent_id")
+        if parent_id is None:
+            order.append(doc)
+        elif parent_id in groups:
+            groups[parent_id].append(doc)
+        else:
+            groups[parent_id] = [doc]
+            order.append(parent_id)
+
+    merged = []
+    for entry in order:
+        if isinstance(entry, Document):
+            merged.append(entry)
+            continue
+        chunks = groups[entry]
+        if len(chunks) == 1:
+            merged.append(chunks[0])
+            continue
+        chunks = sorted({c.metadata.get("section_index", 0): c for c in chunks}.values(),
+                        key=lambda c: c.metadata.get("section_index", 0))
+        header = _split_header(chunks[0].page_content)[0]
+        body = "\n\n".join(_split_header(c.page_content)[1] for c in chunks)
+        metadata = dict(chunks[0].metadata, id=entry, section=[c.metadata.get("section") for c in chunks])
+        metadata.pop("section_index", None)
+        merged.append(Document(page_content=f"{header}\n\n{body}", metadata=metadata))
+    return merged
@@ -0,0 +1,165 @@
+"""
+Typed columnar store for the consolidated subject tables.
+
+The tables used to exist only as CSV (``global_clinical_data.csv`` plus an
+identical ``master_clinical_data.csv``, ``all_subjects_full.csv``), so every
+consumer re-parsed ~1.5-5 MB of text with type inference. ``write_dataset``
+stores a table once, typed:
+
+- low-cardinality text columns (Study, Site, Region, risk_category, ...) as
+  categoricals, i.e. Arrow dictionary arrays
+- whole-number columns (counts the CSV round trip turned into floats) as
+  the smallest integer type
+
+in two files next to the CSV stem:
+
+- ``<stem>.arrow``: uncompressed Arrow IPC file, memory-mapped by readers so
+  loading maps the file instead of copying or parsing it
+- ``<stem>.parquet``: zstd-compressed Parquet for notebooks and exchange
+
+``load_table`` / ``load_frame`` read the Arrow file when present and fall
+back to Parquet, then to the CSV (typed the same way), so deployments that
+only ship CSVs keep working.
+
+Convert the existing CSVs:
+    python -m clinical_rag.columnar [consolidated_data/global_clinical_data.csv ...]
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Text columns stored as categoricals even when their cardinality is high
+CATEGORICAL = (
+    "Study", "Country", "Site", "Region", "LatestVisit", "SubjectStatus",
+    "risk_category", "predicted_risk",
+)
+# Other text columns become categoricals below this unique/rows ratio
+CATEGORY_MAX_RATIO = 0.5
+
+# Tables converted by the CLI (CSV paths relative to the repo root)
+TABLES = (
+    "consolidated_data/global_clinical_data.csv",
+    "consolidated_data/all_subjects_full.csv",
+    "consolidated_data/all_studies_subjects.csv",
+    "clinical-trial-dashboard/public/data/all_studies_subjects.csv",
+)
+
+_tables: Dict[str, Tuple[int, pa.Table]] = {}
+_tables_lock = threading.Lock()
+
+
+def stem(path: str) -> str:
+    """``consolidated_data/global_clinical_data.csv`` -> ``consolidated_data/global_clinical_data``."""
+    root, ext = os.path.splitext(path)
+    return root if ext in (".csv", ".arrow", ".parquet") else path
+
+
+def typed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Categoricals and downcast integers for a frame read from CSV."""
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_string_dtype(series):
+            if col in CATEGORICAL or series.nunique() <= CATEGORY_MAX_RATIO * len(series):
+                df[col] = series.astype("category")
+        elif pd.api.types.is_float_dtype(series):
+            if not series.isna().any() and (series % 1 == 0).all():
+                df[col] = pd.to_numeric(series.astype("int64"), downcast="integer")
+        elif pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast="integer")
+    return df
+
+
+def write_dataset(df: pd.DataFrame, path: str) -> List[str]:
+    """
+    Write ``df`` as ``<stem>.arrow`` and ``<stem>.parquet``.
+
+    Returns:
+        Paths written
+    """
+    base = stem(path)
+    table = pa.Table.from_pandas(typed_frame(df), preserve_index=False)
+    arrow_path, parquet_path = f"{base}.arrow", f"{base}.parquet"
+
+    tmp = f"{arrow_path}.tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, arrow_path)
+    pq.write_table(table, parquet_path, compression="zstd")
+    return [arrow_path, parquet_path]
+
+
+def load_table(path: str, columns: Optional[Sequence[str]] = None) -> pa.Table:
+    """
+    The table at ``path`` (any of the stem, ``.arrow``, ``.parquet`` or
+    ``.csv``). The Arrow file is memory-mapped and cached until its mtime
+    changes; ``columns`` selects without copying.
+    """
+    base = stem(path)
+    arrow_path = f"{base}.arrow"
+    if os.path.exists(arrow_path):
+        mtime = os.stat(arrow_path).st_mtime_ns
+        with _tables_lock:
+            cached = _tables.get(arrow_path)
+            if cached is None or cached[0] != mtime:
+                with pa.memory_map(arrow_path, "r") as source:
+                    cached = (mtime, pa.ipc.open_file(source).read_all())
+                _tables[arrow_path] = cached
+        table = cached[1]
+        return table.select(list(columns)) if columns else table
+
+    if os.path.exists(f"{base}.parquet"):
+        return pq.read_table(f"{base}.parquet", columns=list(columns) if columns else None, memory_map=True)
+
+    if os.path.exists(f"{base}.csv"):
+        df = typed_frame(pd.read_csv(f"{base}.csv", usecols=list(columns) if columns else None))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    raise FileNotFoundError(f"No .arrow, .parquet or .csv table at {base}")
+
+
+def sample_table(table: pa.Table, n: int, seed: Optional[int] = None) -> pa.Table:
+    """Up to ``n`` random rows in table order; only those rows are copied out of the memory map."""
+    if table.num_rows <= n:
+        return table
+    rng = np.random.default_rng(seed)
+    return table.take(pa.array(np.sort(rng.choice(table.num_rows, size=n, replace=False))))
+
+
+def load_frame(path: str, columns: Optional[Sequence[str]] = None, sample: Optional[int] = None,
+               seed: Optional[int] = None) -> pd.DataFrame:
+    """
+    ``load_table`` as a DataFrame (dictionary columns become categoricals).
+    Columns and ``sample`` rows are selected in Arrow, so only they are
+    converted, not the whole mapped table.
+    """
+    table = load_table(path, columns)
+    if sample is not None:
+        table = sample_table(table, sample, seed)
+    return table.to_pandas()
+
+
+def main(argv: Optional[List[str]] = None):
+    paths = (argv if argv is not None else sys.argv[1:]) or [p for p in TABLES if os.path.exists(p)]
+    if not paths:
+        print("No CSV tables found")
+        return
+    for csv_path in paths:
+        t0 = time.perf_counter()
+        df = pd.read_csv(csv_path)
+        written = write_dataset(df, csv_path)
+        sizes = ", ".join(f"{os.path.basename(p)} {os.path.getsize(p) / 1024:,.0f} KB" for p in written)
+        print(f"✅ {csv_path} ({os.path.getsize(csv_path) / 1024:,.0f} KB, {len(df):,} rows) -> {sizes} "
+              f"in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
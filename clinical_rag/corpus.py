@@ -0,0 +1,160 @@
+"""
+The RAG document corpus indexed by the backend.
+
+Documents come from the ``rag_*.jsonl`` files in ``consolidated_data/`` (see
+the table at the top of ``rag_pipeline_new.py``). Studies are very unevenly
+sized (Study 16: 672 subjects vs Study 14: 3), so ``load_documents`` keeps
+every study-, site- and report-level document but samples subject-level
+documents per study (highest ``total_issues`` first, ``max_subjects_per_study``
+each). Multi-section study summaries, site reports and CRA reports are
+indexed per ``##`` section (``clinical_rag.chunking``).
+
+Usage:
+    documents, counts = load_documents("consolidated_data")
+"""
+
+import json
+import os
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+from clinical_rag.chunking import split_document
+
+BASE_PATH = "consolidated_data"
+DATA_DICTIONARY = "rag_data_dictionary.md"
+MAX_SUBJECTS_PER_STUDY = 100  # Cap subject docs per study to prevent dominance
+
+# Document store paths with descriptions
+RAG_FILES = {
+    "rag_study_documents.jsonl": {
+        "description": "Study-level summaries (highest priority)",
+        "doc_type": "study_summary",
+        "priority": 1
+    },
+    "rag_cra_reports.jsonl": {
+        "description": "CRA monitoring reports",
+        "doc_type": "cra_report",
+        "priority": 1
+    },
+    "rag_study_dqi_summaries.jsonl": {
+        "description": "Study DQI summaries",
+        "doc_type": "study_dqi",
+        "priority": 2
+    },
+    "rag_site_documents.jsonl": {
+        "description": "Site performance reports",
+        "doc_type": "site_summary",
+        "priority": 2
+    },
+    "rag_dqi_documents.jsonl": {
+        "description": "Subject DQI scores",
+        "doc_type": "subject_dqi",
+        "priority": 3
+    },
+    "rag_subject_documents.jsonl": {
+        "description": "Subject profiles",
+        "doc_type": "subject_profile",
+        "priority": 3
+    }
+}
+
+# Files that define the corpus (the index snapshot's data hash)
+CORPUS_FILES = (DATA_DICTIONARY, *RAG_FILES)
+
+
+def _records(filepath: str):
+    """(record, content) per JSONL line with non-empty content; bad lines are skipped."""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                data = json.loads(line)
+                content = data.get('content') or data.get('document', '')
+            except (ValueError, AttributeError):
+                continue
+            if content:
+                yield data, content
+
+
+def _document(data: dict, content: str, filename: str, config: dict) -> Document:
+    metadata = {k: v for k, v in data.items() if k not in ['content', 'document']}
+    metadata['source'] = filename
+    metadata['doc_type'] = config['doc_type']
+    metadata['priority'] = config['priority']
+    return Document(page_content=content, metadata=metadata)
+
+
+def document_distribution(base_path: str = BASE_PATH) -> Dict[str, Dict[str, int]]:
+    """Study -> doc_type -> count over all RAG files (before sampling)."""
+    counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for filename, config in RAG_FILES.items():
+        filepath = os.path.join(base_path, filename)
+        if not os.path.exists(filepath):
+            continue
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    study = json.loads(line).get('study', 'Unknown')
+                except (ValueError, AttributeError):
+                    continue
+                counts[study][config['doc_type']] += 1
+    return counts
+
+
+def load_documents(
+    base_path: str = BASE_PATH,
+    max_subjects_per_study: int = MAX_SUBJECTS_PER_STUDY,
+    chunk_sections: bool = True,
+) -> Tuple[List[Document], Dict[str, int]]:
+    """
+    Load the documents to index, with stratified sampling of subject documents.
+
+    1. The data dictionary (always included)
+    2. All study summaries, CRA reports, study DQI and site documents
+       (long ones split into ``##`` sections with ``chunk_sections``)
+    3. Subject-level documents: the ``max_subjects_per_study`` with the most
+       issues per study
+
+    Returns:
+        (documents and section chunks in index order, doc_type -> source document count)
+    """
+    documents = []
+    doc_counts: Dict[str, int] = defaultdict(int)
+
+    data_dict_path = os.path.join(base_path, DATA_DICTIONARY)
+    if os.path.exists(data_dict_path):
+        with open(data_dict_path, 'r', encoding='utf-8') as f:
+            documents.append(Document(
+                page_content=f.read(),
+                metadata={
+                    "source": DATA_DICTIONARY,
+                    "doc_type": "data_dictionary",
+                    "study": "ALL",
+                    "priority": 0
+                }
+            ))
+        doc_counts["data_dictionary"] += 1
+
+    for filename, config in RAG_FILES.items():
+        filepath = os.path.join(base_path, filename)
+        if not os.path.exists(filepath):
+            continue
+
+        if config['priority'] == 3:
+            # Subject-level docs: group by study, keep the highest-risk subjects
+            study_docs = defaultdict(list)
+            for data, content in _records(filepath):
+                study_docs[data.get('study', 'Unknown')].append((data, content))
+            for docs in study_docs.values():
+                sampled = sorted(docs, key=lambda x: -x[0].get('total_issues', 0))[:max_subjects_per_study]
+                for data, content in sampled:
+                    documents.append(_document(data, content, filename, config))
+                    doc_counts[config['doc_type']] += 1
+        else:
+            for data, content in _records(filepath):
+                doc = _document(data, content, filename, config)
+                documents.extend(split_document(doc) if chunk_sections else [doc])
+                doc_counts[config['doc_type']] += 1
+
+    return documents, dict(doc_counts)
@@ -0,0 +1,275 @@
+"""
+Pre-aggregated OLAP cube over the consolidated subject table.
+
+``dashboard_api.json`` only holds the breakdowns the notebook baked in. The
+cube instead stores the subject table aggregated once to the finest grain of
+its dimensions (Study x Site x Country x Region x SubjectStatus x
+risk_category, a few thousand cells instead of ~29k subjects) with additive
+measures only: sums and counts. Any group-by / filter combination is then a
+roll-up of that base cuboid; ratios (average DQI, clean rate, issues per
+subject) are derived after aggregation from their additive parts, so they
+stay exact at every level.
+
+``CubeCache`` builds the cube once per data version of its source tables,
+persists it under ``cube_cache/`` (Arrow, see ``clinical_rag.columnar``) and
+memoizes unfiltered roll-ups.
+
+Usage:
+    cube = CubeCache("consolidated_data").get()
+    cube.query(group_by=["Country", "Study"], filters={"risk_category": "High"},
+               measures=["subjects", "avg_dqi"], sort_by="subjects", limit=10)
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import pandas as pd
+
+from clinical_rag.columnar import load_frame, write_dataset
+from clinical_rag.data_version import compute_data_version
+
+DIMENSIONS = ("Study", "Site", "Country", "Region", "SubjectStatus", "risk_category")
+
+# Summed per cell (columns missing from the source table are skipped)
+SUM_MEASURES = (
+    "total_issues", "open_issues_count", "safety_discrepancy_count", "missing_pages_count",
+    "missing_lab_count", "outstanding_visits_count", "meddra_coding_pending", "whodd_coding_pending",
+    "inactivated_forms_count", "has_pending_items", "predicted_issues", "risk_probability",
+    "dqi_sum", "dqi_subjects", "clean_subjects",
+)
+
+# Ratio measures: (numerator, denominator, scale), computed after roll-up
+DERIVED_MEASURES = {
+    "avg_dqi": ("dqi_sum", "dqi_subjects", 1),
+    "clean_rate": ("clean_subjects", "dqi_subjects", 100),
+    "issues_per_subject": ("total_issues", "subjects", 1),
+    "avg_risk_probability": ("risk_probability", "subjects", 1),
+}
+
+# Source tables (stems under the data folder, see clinical_rag.columnar)
+SUBJECTS_TABLE = "all_subjects_full"
+DQI_TABLE = "global_clinical_data"
+SOURCE_FILES = tuple(f"{table}{ext}" for table in (SUBJECTS_TABLE, DQI_TABLE) for ext in (".csv", ".arrow"))
+
+MAX_ROLLUPS = 256
+
+
+def build_base(subjects: pd.DataFrame, dqi: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Aggregate the subject table to one row per dimension combination.
+
+    Args:
+        subjects: Subject-level table (``all_subjects_full``)
+        dqi: Optional table with ``Data_Quality_Index`` / ``Clean_Patient_Status``
+            per (Study, Subject), joined in as DQI measures
+    """
+    df = subjects.copy()
+    for key in ("Study", "Subject"):
+        df[key] = df[key].astype(str)
+    dqi_columns = ["Data_Quality_Index", "Clean_Patient_Status"]
+    if dqi is not None and set(dqi_columns) <= set(dqi.columns) and not set(dqi_columns) & set(df.columns):
+        scores = dqi[["Study", "Subject"] + dqi_columns].astype(
+            {"Study": str, "Subject": str}
+        ).drop_duplicates(["Study", "Subject"])
+        df = df.merge(scores, on=["Study", "Subject"], how="left")
+    if set(dqi_columns) <= set(df.columns):
+        df["dqi_sum"] = df["Data_Quality_Index"].fillna(0)
+        df["dqi_subjects"] = df["Data_Quality_Index"].notna().astype("int64")
+        df["clean_subjects"] = df["Clean_Patient_Status"].eq(True).astype("int64")
+
+    for dim in DIMENSIONS:
+        df[dim] = df[dim].astype(object).fillna("Unknown") if dim in df.columns else "Unknown"
+    df["subjects"] = 1
+    measures = ["subjects"] + [m for m in SUM_MEASURES if m in df.columns]
+    return df.groupby(list(DIMENSIONS), sort=False)[measures].sum().reset_index()
+
+
+class OlapCube:
+    """Roll-ups and slices of a base cuboid."""
+
+    def __init__(self, base: pd.DataFrame, version: str = ""):
+        self.version = version
+        self.dimensions = [d for d in DIMENSIONS if d in base.columns]
+        self.sums = [c for c in base.columns if c not in self.dimensions]
+        base = base.copy()
+        for col in self.sums:
+            # Persisted cells come back downcast; aggregate in 64 bit
+            base[col] = base[col].astype("int64" if pd.api.types.is_integer_dtype(base[col]) else "float64")
+        for dim in self.dimensions:
+            base[dim] = base[dim].astype("category")
+        self.base = base
+        self.derived = [
+            name for name, (num, den, _) in DERIVED_MEASURES.items() if num in self.sums and den in self.sums
+        ]
+        self._rollups: Dict[tuple, pd.DataFrame] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def measures(self) -> List[str]:
+        return self.sums + self.derived
+
+    def members(self) -> Dict[str, List[str]]:
+        """Values of every dimension."""
+        return {dim: sorted(self.base[dim].cat.categories.astype(str)) for dim in self.dimensions}
+
+    def _aggregate(self, frame: pd.DataFrame, group_by: Sequence[str]) -> pd.DataFrame:
+        if group_by:
+            return frame.groupby(list(group_by), observed=True, sort=False)[self.sums].sum().reset_index()
+        return frame[self.sums].sum().to_frame().T.astype(frame[self.sums].dtypes.to_dict())
+
+    def rollup(self, group_by: Sequence[str]) -> pd.DataFrame:
+        """Unfiltered aggregate over ``group_by`` (memoized)."""
+        key = tuple(group_by)
+        with self._lock:
+            cached = self._rollups.get(key)
+        if cached is not None:
+            return cached
+        result = self._aggregate(self.base, group_by)
+        with self._lock:
+            if len(self._rollups) >= MAX_ROLLUPS:
+                self._rollups.pop(next(iter(self._rollups)))
+            self._rollups[key] = result
+        return result
+
+    def _validate(self, group_by, filters, measures, sort_by):
+        unknown = [d for d in list(group_by) + list(filters) if d not in self.dimensions]
+        if unknown:
+            raise ValueError(f"Unknown dimension(s) {unknown}; available: {self.dimensions}")
+        if len(set(group_by)) != len(group_by):
+            raise ValueError("Duplicate dimension in group_by")
+        unknown = [m for m in measures if m not in self.measures]
+        if unknown:
+            raise ValueError(f"Unknown measure(s) {unknown}; available: {self.measures}")
+        if sort_by is not None and sort_by not in list(group_by) + list(measures):
+            raise ValueError(f"sort_by must be one of the selected dimensions or measures, got '{sort_by}'")
+
+    def query(
+        self,
+        group_by: Sequence[str] = (),
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+        measures: Optional[Sequence[str]] = None,
+        sort_by: Optional[str] = None,
+        descending: bool = True,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        """
+        Aggregate the cube.
+
+        Args:
+            group_by: Dimensions to group by (none = grand total)
+            filters: Dimension -> value or list of values to keep
+            measures: Measures to return (default: all)
+            sort_by: Dimension or measure to order by (default: first measure)
+            descending: Sort order
+            limit: Maximum rows returned
+
+        Returns:
+            One dict per group: dimension values and measures
+
+        Raises:
+            ValueError: Unknown dimension, measure or sort key
+        """
+        group_by = list(group_by)
+        filters = filters or {}
+        measures = list(measures) if measures else self.measures
+        self._validate(group_by, filters, measures, sort_by)
+
+        if filters:
+            mask = pd.Series(True, index=self.base.index)
+            for dim, values in filters.items():
+                values = [values] if isinstance(values, str) else list(values)
+                mask &= self.base[dim].isin(values)
+            result = self._aggregate(self.base[mask], group_by)
+        else:
+            result = self.rollup(group_by)
+
+        result = result.copy()
+        for name in self.derived:
+            if name in measures:
+                num, den, scale = DERIVED_MEASURES[name]
+                result[name] = (result[num] * scale / result[den].where(result[den] != 0)).round(4)
+        result = result[group_by + measures]
+
+        sort_by = sort_by or measures[0]
+        result = result.sort_values(sort_by, ascending=not descending, kind="stable")
+        if limit:
+            result = result.head(limit)
+        result = result.astype({dim: str for dim in group_by}).astype(object)
+        return result.where(result.notna(), None).to_dict("records")
+
+
+class CubeCache:
+    """
+    The cube for the current data version: built once per version, persisted
+    under ``cache_dir``, re-checked at most every ``check_interval`` seconds.
+
+    Args:
+        base_path: Folder with the source tables
+        cache_dir: Where built cubes are stored
+        check_interval: Seconds between data version checks
+        data_version: () -> version string (default: content hash of the sources)
+    """
+
+    def __init__(
+        self,
+        base_path: str = "consolidated_data",
+        cache_dir: str = "cube_cache",
+        check_interval: float = 60,
+        data_version: Optional[Callable[[], str]] = None,
+    ):
+        self.base_path = base_path
+        self.cache_dir = cache_dir
+        self.check_interval = check_interval
+        self.data_version = data_version or (lambda: compute_data_version(base_path, SOURCE_FILES))
+        self._cube: Optional[OlapCube] = None
+        self._checked = 0.0
+        self._build_s: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _build(self, version: str) -> OlapCube:
+        path = os.path.join(self.cache_dir, f"cube_{version}")
+        if os.path.exists(f"{path}.arrow"):
+            return OlapCube(load_frame(path), version)
+
+        start = time.perf_counter()
+        frames = {}
+        for table in (SUBJECTS_TABLE, DQI_TABLE):
+            try:
+                frames[table] = load_frame(os.path.join(self.base_path, table))
+            except FileNotFoundError:
+                pass
+        if not frames:
+            raise FileNotFoundError(f"Neither {SUBJECTS_TABLE} nor {DQI_TABLE} found in {self.base_path}")
+        # Without the subject table only Study is known (other dimensions "Unknown")
+        subjects = frames.get(SUBJECTS_TABLE, frames.get(DQI_TABLE))
+        base = build_base(subjects, frames.get(DQI_TABLE))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        write_dataset(base, path)
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("cube_") and not name.startswith(f"cube_{version}."):
+                os.remove(os.path.join(self.cache_dir, name))
+        self._build_s = time.perf_counter() - start
+        return OlapCube(base, version)
+
+    def get(self) -> OlapCube:
+        """Current cube, rebuilt when the source tables changed."""
+        now = time.monotonic()
+        if self._cube is not None and now - self._checked < self.check_interval:
+            return self._cube
+        with self._lock:
+            if self._cube is None or time.monotonic() - self._checked >= self.check_interval:
+                version = self.data_version()
+                if self._cube is None or self._cube.version != version:
+                    self._cube = self._build(version)
+                self._checked = time.monotonic()
+            return self._cube
+
+    def status(self) -> dict:
+        cube = self._cube
+        return {
+            "data_version": cube.version if cube else None,
+            "cells": len(cube.base) if cube else 0,
+            "build_s": round(self._build_s, 3) if self._build_s is not None else None,
+        }
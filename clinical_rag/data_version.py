@@ -0,0 +1,47 @@
+"""
+Content-based version of the consolidated data.
+
+Anything derived from ``consolidated_data/`` (generated reports, caches,
+index snapshots) is keyed by this version so it is rebuilt exactly when the
+underlying files change.
+"""
+
+import hashlib
+import os
+from typing import Iterable
+
+# Files whose content defines the data version
+DATA_FILES = (
+    "rag_study_documents.jsonl",
+    "rag_cra_reports.jsonl",
+    "rag_study_dqi_summaries.jsonl",
+    "rag_site_documents.jsonl",
+    "rag_dqi_documents.jsonl",
+    "rag_subject_documents.jsonl",
+    "rag_data_dictionary.md",
+    "global_clinical_data.csv",
+    "dashboard_api.json",
+)
+
+
+def compute_data_version(base_path: str = "consolidated_data", files: Iterable[str] = DATA_FILES) -> str:
+    """
+    Hash the contents of the data files under ``base_path``.
+
+    Missing files are skipped (not every deployment ships every file), but
+    their absence still changes the version.
+
+    Returns:
+        12-character hex digest
+    """
+    h = hashlib.sha256()
+    for name in sorted(files):
+        path = os.path.join(base_path, name)
+        h.update(name.encode("utf-8"))
+        if not os.path.exists(path):
+            h.update(b"<missing>")
+            continue
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:12]
@@ -0,0 +1,314 @@
+"""
+Compact, memory-mapped document store for the FAISS vector index.
+
+``FAISS.save_local`` pickles the whole ``InMemoryDocstore`` (every ``Document``
+with its metadata dict) into ``index.pkl``. Loading it unpickles ~30k Python
+objects up front and needs ``allow_dangerous_deserialization=True``.
+
+The compact layout stores the same data as plain files::
+
+    <folder>/index.faiss            FAISS index (faiss.write_index)
+    <folder>/docstore/contents.bin  all page_content strings, UTF-8, concatenated
+    <folder>/docstore/offsets.npy   int64[n + 1]; doc i is contents[offsets[i]:offsets[i + 1]]
+    <folder>/docstore/metadata.sqlite
+                                    one row per FAISS position: docstore id,
+                                    study / doc_type / priority columns, JSON metadata
+
+Opening the store only maps the files; a document is decoded when it is read.
+
+Usage:
+    save_compact(vector_store, "faiss_index_optimized")
+    vector_store = load_compact("faiss_index_optimized", embeddings)
+
+    # Convert an existing pickle-based index in place
+    python -m clinical_rag.docstore faiss_index_optimized
+"""
+
+import json
+import mmap
+import os
+import sqlite3
+import sys
+import threading
+from collections.abc import Mapping
+from typing import Dict, Iterable, Tuple, Union
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+DOCSTORE_DIRNAME = "docstore"
+CONTENTS_FILE = "contents.bin"
+OFFSETS_FILE = "offsets.npy"
+METADATA_FILE = "metadata.sqlite"
+
+_SCHEMA = """
+CREATE TABLE documents (
+    idx      INTEGER PRIMARY KEY,
+    doc_id   TEXT NOT NULL UNIQUE,
+    study    TEXT,
+    doc_type TEXT,
+    priority INTEGER,
+    metadata TEXT NOT NULL
+)
+"""
+
+
+class CompactDocstore(Docstore):
+    """
+    Read-only LangChain docstore backed by a memory-mapped content blob.
+
+    Documents are addressed either by FAISS position (``get(idx)``) or by their
+    docstore id (``search(doc_id)``, the LangChain ``Docstore`` interface).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        # Mapped up front: a pruned snapshot (clinical_rag.snapshots) stays
+        # readable through the open mapping, and no request races to open it
+        self._blob_file = None
+        self._blob: Union[mmap.mmap, bytes] = b""  # An empty file cannot be mmapped
+        blob_file = open(os.path.join(path, CONTENTS_FILE), "rb")
+        if os.fstat(blob_file.fileno()).st_size == 0:
+            blob_file.close()
+        else:
+            self._blob_file = blob_file
+            self._blob = mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+        db_path = os.path.abspath(os.path.join(path, METADATA_FILE))
+        # One connection shared by request threads; sqlite3 objects need serialized use
+        self._conn = sqlite3.connect(
+            f"file:{db_path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _fetchone(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def page_content(self, idx: int) -> str:
+        """Decode the content of the document at FAISS position ``idx``."""
+        start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        return self._blob[start:end].decode("utf-8")
+
+    def doc_id(self, idx: int) -> str:
+        row = self._fetchone("SELECT doc_id FROM documents WHERE idx = ?", (idx,))
+        if row is None:
+            raise KeyError(idx)
+        return row[0]
+
+    def get(self, idx: int) -> Document:
+        """Return the document stored at FAISS position ``idx``."""
+        row = self._fetchone("SELECT metadata FROM documents WHERE idx = ?", (idx,))
+        if row is None:
+            raise KeyError(idx)
+        return Document(page_content=self.page_content(idx), metadata=json.loads(row[0]))
+
+    def metadata_columns(self) -> Tuple[list, list, list]:
+        """``(priority, study, doc_type)`` lists indexed by FAISS position."""
+        rows = self._fetchall("SELECT priority, study, doc_type FROM documents ORDER BY idx")
+        if not rows:
+            return [], [], []
+        priority, study, doc_type = (list(col) for col in zip(*rows))
+        return priority, study, doc_type
+
+    def parent_ids(self) -> Dict[int, str]:
+        """FAISS position -> ``parent_id`` of section chunks (``clinical_rag.chunking``)."""
+        rows = self._fetchall(
+            "SELECT idx, json_extract(metadata, '$.parent_id') AS parent FROM documents "
+            "WHERE parent IS NOT NULL"
+        )
+        return dict(rows)
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Look up a document by docstore id (LangChain ``Docstore`` interface)."""
+        row = self._fetchone("SELECT idx, metadata FROM documents WHERE doc_id = ?", (search,))
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=self.page_content(row[0]), metadata=json.loads(row[1]))
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._blob = b""
+        if self._blob_file is not None:
+            self._blob_file.close()
+            self._blob_file = None
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def write(path: str, items: Iterable[Tuple[str, Document]]) -> int:
+        """
+        Write ``(doc_id, Document)`` pairs, in FAISS position order, to ``path``.
+
+        Args:
+            path: Target directory (created if missing, existing files replaced)
+            items: Iterable of (docstore id, Document)
+
+        Returns:
+            Number of documents written
+        """
+        os.makedirs(path, exist_ok=True)
+        db_path = os.path.join(path, METADATA_FILE)
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+        conn = sqlite3.connect(db_path)
+        conn.execute(_SCHEMA)
+        offsets = [0]
+        rows = []
+        with open(os.path.join(path, CONTENTS_FILE), "wb") as blob:
+            for idx, (doc_id, doc) in enumerate(items):
+                data = doc.page_content.encode("utf-8")
+                blob.write(data)
+                offsets.append(offsets[-1] + len(data))
+                meta = doc.metadata or {}
+                rows.append((
+                    idx,
+                    str(doc_id),
+                    meta.get("study"),
+                    meta.get("doc_type"),
+                    meta.get("priority"),
+                    json.dumps(meta, ensure_ascii=False, default=str),
+                ))
+                if len(rows) >= 5000:
+                    conn.executemany("INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?)", rows)
+                    rows = []
+        if rows:
+            conn.executemany("INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        conn.close()
+
+        np.save(os.path.join(path, OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+        return len(offsets) - 1
+
+
+class PositionalDocstoreIds(Mapping):
+    """
+    ``index_to_docstore_id`` mapping that resolves ids from the compact
+    docstore on demand instead of holding a dict of every id in memory.
+    """
+
+    def __init__(self, docstore: CompactDocstore):
+        self._docstore = docstore
+
+    def __getitem__(self, idx: int) -> str:
+        return self._docstore.doc_id(idx)
+
+    def __len__(self) -> int:
+        return len(self._docstore)
+
+    def __iter__(self):
+        return iter(range(len(self._docstore)))
+
+
+def is_compact_store(folder_path: str) -> bool:
+    """True if ``folder_path`` contains a compact docstore."""
+    return os.path.exists(os.path.join(folder_path, DOCSTORE_DIRNAME, OFFSETS_FILE))
+
+
+def save_compact(vector_store, folder_path: str, index_name: str = "index"):
+    """
+    Persist a LangChain FAISS vector store in the compact format.
+
+    Args:
+        vector_store: langchain_community FAISS instance (any docstore)
+        folder_path: Output directory
+        index_name: Base name of the .faiss file (matches ``save_local``)
+    """
+    import faiss
+
+    os.makedirs(folder_path, exist_ok=True)
+    faiss.write_index(vector_store.index, os.path.join(folder_path, f"{index_name}.faiss"))
+
+    ids = [vector_store.index_to_docstore_id[i] for i in range(vector_store.index.ntotal)]
+
+    def items():
+        for doc_id in ids:
+            doc = vector_store.docstore.search(doc_id)
+            if not isinstance(doc, Document):
+                raise ValueError(f"Docstore id {doc_id} missing from vector store")
+            yield doc_id, doc
+
+    CompactDocstore.write(os.path.join(folder_path, DOCSTORE_DIRNAME), items())
+
+
+def load_compact(folder_path: str, embeddings, index_name: str = "index", mmap_index: bool = False):
+    """
+    Load a vector store saved with ``save_compact``.
+
+    Args:
+        folder_path: Directory written by ``save_compact``
+        embeddings: Embedding function used for queries
+        index_name: Base name of the .faiss file
+        mmap_index: Ask FAISS to memory-map the index (IO_FLAG_MMAP). faiss-cpu
+            1.7.4 only maps IVF inverted lists; flat and scalar / product
+            quantizer indexes are still read into RAM
+
+    Returns:
+        langchain_community FAISS vector store
+    """
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    index_path = os.path.join(folder_path, f"{index_name}.faiss")
+    if mmap_index:
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            index = faiss.read_index(index_path)
+    else:
+        index = faiss.read_index(index_path)
+
+    docstore = CompactDocstore(os.path.join(folder_path, DOCSTORE_DIRNAME))
+    if len(docstore) != index.ntotal:
+        raise ValueError(
+            f"Docstore has {len(docstore)} documents but index has {index.ntotal} vectors"
+        )
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=PositionalDocstoreIds(docstore),
+    )
+
+
+def convert_pickle_store(folder_path: str, index_name: str = "index") -> int:
+    """
+    Write a compact docstore next to an existing ``save_local`` pickle.
+
+    The pickle is trusted here: it is our own build output.
+
+    Returns:
+        Number of documents converted
+    """
+    import pickle
+
+    with open(os.path.join(folder_path, f"{index_name}.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    ids = [index_to_docstore_id[i] for i in range(len(index_to_docstore_id))]
+
+    def items():
+        for doc_id in ids:
+            doc = docstore.search(doc_id)
+            if not isinstance(doc, Document):
+                raise ValueError(f"Docstore id {doc_id} missing from {folder_path}/{index_name}.pkl")
+            yield doc_id, doc
+
+    return CompactDocstore.write(os.path.join(folder_path, DOCSTORE_DIRNAME), items())
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else "faiss_index_optimized"
+    count = convert_pickle_store(target)
+    print(f"✅ Converted {count:,} documents to {os.path.join(target, DOCSTORE_DIRNAME)}/")
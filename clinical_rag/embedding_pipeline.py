@@ -0,0 +1,238 @@
+"""
+Bounded-memory, multi-process embedding stage for index builds.
+
+The build writes the compact docstore first (see ``clinical_rag.docstore``) and
+then embeds straight from its memory-mapped contents:
+
+1. Documents are ordered by byte length (longest first) so each encoder batch
+   holds texts of similar length and wastes little time on padding.
+2. The ordered documents are cut into shards. Each shard is encoded by a
+   sentence-transformers multi-process pool sized to the available cores and
+   written to ``<folder>/embeddings.npy`` (float32 ``.npy`` memmap) at the
+   documents' original positions.
+3. A ``embeddings.progress.json`` file records finished shards, so a rerun after
+   an interruption continues where it stopped.
+
+The encoding itself runs in a child process (``python -m
+clinical_rag.embedding_pipeline``) because the pool uses ``spawn`` start-up,
+which would otherwise re-execute the calling script in every worker.
+
+Usage:
+    build_compact_index(documents, "faiss_index_optimized")
+
+    # Resume / run only the embedding stage for an existing docstore
+    python -m clinical_rag.embedding_pipeline faiss_index_optimized --processes 8
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from clinical_rag.docstore import DOCSTORE_DIRNAME, CompactDocstore
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDINGS_FILE = "embeddings.npy"
+PROGRESS_FILE = "embeddings.progress.json"
+
+
+def available_cores() -> int:
+    """CPU cores this process may run on (respects container CPU affinity)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def corpus_fingerprint(docstore: CompactDocstore, model_name: str) -> str:
+    """Identify a (corpus, model) pair so stale progress files are not resumed."""
+    h = hashlib.sha256(model_name.encode("utf-8"))
+    h.update(np.ascontiguousarray(docstore._offsets).tobytes())
+    return h.hexdigest()[:16]
+
+
+def _load_progress(path: str, fingerprint: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        progress = json.load(f)
+    if progress.get("fingerprint") != fingerprint:
+        return 0
+    return int(progress.get("done_shards", 0))
+
+
+def _save_progress(path: str, state: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def embed_docstore(
+    folder: str,
+    model_name: str = EMBEDDING_MODEL,
+    batch_size: int = 64,
+    processes: Optional[int] = None,
+    shard_size: int = 4096,
+) -> str:
+    """
+    Embed every document of ``<folder>/docstore`` into ``<folder>/embeddings.npy``.
+
+    Call this from a ``__main__``-guarded entry point (see module docstring).
+
+    Args:
+        folder: Index folder containing a compact docstore
+        model_name: sentence-transformers model
+        batch_size: Encoder batch size per worker
+        processes: Worker processes (default: available cores; 1 = no pool)
+        shard_size: Documents per checkpointed shard
+
+    Returns:
+        Path of the embeddings .npy file
+    """
+    from sentence_transformers import SentenceTransformer
+
+    docstore = CompactDocstore(os.path.join(folder, DOCSTORE_DIRNAME))
+    n = len(docstore)
+    out_path = os.path.join(folder, EMBEDDINGS_FILE)
+    progress_path = os.path.join(folder, PROGRESS_FILE)
+    fingerprint = corpus_fingerprint(docstore, model_name)
+    processes = processes or available_cores()
+
+    model = SentenceTransformer(model_name, device="cpu")
+    dim = model.get_sentence_embedding_dimension()
+
+    done_shards = _load_progress(progress_path, fingerprint)
+    if done_shards and os.path.exists(out_path):
+        vectors = np.load(out_path, mmap_mode="r+")
+        if vectors.shape != (n, dim):
+            done_shards = 0
+    if not done_shards or not os.path.exists(out_path):
+        done_shards = 0
+        vectors = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.float32, shape=(n, dim))
+
+    lengths = np.diff(np.asarray(docstore._offsets))
+    order = np.argsort(-lengths, kind="stable")
+    shards = [order[i:i + shard_size] for i in range(0, n, shard_size)]
+
+    if done_shards:
+        print(f"⏩ Resuming at shard {done_shards + 1}/{len(shards)}")
+
+    pool = model.start_multi_process_pool(["cpu"] * processes) if processes > 1 else None
+    try:
+        start = time.perf_counter()
+        for shard_no in range(done_shards, len(shards)):
+            positions = shards[shard_no]
+            texts = [docstore.page_content(int(i)) for i in positions]
+            if pool is not None:
+                emb = model.encode_multi_process(texts, pool, batch_size=batch_size)
+            else:
+                emb = model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+            emb = np.asarray(emb, dtype=np.float32)
+            emb /= np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+
+            vectors[positions] = emb
+            vectors.flush()
+            _save_progress(progress_path, {
+                "fingerprint": fingerprint,
+                "model": model_name,
+                "documents": n,
+                "dim": dim,
+                "done_shards": shard_no + 1,
+                "total_shards": len(shards),
+            })
+
+            done = min((shard_no + 1) * shard_size, n)
+            rate = (done - done_shards * shard_size) / max(time.perf_counter() - start, 1e-9)
+            print(f"  Progress: {done:,}/{n:,} ({done / n * 100:.1f}%) - {rate:,.0f} docs/s", end="\r")
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+        docstore.close()
+
+    print(f"\n✅ Embedded {n:,} documents with {processes} process(es) -> {out_path}")
+    return out_path
+
+
+def build_faiss_index(vectors_path: str, index_path: str, chunk_size: int = 16384):
+    """Build an IndexFlatL2 from an embeddings .npy file without loading it whole."""
+    import faiss
+
+    vectors = np.load(vectors_path, mmap_mode="r")
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    for i in range(0, vectors.shape[0], chunk_size):
+        index.add(np.ascontiguousarray(vectors[i:i + chunk_size]))
+    faiss.write_index(index, index_path)
+    return index
+
+
+def build_compact_index(
+    documents: List,
+    folder: str,
+    model_name: str = EMBEDDING_MODEL,
+    batch_size: int = 64,
+    processes: Optional[int] = None,
+    index_name: str = "index",
+):
+    """
+    Build ``index.faiss`` + compact docstore + ``embeddings.npy`` for ``documents``.
+
+    Args:
+        documents: LangChain Documents, in the order they should be indexed
+        folder: Output index folder
+        model_name: sentence-transformers model
+        batch_size: Encoder batch size per worker
+        processes: Worker processes (default: available cores)
+        index_name: Base name of the .faiss file
+    """
+    docstore_dir = os.path.join(folder, DOCSTORE_DIRNAME)
+    CompactDocstore.write(docstore_dir, ((str(i), doc) for i, doc in enumerate(documents)))
+
+    cmd = [
+        sys.executable, "-m", "clinical_rag.embedding_pipeline", folder,
+        "--model", model_name, "--batch-size", str(batch_size),
+    ]
+    if processes:
+        cmd += ["--processes", str(processes)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    subprocess.run(cmd, check=True, env=env)
+
+    build_faiss_index(
+        os.path.join(folder, EMBEDDINGS_FILE),
+        os.path.join(folder, f"{index_name}.faiss"),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed a compact docstore into embeddings.npy")
+    parser.add_argument("folder", help="Index folder containing docstore/")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    processes = args.processes or available_cores()
+    if processes > 1:
+        # One torch thread per worker; the pool provides the parallelism.
+        os.environ.setdefault("OMP_NUM_THREADS", "1")
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    embed_docstore(
+        args.folder,
+        model_name=args.model,
+        batch_size=args.batch_size,
+        processes=processes,
+        shard_size=args.shard_size,
+    )
+
+
+if __name__ == "__main__":
+    main()
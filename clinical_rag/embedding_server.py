@@ -0,0 +1,255 @@
+"""
+Shared query-embedding process for multi-worker serving.
+
+Every uvicorn worker that builds its own ``HuggingFaceEmbeddings`` loads its
+own copy of all-MiniLM-L6-v2 and torch (~300 MB resident per process).
+``EmbeddingServer`` hosts the model once; workers use ``RemoteEmbeddings``,
+a drop-in ``Embeddings`` implementation (``embed_query`` /
+``embed_documents``) that sends texts over a local
+``multiprocessing.connection`` socket authenticated with a shared key.
+
+Requests from all workers are micro-batched: the encoder thread takes what
+is queued (up to ``max_batch`` texts, waiting at most ``max_wait_ms`` for
+more) and encodes it in one forward pass, so concurrent queries from
+different workers share batches instead of contending for the CPU with one
+torch thread pool per worker.
+
+``python -m clinical_rag.serve --embedding-server`` starts it and passes the
+address to the workers (EMBEDDING_SERVER_ADDRESS / EMBEDDING_SERVER_AUTHKEY).
+
+Usage:
+    EMBEDDING_SERVER_AUTHKEY=<hex> python -m clinical_rag.embedding_server --address /tmp/embeddings.sock
+
+    embeddings = RemoteEmbeddings("/tmp/embeddings.sock", bytes.fromhex(key))
+    embeddings.embed_query("Which sites have open safety discrepancies?")
+"""
+
+import argparse
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from clinical_rag.embedding_pipeline import EMBEDDING_MODEL
+
+ADDRESS_ENV = "EMBEDDING_SERVER_ADDRESS"
+AUTHKEY_ENV = "EMBEDDING_SERVER_AUTHKEY"
+
+
+def default_address() -> str:
+    """Unix socket in the temp folder (a named pipe on Windows)."""
+    name = f"clinical-rag-embeddings-{os.getpid()}"
+    if sys.platform == "win32":
+        return rf"\\.\pipe\{name}"
+    return os.path.join(tempfile.gettempdir(), f"{name}.sock")
+
+
+class EmbeddingServer:
+    """
+    Hosts one sentence-transformers model for many client processes.
+
+    Args:
+        address: Socket path (or named pipe) to listen on
+        authkey: Shared secret clients must present
+        model_name: sentence-transformers model (must match the index)
+        max_batch: Texts encoded per forward pass
+        max_wait_ms: How long a batch waits for more requests
+    """
+
+    def __init__(
+        self,
+        address: str,
+        authkey: bytes,
+        model_name: str = EMBEDDING_MODEL,
+        max_batch: int = 64,
+        max_wait_ms: float = 2.0,
+    ):
+        self.address = address
+        self.authkey = authkey
+        self.model_name = model_name
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._model = None
+        self.batches = 0
+        self.texts = 0
+
+    def _encode_loop(self):
+        while True:
+            items = [self._queue.get()]
+            size = len(items[0][0])
+            deadline = time.monotonic() + self.max_wait_s
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                items.append(item)
+                size += len(item[0])
+
+            texts = [text for batch, _ in items for text in batch]
+            try:
+                vectors = self._model.encode(
+                    texts, batch_size=self.max_batch, normalize_embeddings=True,
+                    convert_to_numpy=True, show_progress_bar=False,
+                ).astype(np.float32)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for batch, future in items:
+                future.set_result(vectors[offset:offset + len(batch)])
+                offset += len(batch)
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    texts = conn.recv()
+                except (EOFError, OSError):
+                    return
+                future: Future = Future()
+                self._queue.put((list(texts), future))
+                try:
+                    conn.send(("ok", future.result()))
+                except Exception as e:
+                    try:
+                        conn.send(("error", f"{type(e).__name__}: {e}"))
+                    except OSError:
+                        return
+
+    def serve_forever(self):
+        """Load the model, then accept clients until the process is stopped."""
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(self.model_name, device="cpu")
+        threading.Thread(target=self._encode_loop, name="embedding-encoder", daemon=True).start()
+        if not self.address.startswith("\\\\") and os.path.exists(self.address):
+            os.remove(self.address)
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"✅ Embedding server ({self.model_name}) listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    # Failed handshake (wrong key, client gone); keep serving
+                    print(f"⚠️ Embedding server rejected a connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    ``Embeddings`` backed by an ``EmbeddingServer``.
+
+    Thread-safe: each thread keeps its own connection (the FastAPI thread
+    pool bounds how many there are).
+
+    Args:
+        address: Server socket path (or named pipe)
+        authkey: Shared secret
+        timeout_s: Seconds to wait for a response
+    """
+
+    def __init__(self, address: str, authkey: bytes, timeout_s: float = 30):
+        self.address = address
+        self.authkey = authkey
+        self.timeout_s = timeout_s
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        # Same preprocessing as HuggingFaceEmbeddings
+        texts = [text.replace("\n", " ") for text in texts]
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.send(texts)
+                if not conn.poll(self.timeout_s):
+                    # A late reply would be read by the next request
+                    self._drop_connection()
+                    raise TimeoutError(f"Embedding server did not answer within {self.timeout_s}s")
+                status, payload = conn.recv()
+                break
+            except (EOFError, ConnectionError, BrokenPipeError):
+                # Server restarted since this thread connected: reconnect once
+                self._drop_connection()
+                if attempt:
+                    raise
+        if status != "ok":
+            raise RuntimeError(f"Embedding server error: {payload}")
+        return payload
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._embed(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+    def wait_ready(self, timeout_s: float = 120) -> bool:
+        """Poll until the server accepts connections (it loads the model first)."""
+        deadline = time.monotonic() + timeout_s
+        while time.monotonic() < deadline:
+            try:
+                self._connection()
+                return True
+            except (FileNotFoundError, ConnectionError, OSError):
+                time.sleep(0.2)
+        return False
+
+
+def embeddings_from_env() -> Optional[RemoteEmbeddings]:
+    """``RemoteEmbeddings`` when EMBEDDING_SERVER_ADDRESS is set, else None."""
+    address = os.environ.get(ADDRESS_ENV)
+    if not address:
+        return None
+    return RemoteEmbeddings(address, bytes.fromhex(os.environ.get(AUTHKEY_ENV, "")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared embedding model server")
+    parser.add_argument("--address", default=os.environ.get(ADDRESS_ENV) or default_address())
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    authkey = os.environ.get(AUTHKEY_ENV)
+    if not authkey:
+        raise SystemExit(f"Set {AUTHKEY_ENV} (hex) to the key clients will use")
+    EmbeddingServer(
+        args.address, bytes.fromhex(authkey), model_name=args.model,
+        max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Reader layer for the CPID input workbooks (``QC Anonymized Study Files/``).
+
+The notebook used to open every workbook with openpyxl (which loads every
+sheet, e.g. all 15 sheets of the EDC Metrics workbook) and read the EDC
+Metrics file twice: once to look for the header row, once more with
+``skiprows``. ``ExcelReader`` instead:
+
+- uses the calamine engine (``python-calamine``) when installed, openpyxl
+  otherwise, and parses only the sheet that holds subject rows
+- parses each sheet once with ``header=None`` and detects the layout from
+  the parsed rows: the header row (first row with a Subject / Patient
+  column), multi-row sub-headers and the first data row
+- normalizes column names (``'Data on Form/\\r\\nRecord    '`` becomes
+  ``'Data on Form/ Record'``, ``'Form '`` becomes ``'Form'``)
+- remembers the layout per file template in a JSON schema cache, so later
+  workbooks of the same template skip detection (the cached layout is used
+  when the header row still matches)
+- optionally keeps parsed frames in a cache directory keyed by path, size
+  and mtime, so unchanged workbooks are never parsed again
+
+Usage:
+    reader = ExcelReader()
+    dfs = load_study_files("QC Anonymized Study Files/Study 1_CPID_Input Files - Anonymization", reader)
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"
+
+# Input file kind -> filename keywords (case-insensitive)
+FILE_KINDS = {
+    "EDRR": ["EDRR"],
+    "EDC": ["EDC_Metrics", "EDC Metrics"],
+    "eSAE": ["eSAE", "SAE Dashboard"],
+    "MedDRA": ["MedDRA", "Medra"],
+    "WHODD": ["WHODD", "WHOdra"],
+    "Inactivated": ["Inactivated"],
+    "Missing_Lab": ["Missing_Lab", "Missing Lab"],
+    "Missing_Pages": ["Missing_Pages", "Missing Pages"],
+    "Visit_Projection": ["Visit Projection", "Visit_Projection"],
+}
+
+_SUBJECT_HEADER = re.compile(r"^(subject|patient)\s*(id|name|number)?$", re.IGNORECASE)
+_TEMPLATE_NOISE = re.compile(r"study\s*\d+|\d+", re.IGNORECASE)
+HEADER_SCAN_ROWS = 15
+MAX_SUBHEADER_ROWS = 4
+
+
+def normalize_column(name) -> str:
+    """Collapse whitespace and line breaks in a header label."""
+    return " ".join(str(name).split())
+
+
+def _label(value) -> str:
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    return normalize_column(value)
+
+
+def template_key(kind: str, path: str) -> str:
+    """Workbook template: file kind + file name without study numbers and dates."""
+    name = _TEMPLATE_NOISE.sub("#", os.path.basename(path).lower())
+    return f"{kind}:{' '.join(name.split())}"
+
+
+def find_file_by_keyword(directory: str, keywords: List[str]) -> Optional[str]:
+    """First .xlsx in ``directory`` whose name contains one of ``keywords``."""
+    if not os.path.exists(directory):
+        return None
+    for filename in sorted(os.listdir(directory)):
+        if filename.startswith("~$") or not filename.endswith(".xlsx"):
+            continue
+        if any(keyword.lower() in filename.lower() for keyword in keywords):
+            return os.path.join(directory, filename)
+    return None
+
+
+@dataclass
+class SheetLayout:
+    sheet: str
+    header_row: int         # Row with the primary labels (contains the subject column)
+    label_row: int          # Most complete header row; preferred source of column names
+    data_start: int         # First data row
+    header: List[str] = field(default_factory=list)  # Primary labels, to validate cache hits
+
+
+def detect_layout(raw: pd.DataFrame, sheet: str) -> Optional[SheetLayout]:
+    """
+    Header and data rows of a sheet parsed with ``header=None``.
+
+    The header row is the first row with a Subject / Patient column (Study
+    11's Visit Projection Tracker has two title rows above it). Up to
+    ``MAX_SUBHEADER_ROWS`` text-only rows after it with an empty subject cell
+    are sub-header rows (EDC Metrics has three: metric group, metric name,
+    responsible function).
+    """
+    scan = min(HEADER_SCAN_ROWS, len(raw))
+    for row in range(scan):
+        labels = [_label(v) for v in raw.iloc[row]]
+        subject_cols = [i for i, label in enumerate(labels) if _SUBJECT_HEADER.match(label)]
+        if not subject_cols:
+            continue
+        col = subject_cols[0]
+        data_start = row + 1
+        while (data_start < min(len(raw), row + 1 + MAX_SUBHEADER_ROWS)
+               and not _label(raw.iat[data_start, col])
+               and all(isinstance(v, str) or not _label(v) for v in raw.iloc[data_start])):
+            data_start += 1
+        header_rows = range(row, data_start)
+        label_row = max(header_rows, key=lambda r: sum(bool(_label(v)) for v in raw.iloc[r]))
+        return SheetLayout(sheet, row, label_row, data_start, labels)
+    return None
+
+
+def _column_names(raw: pd.DataFrame, layout: SheetLayout) -> List[str]:
+    """
+    One name per column: the label row, else the nearest group label above
+    it, else the primary header. Rows below the label row (annotations such
+    as "Responsible LF for action") are not used.
+    """
+    order = [layout.label_row] + list(range(layout.label_row - 1, layout.header_row, -1)) + [layout.header_row]
+    names, seen = [], Counter()
+    for col in range(raw.shape[1]):
+        name = next((_label(raw.iat[r, col]) for r in order if _label(raw.iat[r, col])), "") or f"Unnamed: {col}"
+        count = seen[name]
+        seen[name] += 1
+        names.append(f"{name}.{count}" if count else name)
+    return names
+
+
+def frame_from_raw(raw: pd.DataFrame, layout: SheetLayout) -> pd.DataFrame:
+    df = raw.iloc[layout.data_start:].copy()
+    df.columns = _column_names(raw, layout)
+    df = df.dropna(how="all").reset_index(drop=True)
+    return df.infer_objects()
+
+
+class SchemaCache:
+    """Sheet layouts per workbook template, persisted as JSON (hand-editable)."""
+
+    def __init__(self, path: Optional[str] = ".cpid_schema_cache.json"):
+        self.path = path
+        self._layouts: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._layouts = json.load(f)
+
+    def get(self, key: str) -> Optional[SheetLayout]:
+        entry = self._layouts.get(key)
+        return SheetLayout(**entry) if entry else None
+
+    def put(self, key: str, layout: SheetLayout):
+        with self._lock:
+            self._layouts[key] = asdict(layout)
+            if self.path:
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump(self._layouts, f, indent=2)
+
+
+class ExcelReader:
+    """
+    Single-parse workbook reader with layout detection and caches.
+
+    Args:
+        engine: pandas Excel engine (default: calamine if installed, else openpyxl)
+        schema_cache: Layout cache path, None to keep layouts in memory only
+        frame_cache_dir: Directory for parsed frames (pickle), None to disable
+    """
+
+    def __init__(self, engine: Optional[str] = None, schema_cache: Optional[str] = ".cpid_schema_cache.json",
+                 frame_cache_dir: Optional[str] = None):
+        self.engine = engine or ENGINE
+        self.schemas = SchemaCache(schema_cache)
+        self.frame_cache_dir = frame_cache_dir
+        if frame_cache_dir:
+            os.makedirs(frame_cache_dir, exist_ok=True)
+        self.stats = Counter()
+
+    def _frame_cache_path(self, path: str) -> Optional[str]:
+        if not self.frame_cache_dir:
+            return None
+        st = os.stat(path)
+        digest = hashlib.sha1(f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}".encode()).hexdigest()[:20]
+        return os.path.join(self.frame_cache_dir, f"{digest}.pkl")
+
+    def _parse(self, book: pd.ExcelFile, sheet: str) -> pd.DataFrame:
+        t0 = time.perf_counter()
+        raw = book.parse(sheet, header=None)
+        self.stats["sheets_parsed"] += 1
+        self.stats["parse_ms"] += round((time.perf_counter() - t0) * 1000)
+        return raw
+
+    def read(self, path: str, kind: str) -> pd.DataFrame:
+        """Subject-level rows of one workbook with normalized column names."""
+        cached = self._frame_cache_path(path)
+        if cached and os.path.exists(cached):
+            self.stats["frame_cache_hits"] += 1
+            return pd.read_pickle(cached)
+
+        key = template_key(kind, path)
+        with pd.ExcelFile(path, engine=self.engine) as book:
+            parsed = {}
+
+            def rows(sheet):
+                if sheet not in parsed:
+                    parsed[sheet] = self._parse(book, sheet)
+                return parsed[sheet]
+
+            layout = self.schemas.get(key)
+            if layout is not None and layout.sheet in book.sheet_names:
+                raw = rows(layout.sheet)
+                current = [_label(v) for v in raw.iloc[layout.header_row]] if len(raw) > layout.header_row else []
+                if current == layout.header:
+                    self.stats["schema_hits"] += 1
+                else:
+                    layout = None
+
+            if layout is None:
+                # First sheet with a subject column (the first sheet for every known template)
+                for sheet in book.sheet_names:
+                    raw = rows(sheet)
+                    layout = detect_layout(raw, sheet)
+                    if layout is not None:
+                        break
+                if layout is None:
+                    raise ValueError(f"No Subject/Patient header found in {os.path.basename(path)}")
+                self.stats["schema_misses"] += 1
+                self.schemas.put(key, layout)
+
+        df = frame_from_raw(raw, layout)
+        self.stats["workbooks"] += 1
+        if cached:
+            df.to_pickle(cached)
+        return df
+
+
+def load_study_files(study_path: str, reader: Optional[ExcelReader] = None) -> Dict[str, pd.DataFrame]:
+    """All recognized input files of one study folder, keyed by file kind."""
+    reader = reader or ExcelReader()
+    dfs = {}
+    for kind, keywords in FILE_KINDS.items():
+        file_path = find_file_by_keyword(study_path, keywords)
+        if not file_path:
+            continue
+        try:
+            dfs[kind] = reader.read(file_path, kind)
+        except Exception as e:
+            print(f"  Error loading {kind} ({os.path.basename(file_path)}): {e}")
+    return dfs
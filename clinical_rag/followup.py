@@ -0,0 +1,174 @@
+"""
+Follow-up aware retrieval across conversation turns.
+
+A follow-up such as "what about its sites?" is vague on its own: retrieving
+for it alone either misses the study being discussed or re-fetches the same
+study documents. ``FollowUpRetriever`` keeps, per session, the previous
+turn's query, embedding, study and document ids and handles a follow-up in
+one of three ways:
+
+- ``reuse``: the rewritten query is nearly identical to the previous one
+  (cosine >= ``reuse_similarity``); the previous doc ids are reused and the
+  FAISS search / MMR / re-ranking are skipped
+- ``merge``: a fresh retrieval for the rewritten query, with the top
+  ``carry_over`` previous documents kept in the context
+- ``new``: not a follow-up (or no session state); plain retrieval
+
+Query rewriting is heuristic on purpose (no LLM call on the hot path): the
+study under discussion is prefixed to the question and, when the previous
+turn was filtered to a study, the filter is inherited. Only questions that
+open with a continuation ("and ...", "what about ...") or point back at the
+study / site ("its sites", "that study") count as follow-ups; questions
+about all studies never do.
+"""
+
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from clinical_rag.retrieval import RetrievalEngine, _LRUCache, _normalize_study
+
+_STUDY = re.compile(r"\bstudy\s*(\d+)\b", re.IGNORECASE)
+# Connectives that continue the previous turn ("and its sites?", "what about Germany?")
+_CONTINUATION = re.compile(
+    r"^\s*(and|also|what about|how about|what of|same for|same question for|then what)\b",
+    re.IGNORECASE,
+)
+# References to the study / site under discussion; bare "it", "they", "their"
+# or "there" are too common in stand-alone questions to count
+_ANAPHORA = re.compile(
+    r"\b(its|(this|that|the same|same)\s+(study|trial|site)|(these|those)\s+(sites|subjects|patients))\b",
+    re.IGNORECASE,
+)
+# Portfolio-wide questions start a new topic (no study filter inherited)
+_ALL_STUDIES = re.compile(r"\b(all|every|each|other)\s+(studies|study|trials|sites)\b|\bacross\b", re.IGNORECASE)
+
+
+def explicit_study(question: str) -> Optional[str]:
+    """"Study 10" if the question names exactly one study, else None."""
+    studies = {f"Study {n}" for n in _STUDY.findall(question)}
+    return studies.pop() if len(studies) == 1 else None
+
+
+def is_follow_up(question: str, previous_study: Optional[str]) -> bool:
+    """
+    True when the question depends on the previous turn: it names the
+    previous study again, starts with a continuation ("and", "what about")
+    or refers back to the study / site ("its sites", "that study"), and is
+    not about all studies.
+    """
+    if _ALL_STUDIES.search(question):
+        return False
+    named = explicit_study(question)
+    if named:
+        return previous_study is not None and _normalize_study(named) == _normalize_study(previous_study)
+    return bool(_CONTINUATION.search(question) or _ANAPHORA.search(question))
+
+
+@dataclass
+class _TurnState:
+    anchor: str  # Study under discussion, or the question that opened the topic
+    embedding: np.ndarray
+    doc_ids: Tuple[int, ...]
+    study: Optional[str]
+    study_filter: Optional[str]
+
+
+class FollowUpRetriever:
+    """
+    Session-aware wrapper around a ``RetrievalEngine``.
+
+    Args:
+        engine: Shared retrieval engine
+        max_sessions: Sessions whose last turn is remembered (LRU)
+        carry_over: Previous documents kept when merging
+        reuse_similarity: Cosine similarity above which previous docs are reused as-is
+        dominant_share: Share of docs from one study that makes it "the study under discussion"
+    """
+
+    def __init__(self, engine: RetrievalEngine, max_sessions: int = 1000, carry_over: int = 4,
+                 reuse_similarity: float = 0.9, dominant_share: float = 0.6):
+        self.engine = engine
+        self.carry_over = carry_over
+        self.reuse_similarity = reuse_similarity
+        self.dominant_share = dominant_share
+        self._states = _LRUCache(max_sessions)
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def _dominant_study(self, engine: RetrievalEngine, doc_ids) -> Optional[str]:
+        studies = Counter(engine.doc_meta(i)[1] for i in doc_ids)
+        studies.pop("ALL", None)
+        studies.pop("Unknown", None)
+        if not studies:
+            return None
+        study, count = studies.most_common(1)[0]
+        return study if count / len(doc_ids) >= self.dominant_share else None
+
+    @staticmethod
+    def _cosine(a, b) -> float:
+        a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+        denom = float(np.linalg.norm(a) * np.linalg.norm(b))
+        return float(a @ b) / denom if denom else 0.0
+
+    def retrieve_ids(self, session_id: Optional[str], question: str, k: int,
+                     study_filter: Optional[str] = None) -> Tuple[List[int], dict]:
+        """
+        Returns:
+            (doc ids, info) with info["mode"] in new / reuse / merge and the
+            query and study filter actually used
+        """
+        return self._retrieve_ids(self.engine, session_id, question, k, study_filter)
+
+    def _retrieve_ids(self, engine: RetrievalEngine, session_id: Optional[str], question: str, k: int,
+                      study_filter: Optional[str] = None) -> Tuple[List[int], dict]:
+        state: Optional[_TurnState] = self._states.get(session_id) if session_id else None
+        query, mode = question, "new"
+
+        if state is not None and is_follow_up(question, state.study):
+            study_filter = study_filter or state.study_filter
+            query = f"{state.anchor}: {question}"
+            embedding = engine.embed_query(query)
+            if self._cosine(embedding, state.embedding) >= self.reuse_similarity and len(state.doc_ids) >= k:
+                ids, mode = list(state.doc_ids[:k]), "reuse"
+            else:
+                fresh = engine.retrieve_ids(query, k, study_filter)
+                fresh_set = set(fresh)
+                carried = [i for i in state.doc_ids[:self.carry_over] if i not in fresh_set]
+                ids, mode = fresh[:max(0, k - len(carried))] + carried, "merge"
+            study, anchor = state.study, state.anchor
+        else:
+            embedding = engine.embed_query(question)
+            ids = engine.retrieve_ids(question, k, study_filter)
+            study = explicit_study(question) or study_filter or (self._dominant_study(engine, ids) if ids else None)
+            anchor = study or question
+
+        # Positions from a replaced index would point at other documents
+        if session_id and engine is self.engine:
+            self._states.put(session_id, _TurnState(anchor, embedding, tuple(ids), study, study_filter))
+        with self._lock:
+            self._counts[mode] += 1
+        return ids, {"mode": mode, "query": query, "study_filter": study_filter}
+
+    def retrieve(self, session_id: Optional[str], question: str, k: int,
+                 study_filter: Optional[str] = None) -> Tuple[list, dict]:
+        """Like ``retrieve_ids`` but returns Documents."""
+        engine = self.engine
+        ids, info = self._retrieve_ids(engine, session_id, question, k, study_filter)
+        return [engine.document(i) for i in ids], info
+
+    def forget(self, session_id: str):
+        self._states.put(session_id, None)
+
+    def reset(self, engine: RetrievalEngine):
+        """Switch to a new engine (index snapshot); remembered turns are dropped."""
+        self.engine = engine
+        self._states.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
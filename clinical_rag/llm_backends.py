@@ -0,0 +1,357 @@
+"""
+Pluggable LLM backends and complexity-based routing.
+
+Backends:
+- ``hf``:    Gemma 27B on the Hugging Face Inference API (remote, best quality)
+- ``groq``:  Groq's OpenAI-compatible API (remote, low latency; needs GROQ_API_KEY)
+- ``local``: A small quantized GGUF model on CPU via ``llama-cpp-python``
+             (optional dependency; works offline)
+
+Remote backends reuse the pooled ``LLMClient`` (timeouts, retries, circuit
+breaker). ``LLMRouter`` classifies each question as simple or complex and
+tries the backends configured for that class in order, falling back to the
+next one when a backend is unavailable or fails. A busy local model is
+moved to the end of the route instead of making the request queue for it.
+
+Environment:
+    LLM_BACKEND       auto (route by complexity, default) or a backend name
+    GROQ_API_KEY      enables the groq backend
+    GROQ_MODEL        default llama-3.1-8b-instant
+    LOCAL_LLM_PATH    path to a GGUF file (otherwise LOCAL_LLM_REPO/FILE are downloaded)
+    LOCAL_LLM_ENABLED 1 to enable the local backend (default 1 if llama_cpp is installed)
+"""
+
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from clinical_rag.llm_client import LLMClient, LLMClientConfig, LLMError
+
+GROQ_URL = "https://api.groq.com/openai/v1"
+GROQ_MODEL = "llama-3.1-8b-instant"
+LOCAL_LLM_REPO = "Qwen/Qwen2.5-1.5B-Instruct-GGUF"
+LOCAL_LLM_FILE = "qwen2.5-1.5b-instruct-q4_k_m.gguf"
+
+DEFAULT_ROUTES = {
+    "simple": ("local", "groq", "hf"),
+    "complex": ("hf", "groq", "local"),
+}
+
+# Phrases that need multi-document reasoning or long structured output
+_COMPLEX_PATTERNS = re.compile(
+    r"\b(compare|comparison|across (all|studies|sites)|all studies|why|trend|recommend|"
+    r"prioriti[sz]e|root cause|explain|summari[sz]e|report|strategy|action plan|versus|vs\.?)\b",
+    re.IGNORECASE,
+)
+# Single-fact lookups
+_SIMPLE_PATTERNS = re.compile(
+    r"^\s*(how many|what is|what's|what are the number|which site has|list|count|"
+    r"is there|are there|does|do)\b",
+    re.IGNORECASE,
+)
+
+
+def classify_complexity(question: str, study_filter: Optional[str] = None) -> str:
+    """
+    "simple" for short single-fact lookups, "complex" for everything else.
+
+    Deliberately conservative: a question is only simple when it is short,
+    starts like a lookup and asks for no comparison or explanation.
+    """
+    words = len(question.split())
+    if _COMPLEX_PATTERNS.search(question):
+        return "complex"
+    if words <= 16 and _SIMPLE_PATTERNS.search(question):
+        return "simple"
+    if words <= 10 and study_filter:
+        return "simple"
+    return "complex"
+
+
+class LLMBackend:
+    """
+    A chat model behind a common interface.
+
+    Attributes:
+        name: Backend name used in routing and responses
+        context_k: Max documents worth sending to this backend (None = caller's k)
+    """
+
+    name = "base"
+    context_k: Optional[int] = None
+
+    def available(self) -> bool:
+        return True
+
+    def busy(self) -> bool:
+        """True while a call would have to wait for an earlier one."""
+        return False
+
+    def warm_up(self):
+        """Load whatever the first call would otherwise load."""
+
+    def generate(self, messages: List[dict], max_tokens: Optional[int] = None) -> str:
+        raise NotImplementedError
+
+    async def agenerate(self, messages: List[dict], max_tokens: Optional[int] = None) -> str:
+        return await asyncio.to_thread(self.generate, messages, max_tokens)
+
+    def limit_k(self, k: int) -> int:
+        return min(k, self.context_k) if self.context_k else k
+
+    def snapshot(self) -> dict:
+        return {}
+
+
+class EndpointBackend(LLMBackend):
+    """OpenAI-compatible remote endpoint (HF Inference API, Groq, vLLM, stub)."""
+
+    def __init__(self, name: str, client: LLMClient, context_k: Optional[int] = None):
+        self.name = name
+        self.client = client
+        self.context_k = context_k
+
+    def available(self) -> bool:
+        return self.client.breaker.state != "open"
+
+    def generate(self, messages, max_tokens=None) -> str:
+        return self.client.chat_sync(messages, max_tokens=max_tokens)
+
+    async def agenerate(self, messages, max_tokens=None) -> str:
+        return await self.client.chat(messages, max_tokens=max_tokens)
+
+    def snapshot(self) -> dict:
+        return {"client": self.client.snapshot()}
+
+
+class LocalBackend(LLMBackend):
+    """
+    Quantized GGUF model on CPU via ``llama-cpp-python``.
+
+    The model is loaded by ``warm_up`` (server start-up) or on first use.
+    The KV cache of the shared prompt prefix (system prompt) is kept in RAM,
+    so repeated questions only pay for the retrieved context and the
+    question. Calls are serialized, the model is not thread-safe; while it
+    is loading or answering, ``busy()`` makes the router try other backends
+    first.
+
+    Args:
+        model_path: GGUF file (downloaded from ``repo_id``/``filename`` if None)
+        n_ctx: Context window in tokens
+        n_threads: CPU threads (default: all cores)
+        context_k: Documents to send (small models have small windows)
+        max_tokens: Default answer length
+    """
+
+    name = "local"
+
+    def __init__(self, model_path: Optional[str] = None, repo_id: str = LOCAL_LLM_REPO,
+                 filename: str = LOCAL_LLM_FILE, n_ctx: int = 8192, n_threads: Optional[int] = None,
+                 context_k: int = 4, max_tokens: int = 512, temperature: float = 0.2):
+        self.model_path = model_path
+        self.repo_id = repo_id
+        self.filename = filename
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        self.context_k = context_k
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self._llm = None
+        self._lock = threading.Lock()
+        self.load_s: Optional[float] = None
+
+    def available(self) -> bool:
+        try:
+            import llama_cpp  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def warm_up(self):
+        with self._lock:
+            self._model()
+
+    def _model(self):
+        if self._llm is None:
+            from llama_cpp import Llama, LlamaRAMCache
+
+            start = time.perf_counter()
+            path = self.model_path
+            if not path:
+                from huggingface_hub import hf_hub_download
+                path = hf_hub_download(repo_id=self.repo_id, filename=self.filename)
+            self._llm = Llama(
+                model_path=path,
+                n_ctx=self.n_ctx,
+                n_threads=self.n_threads or os.cpu_count(),
+                verbose=False,
+            )
+            self._llm.set_cache(LlamaRAMCache())
+            self.load_s = time.perf_counter() - start
+            print(f"✅ Local LLM loaded: {os.path.basename(path)} ({self.load_s:.1f}s)")
+        return self._llm
+
+    def generate(self, messages, max_tokens=None) -> str:
+        with self._lock:
+            llm = self._model()
+            try:
+                result = llm.create_chat_completion(
+                    messages=messages,
+                    max_tokens=max_tokens or self.max_tokens,
+                    temperature=self.temperature,
+                )
+            except Exception as e:
+                raise LLMError(f"local model failed: {e}") from e
+        return result["choices"][0]["message"]["content"] or ""
+
+    def snapshot(self) -> dict:
+        return {"loaded": self._llm is not None, "load_s": self.load_s}
+
+
+class LLMRouter:
+    """
+    Picks a backend per question and falls back along the route on failure.
+
+    Args:
+        backends: name -> backend (only configured backends)
+        routes: complexity class -> backend names in preference order
+        fixed: Always use this backend first (``LLM_BACKEND`` other than auto)
+    """
+
+    def __init__(self, backends: Dict[str, LLMBackend], routes: Dict[str, Sequence[str]] = None,
+                 fixed: Optional[str] = None):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = backends
+        self.routes = routes or DEFAULT_ROUTES
+        self.fixed = fixed if fixed in backends else None
+        self._counts = defaultdict(lambda: {"calls": 0, "errors": 0, "seconds": 0.0})
+        self._lock = threading.Lock()
+
+    def candidates(self, question: str, study_filter: Optional[str] = None) -> List[LLMBackend]:
+        """Available backends for this question, in the order they are tried."""
+        return self.for_complexity(classify_complexity(question, study_filter))
+
+    def for_complexity(self, complexity: str) -> List[LLMBackend]:
+        """Available backends for a complexity class ("simple" / "complex"), in order."""
+        names = list(self.routes.get(complexity, ()))
+        if self.fixed:
+            names = [self.fixed] + [n for n in names if n != self.fixed]
+        names += [n for n in self.backends if n not in names]
+        return [self.backends[n] for n in names if n in self.backends and self.backends[n].available()]
+
+    def select(self, question: str, study_filter: Optional[str] = None) -> LLMBackend:
+        """First backend the question would be sent to."""
+        return self._order(question, study_filter, None)[0]
+
+    def warm_up(self):
+        """Load local models now rather than on the first question; errors are logged."""
+        for backend in self.backends.values():
+            if backend.available():
+                try:
+                    backend.warm_up()
+                except Exception as e:
+                    print(f"⚠️ Warm-up of LLM backend {backend.name} failed: {e}")
+
+    def _record(self, name: str, seconds: float, error: bool):
+        with self._lock:
+            stats = self._counts[name]
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["seconds"] += seconds
+
+    def _order(self, question, study_filter, backend) -> List[LLMBackend]:
+        candidates = self.candidates(question or "", study_filter)
+        if backend is not None:
+            candidates = [backend] + [b for b in candidates if b is not backend]
+        if not candidates:
+            raise LLMError("No LLM backend is available")
+        # Busy backends last: they are only waited for when everything else fails
+        return [b for b in candidates if not b.busy()] + [b for b in candidates if b.busy()]
+
+    def generate(self, messages: List[dict], question: str = None, study_filter: str = None,
+                 backend: LLMBackend = None, max_tokens: int = None) -> Tuple[str, str]:
+        """
+        Returns:
+            (answer, name of the backend that produced it)
+        """
+        last_error = None
+        for candidate in self._order(question, study_filter, backend):
+            start = time.perf_counter()
+            try:
+                text = candidate.generate(messages, max_tokens)
+                self._record(candidate.name, time.perf_counter() - start, error=False)
+                return text, candidate.name
+            except Exception as e:
+                self._record(candidate.name, time.perf_counter() - start, error=True)
+                last_error = e
+        raise LLMError(f"All LLM backends failed: {last_error}")
+
+    async def agenerate(self, messages: List[dict], question: str = None, study_filter: str = None,
+                        backend: LLMBackend = None, max_tokens: int = None) -> Tuple[str, str]:
+        last_error = None
+        for candidate in self._order(question, study_filter, backend):
+            start = time.perf_counter()
+            try:
+                text = await candidate.agenerate(messages, max_tokens)
+                self._record(candidate.name, time.perf_counter() - start, error=False)
+                return text, candidate.name
+            except Exception as e:
+                self._record(candidate.name, time.perf_counter() - start, error=True)
+                last_error = e
+        raise LLMError(f"All LLM backends failed: {last_error}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = {
+                name: {**stats, "seconds": round(stats["seconds"], 3)}
+                for name, stats in self._counts.items()
+            }
+        return {
+            "mode": self.fixed or "auto",
+            "backends": {
+                name: {
+                    "available": backend.available(),
+                    **counts.get(name, {"calls": 0, "errors": 0, "seconds": 0.0}),
+                    **backend.snapshot(),
+                }
+                for name, backend in self.backends.items()
+            },
+        }
+
+
+def build_router(temperature: float = 0.4, max_tokens: int = 4096, hf_context_k: Optional[int] = None) -> LLMRouter:
+    """Router over every backend configured in the environment."""
+    backends: Dict[str, LLMBackend] = {
+        "hf": EndpointBackend(
+            "hf",
+            LLMClient(LLMClientConfig.from_env(temperature=temperature, max_tokens=max_tokens)),
+            context_k=hf_context_k,
+        ),
+    }
+    if os.environ.get("GROQ_API_KEY"):
+        backends["groq"] = EndpointBackend("groq", LLMClient(LLMClientConfig(
+            base_url=os.environ.get("GROQ_BASE_URL", GROQ_URL),
+            model=os.environ.get("GROQ_MODEL", GROQ_MODEL),
+            api_key=os.environ["GROQ_API_KEY"],
+            temperature=temperature,
+            max_tokens=min(max_tokens, 8192),
+            timeout_s=60.0,
+        )))
+    local = LocalBackend(
+        model_path=os.environ.get("LOCAL_LLM_PATH") or None,
+        repo_id=os.environ.get("LOCAL_LLM_REPO", LOCAL_LLM_REPO),
+        filename=os.environ.get("LOCAL_LLM_FILE", LOCAL_LLM_FILE),
+    )
+    if os.environ.get("LOCAL_LLM_ENABLED", "1") == "1" and local.available():
+        backends["local"] = local
+
+    mode = os.environ.get("LLM_BACKEND", "auto")
+    return LLMRouter(backends, fixed=None if mode == "auto" else mode)
@@ -0,0 +1,401 @@
+"""
+Managed LLM client: pooled HTTP, timeouts, retries, hedging, circuit breaker.
+
+Talks to any OpenAI-compatible ``/chat/completions`` endpoint - the Hugging
+Face Inference API (default), Groq, a local server, or the stub in
+``clinical_rag.stub_llm``.
+
+The client owns one ``httpx.AsyncClient`` (persistent connection pool) bound
+to a private event loop running in a daemon thread. Sync callers (``ask()``,
+report jobs) and async callers (FastAPI endpoints) both submit work to that
+loop, so the pool is shared no matter which thread or loop a request comes
+from.
+
+Per call:
+1. Fail fast if the circuit breaker is open (upstream is known to be down)
+2. Send the request; ``timeout_s`` is one deadline for the whole call,
+   retries and backoff included
+3. Optionally send a hedged duplicate if the first has not answered within
+   the ``hedge_percentile`` latency of recent calls; first answer wins
+4. Retry transport errors, timeouts, 429 and 5xx with exponential backoff
+   and jitter (honouring ``Retry-After`` up to ``max_retry_after_s``)
+
+Other 4xx responses (e.g. prompt too long) are the request's fault, not an
+outage, and do not count towards the circuit breaker; neither do cancelled
+calls.
+
+Usage:
+    client = LLMClient(LLMClientConfig.from_env())
+    text = client.chat_sync([{"role": "user", "content": "Hello"}])
+    text = await client.chat(messages, max_tokens=512)
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Optional
+
+import httpx
+
+HF_INFERENCE_URL = "https://api-inference.huggingface.co/models/{model}/v1"
+DEFAULT_MODEL = "google/gemma-3-27b-it"
+
+
+class LLMError(Exception):
+    """The LLM call failed after all retries."""
+
+
+class CircuitOpenError(LLMError):
+    """The circuit breaker is open; the call was not attempted."""
+
+
+class LLMRequestError(LLMError):
+    """Upstream rejected the request itself (4xx other than 429)."""
+
+
+@dataclass
+class Completion:
+    """Assistant text plus the token usage reported by the server."""
+    text: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    latency_s: float = 0.0
+
+
+class _RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class LLMClientConfig:
+    """Connection, timeout and resilience settings of an ``LLMClient``."""
+    base_url: str = HF_INFERENCE_URL.format(model=DEFAULT_MODEL)
+    model: str = DEFAULT_MODEL
+    api_key: Optional[str] = None
+    temperature: float = 0.4
+    max_tokens: int = 4096
+    timeout_s: float = 120.0              # Deadline for a whole call, retries included
+    connect_timeout_s: float = 10.0
+    max_retries: int = 3
+    backoff_base_s: float = 0.5
+    backoff_max_s: float = 8.0
+    max_retry_after_s: float = 10.0       # Longer Retry-After values are capped
+    hedge_percentile: Optional[float] = None  # e.g. 95 -> hedge after the p95 latency
+    hedge_min_samples: int = 20
+    latency_window: int = 200
+    max_connections: int = 20
+    max_keepalive: int = 10
+    breaker_failures: int = 5
+    breaker_reset_s: float = 30.0
+
+    @classmethod
+    def from_env(cls, prefix: str = "LLM_", **overrides) -> "LLMClientConfig":
+        """Build from ``LLM_*`` environment variables (plus explicit overrides)."""
+        env = os.environ
+        model = overrides.pop("model", env.get(f"{prefix}MODEL", DEFAULT_MODEL))
+        hedge = env.get(f"{prefix}HEDGE_PERCENTILE")
+        values = dict(
+            model=model,
+            base_url=env.get(f"{prefix}BASE_URL", HF_INFERENCE_URL.format(model=model)),
+            api_key=env.get(f"{prefix}API_KEY") or env.get("HUGGINGFACEHUB_API_TOKEN"),
+            timeout_s=float(env.get(f"{prefix}TIMEOUT_S", cls.timeout_s)),
+            max_retries=int(env.get(f"{prefix}MAX_RETRIES", cls.max_retries)),
+            hedge_percentile=float(hedge) if hedge else None,
+            max_connections=int(env.get(f"{prefix}MAX_CONNECTIONS", cls.max_connections)),
+        )
+        values.update(overrides)
+        return cls(**values)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after ``failures`` consecutive failures; after ``reset_s``
+    one trial call is let through (half-open) and closes it on success. A
+    trial that ends without an outcome (cancelled, rejected request) is
+    released with ``release_trial`` so the next call can try again.
+    """
+
+    def __init__(self, failures: int, reset_s: float):
+        self.failures = failures
+        self.reset_s = reset_s
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_s:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_s or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            self._trial_in_flight = False
+            if self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        """End a call that says nothing about upstream health."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, window: int):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = min(len(samples) - 1, max(0, int(round(pct / 100 * len(samples))) - 1))
+        return samples[rank]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class LLMClient:
+    """Pooled, resilient client for an OpenAI-compatible chat endpoint."""
+
+    def __init__(self, config: Optional[LLMClientConfig] = None):
+        self.config = config or LLMClientConfig.from_env()
+        self.breaker = CircuitBreaker(self.config.breaker_failures, self.config.breaker_reset_s)
+        self.latency = LatencyTracker(self.config.latency_window)
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0, "rejected": 0}
+        self._stats_lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+        self._http: Optional[httpx.AsyncClient] = None
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def chat(self, messages: List[dict], max_tokens: Optional[int] = None,
+                   temperature: Optional[float] = None, timeout_s: Optional[float] = None) -> str:
+        """Chat completion from any event loop; returns the assistant text."""
+        return (await self.complete(messages, max_tokens, temperature, timeout_s)).text
+
+    def chat_sync(self, messages: List[dict], max_tokens: Optional[int] = None,
+                  temperature: Optional[float] = None, timeout_s: Optional[float] = None) -> str:
+        """Blocking chat completion for threads without an event loop."""
+        return self.complete_sync(messages, max_tokens, temperature, timeout_s).text
+
+    async def complete(self, messages: List[dict], max_tokens: Optional[int] = None,
+                       temperature: Optional[float] = None, timeout_s: Optional[float] = None) -> Completion:
+        """Like ``chat`` but with token usage and latency."""
+        future = asyncio.run_coroutine_threadsafe(
+            self._chat(messages, max_tokens, temperature, timeout_s), self._loop
+        )
+        return await asyncio.wrap_future(future)
+
+    def complete_sync(self, messages: List[dict], max_tokens: Optional[int] = None,
+                      temperature: Optional[float] = None, timeout_s: Optional[float] = None) -> Completion:
+        """Like ``chat_sync`` but with token usage and latency."""
+        future = asyncio.run_coroutine_threadsafe(
+            self._chat(messages, max_tokens, temperature, timeout_s), self._loop
+        )
+        return future.result()
+
+    def close(self):
+        async def _close():
+            if self._http is not None:
+                await self._http.aclose()
+        asyncio.run_coroutine_threadsafe(_close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def snapshot(self) -> dict:
+        """Counters, breaker state and recent latency percentiles."""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["breaker"] = self.breaker.state
+        for pct in (50, 95, 99):
+            value = self.latency.percentile(pct)
+            stats[f"p{pct}_s"] = round(value, 3) if value is not None else None
+        return stats
+
+    # ------------------------------------------------------------------
+    # Internals (run on the client loop)
+    # ------------------------------------------------------------------
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            cfg = self.config
+            headers = {"Content-Type": "application/json"}
+            if cfg.api_key:
+                headers["Authorization"] = f"Bearer {cfg.api_key}"
+            self._http = httpx.AsyncClient(
+                base_url=cfg.base_url.rstrip("/"),
+                headers=headers,
+                limits=httpx.Limits(
+                    max_connections=cfg.max_connections,
+                    max_keepalive_connections=cfg.max_keepalive,
+                ),
+                timeout=httpx.Timeout(cfg.timeout_s, connect=cfg.connect_timeout_s),
+            )
+        return self._http
+
+    async def _post_once(self, payload: dict, timeout_s: float) -> Completion:
+        start = time.perf_counter()
+        try:
+            response = await self._client().post(
+                "/chat/completions", json=payload, timeout=timeout_s
+            )
+        except (httpx.TimeoutException, httpx.TransportError) as e:
+            raise _RetryableError(f"{type(e).__name__}: {e}") from e
+
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            raise _RetryableError(
+                f"HTTP {response.status_code}: {response.text[:200]}",
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        if response.status_code >= 400:
+            raise LLMRequestError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+        latency = time.perf_counter() - start
+        try:
+            data = response.json()
+            usage = data.get("usage") or {}
+            completion = Completion(
+                text=data["choices"][0]["message"]["content"] or "",
+                prompt_tokens=usage.get("prompt_tokens"),
+                completion_tokens=usage.get("completion_tokens"),
+                latency_s=latency,
+            )
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+            raise LLMError(f"Malformed response ({type(e).__name__}: {e}): {response.text[:200]}") from e
+        self.latency.add(latency)
+        return completion
+
+    async def _hedged(self, payload: dict, timeout_s: float) -> Completion:
+        cfg = self.config
+        delay = None
+        if cfg.hedge_percentile and len(self.latency) >= cfg.hedge_min_samples:
+            delay = self.latency.percentile(cfg.hedge_percentile)
+        if delay is None:
+            return await self._post_once(payload, timeout_s)
+
+        primary = asyncio.ensure_future(self._post_once(payload, timeout_s))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            self._count("hedges")
+            hedge = asyncio.ensure_future(self._post_once(payload, timeout_s))
+            pending.add(hedge)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _chat(self, messages, max_tokens, temperature, timeout_s) -> Completion:
+        cfg = self.config
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError("LLM circuit breaker is open; upstream marked unavailable")
+
+        payload = {
+            "model": cfg.model,
+            "messages": messages,
+            "max_tokens": max_tokens or cfg.max_tokens,
+            "temperature": cfg.temperature if temperature is None else temperature,
+        }
+        deadline = time.monotonic() + (timeout_s or cfg.timeout_s)
+
+        last_error: Optional[Exception] = None
+        attempts = 0
+        recorded = False
+        try:
+            for attempt in range(cfg.max_retries + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                attempts += 1
+                try:
+                    completion = await self._hedged(payload, remaining)
+                    self.breaker.record_success()
+                    recorded = True
+                    return completion
+                except _RetryableError as e:
+                    last_error = e
+                    if attempt == cfg.max_retries:
+                        break
+                    backoff = min(cfg.backoff_max_s, cfg.backoff_base_s * (2 ** attempt))
+                    wait = min(e.retry_after, cfg.max_retry_after_s) if e.retry_after is not None \
+                        else random.uniform(0, backoff)
+                    if wait >= deadline - time.monotonic():
+                        break
+                    self._count("retries")
+                    await asyncio.sleep(wait)
+                except LLMRequestError:
+                    # Upstream answered; the request was bad (released in finally)
+                    self._count("failures")
+                    raise
+                except LLMError:
+                    self.breaker.record_failure()
+                    recorded = True
+                    self._count("failures")
+                    raise
+
+            self.breaker.record_failure()
+            recorded = True
+            self._count("failures")
+            raise LLMError(f"LLM call failed after {attempts} attempt(s): {last_error or 'deadline exceeded'}")
+        finally:
+            if not recorded:
+                # Cancelled or rejected: free a half-open trial without a verdict
+                self.breaker.release_trial()
+
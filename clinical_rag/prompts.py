@@ -0,0 +1,125 @@
+"""
+RAG prompt layout and response profiles.
+
+Messages are laid out from most to least stable so inference servers with
+prefix / KV caching (TGI, vLLM, llama.cpp) can reuse the longest prefix:
+
+1. system:  static instructions + the profile's answer format (byte-identical
+            for every call with the same profile)
+2. user:    conversation history (append-only within a session),
+            then retrieved context, then the question
+
+Profiles bound the answer length: ``brief`` for quick lookups, ``standard``
+(default) for normal chat, ``full`` for complete CRA reports.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+SYSTEM_PREFIX = """You are an expert Clinical Trial Data Analyst and CRA (Clinical Research Associate) Assistant.
+You help clinical research teams understand their trial data, identify issues and prioritize actions.
+
+Guidelines:
+- Use only information from the provided context; if something is not there, say so and name the data that would help
+- Be specific with numbers, percentages, study and site names
+- For a specific study, focus on it and add cross-study context only when relevant
+- Flag safety and critical issues first; make recommendations actionable
+- Use the conversation history to resolve follow-up questions and stay consistent
+- Be conversational yet professional, using clinical research terminology"""
+
+
+@dataclass(frozen=True)
+class ResponseProfile:
+    """Answer format and token budget of one response profile."""
+    name: str
+    max_tokens: int
+    instructions: str
+
+    @property
+    def system_prompt(self) -> str:
+        return f"{SYSTEM_PREFIX}\n\nAnswer format:\n{self.instructions}"
+
+
+RESPONSE_PROFILES: Dict[str, ResponseProfile] = {
+    "brief": ResponseProfile(
+        name="brief",
+        max_tokens=384,
+        instructions=(
+            "- Lead with the direct answer and the key numbers\n"
+            "- At most 5 sentences or 5 bullets; no section headings"
+        ),
+    ),
+    "standard": ResponseProfile(
+        name="standard",
+        max_tokens=1024,
+        instructions=(
+            "## Summary - 2-3 sentences with the main finding\n"
+            "## Key Findings - 3-6 bullets with specific numbers\n"
+            "## Recommended Actions - up to 3 prioritized, specific actions"
+        ),
+    ),
+    "full": ResponseProfile(
+        name="full",
+        max_tokens=4096,
+        instructions=(
+            "## Summary - 3-5 sentences covering the main points\n"
+            "## Detailed Analysis - what the data shows, why it matters, patterns, "
+            "comparisons and likely root causes\n"
+            "## Key Findings - 5-10 bullets with numbers, critical issues and positive trends\n"
+            "## Recommended Actions - 1. Immediate (safety/critical) 2. Short-term (1-2 weeks) "
+            "3. Medium-term (process) 4. Monitoring\n"
+            "## Sources Referenced - documents and studies used, with document types"
+        ),
+    ),
+}
+
+DEFAULT_PROFILE = os.environ.get("RESPONSE_PROFILE", "standard")
+
+_BRIEF_HINTS = re.compile(
+    r"\b(brief|briefly|short|concise|quick|quickly|summary only|just tell me|in short|tl;?dr|one line)\b",
+    re.IGNORECASE,
+)
+_FULL_HINTS = re.compile(
+    r"\b(detailed|in detail|in depth|in-depth|comprehensive|thorough|full report|cra report|"
+    r"monitoring report|complete report)\b",
+    re.IGNORECASE,
+)
+
+
+def select_profile(question: str, requested: Optional[str] = None) -> ResponseProfile:
+    """
+    Explicit ``requested`` profile, else one implied by the question
+    ("briefly", "detailed report", ...), else ``DEFAULT_PROFILE``.
+    """
+    if requested:
+        if requested not in RESPONSE_PROFILES:
+            raise ValueError(
+                f"Unknown response profile '{requested}'. Choose from: {', '.join(RESPONSE_PROFILES)}"
+            )
+        return RESPONSE_PROFILES[requested]
+    if _BRIEF_HINTS.search(question):
+        return RESPONSE_PROFILES["brief"]
+    if _FULL_HINTS.search(question):
+        return RESPONSE_PROFILES["full"]
+    return RESPONSE_PROFILES.get(DEFAULT_PROFILE, RESPONSE_PROFILES["standard"])
+
+
+def build_messages(profile: ResponseProfile, context: str, question: str,
+                   chat_history: Optional[str] = None) -> List[dict]:
+    """OpenAI-style chat messages, static prefix first."""
+    parts = []
+    if chat_history:
+        parts.append(chat_history)
+    parts.append(f"**Context (Clinical Trial Data):**\n{context}")
+    parts.append(f"**Question:** {question}")
+    return [
+        {"role": "system", "content": profile.system_prompt},
+        {"role": "user", "content": "\n\n---\n\n".join(parts)},
+    ]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) when the server reports no usage."""
+    return max(1, len(text) // 4) if text else 0
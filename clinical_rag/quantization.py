@@ -0,0 +1,204 @@
+"""
+Quantized vector storage with exact re-ranking.
+
+384-d float32 MiniLM vectors cost 1,536 bytes per document. The quantized
+variants keep a compressed copy in the FAISS index and re-rank the best
+candidates with the original float32 vectors, which are read lazily from the
+``embeddings.npy`` memmap written by ``clinical_rag.embedding_pipeline``:
+
+| kind   | FAISS index                     | bytes / doc (384-d) |
+|--------|---------------------------------|---------------------|
+| flat   | IndexFlatL2                     | 1,536               |
+| fp16   | IndexScalarQuantizer(QT_fp16)   | 768                 |
+| int8   | IndexScalarQuantizer(QT_8bit)   | 384                 |
+| pq     | IndexPQ(m=48, nbits=8)          | 48                  |
+
+Only the pages of ``embeddings.npy`` that hold re-ranked candidates are ever
+touched, and they live in the OS page cache rather than the process heap.
+
+Usage:
+    python -m clinical_rag.quantization faiss_index_optimized --kind int8
+    vector_store = load_quantized("faiss_index_optimized", embeddings, kind="int8")
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from clinical_rag.embedding_pipeline import EMBEDDINGS_FILE
+
+QUANTIZATION_KINDS = ("flat", "fp16", "int8", "pq")
+DEFAULT_RERANK_FACTOR = 4
+
+
+def quantized_index_name(kind: str) -> str:
+    """Base file name of the quantized index (``index`` for flat)."""
+    return "index" if kind == "flat" else f"index_{kind}"
+
+
+def build_quantized_index(
+    vectors: np.ndarray,
+    kind: str,
+    pq_m: int = 48,
+    pq_nbits: int = 8,
+    train_size: int = 20000,
+    chunk_size: int = 16384,
+    seed: int = 42,
+):
+    """
+    Build a FAISS index of the given quantization kind over ``vectors``.
+
+    Args:
+        vectors: (n, d) float32 array or memmap
+        kind: One of QUANTIZATION_KINDS
+        pq_m: PQ sub-quantizers (must divide d)
+        pq_nbits: Bits per PQ code
+        train_size: Vectors sampled for training int8 / pq
+        chunk_size: Vectors added per call (keeps memmaps bounded)
+        seed: Training sample seed
+
+    Returns:
+        faiss.Index
+    """
+    import faiss
+
+    n, d = vectors.shape
+    if kind == "flat":
+        index = faiss.IndexFlatL2(d)
+    elif kind == "fp16":
+        index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    elif kind == "int8":
+        index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    elif kind == "pq":
+        if d % pq_m:
+            raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {d}")
+        index = faiss.IndexPQ(d, pq_m, pq_nbits, faiss.METRIC_L2)
+    else:
+        raise ValueError(f"Unknown quantization kind '{kind}', expected one of {QUANTIZATION_KINDS}")
+
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(n, size=min(train_size, n), replace=False))
+        index.train(np.ascontiguousarray(vectors[sample], dtype=np.float32))
+
+    for i in range(0, n, chunk_size):
+        index.add(np.ascontiguousarray(vectors[i:i + chunk_size], dtype=np.float32))
+    return index
+
+
+class RerankingIndex:
+    """
+    Duck-typed FAISS index: approximate search on a quantized index, then exact
+    L2 re-ranking of the top ``k * rerank_factor`` candidates.
+
+    Implements the subset of the faiss.Index API that LangChain's FAISS vector
+    store uses for similarity and MMR search (``search``, ``reconstruct``,
+    ``ntotal``, ``d``).
+    """
+
+    def __init__(self, index, vectors_path: str, rerank_factor: int = DEFAULT_RERANK_FACTOR):
+        self.index = index
+        self.vectors_path = vectors_path
+        self.rerank_factor = rerank_factor
+        # Mapped now (pages are still read lazily): keeps working after the snapshot is pruned
+        self.vectors: np.ndarray = np.load(vectors_path, mmap_mode="r")
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def d(self) -> int:
+        return self.index.d
+
+    def search(self, x: np.ndarray, k: int):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        fetch = min(max(k * self.rerank_factor, k), self.ntotal)
+        _, candidates = self.index.search(x, fetch)
+
+        distances = np.full((x.shape[0], k), np.inf, dtype=np.float32)
+        labels = np.full((x.shape[0], k), -1, dtype=np.int64)
+        for row, (query, cand) in enumerate(zip(x, candidates)):
+            cand = cand[cand >= 0]
+            if not len(cand):
+                continue
+            # Sorted positions give sequential reads from the memmap.
+            cand = np.sort(cand)
+            exact = np.asarray(self.vectors[cand], dtype=np.float32)
+            dist = ((exact - query) ** 2).sum(axis=1)
+            top = np.argsort(dist, kind="stable")[:k]
+            distances[row, :len(top)] = dist[top]
+            labels[row, :len(top)] = cand[top]
+        return distances, labels
+
+    def reconstruct(self, i: int) -> np.ndarray:
+        return np.asarray(self.vectors[int(i)], dtype=np.float32)
+
+    def memory_bytes(self) -> int:
+        """Serialized size of the quantized index (what stays resident)."""
+        import faiss
+
+        return int(faiss.serialize_index(self.index).nbytes)
+
+
+def write_quantized_index(folder: str, kind: str, **kwargs) -> str:
+    """Build ``<folder>/index_<kind>.faiss`` from ``<folder>/embeddings.npy``."""
+    import faiss
+
+    vectors = np.load(os.path.join(folder, EMBEDDINGS_FILE), mmap_mode="r")
+    index = build_quantized_index(vectors, kind, **kwargs)
+    path = os.path.join(folder, f"{quantized_index_name(kind)}.faiss")
+    # Readers see the old file or the complete new one, never a partial write
+    tmp = f"{path}.tmp-{os.getpid()}"
+    faiss.write_index(index, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def load_quantized(
+    folder: str,
+    embeddings,
+    kind: str = "int8",
+    rerank_factor: int = DEFAULT_RERANK_FACTOR,
+    mmap_index: bool = False,
+):
+    """
+    Load a compact vector store whose index is quantized, with exact re-ranking.
+
+    Args:
+        folder: Index folder with docstore/, embeddings.npy and index_<kind>.faiss
+        embeddings: Embedding function used for queries
+        kind: One of QUANTIZATION_KINDS ("flat" loads the plain index)
+        rerank_factor: Candidates re-ranked per requested result
+        mmap_index: Memory-map the FAISS index (see ``load_compact``)
+
+    Returns:
+        langchain_community FAISS vector store
+    """
+    from clinical_rag.docstore import load_compact
+
+    vector_store = load_compact(folder, embeddings, index_name=quantized_index_name(kind), mmap_index=mmap_index)
+    if kind != "flat":
+        vector_store.index = RerankingIndex(
+            vector_store.index,
+            os.path.join(folder, EMBEDDINGS_FILE),
+            rerank_factor=rerank_factor,
+        )
+    return vector_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a quantized FAISS index from embeddings.npy")
+    parser.add_argument("folder", nargs="?", default="faiss_index_optimized")
+    parser.add_argument("--kind", choices=QUANTIZATION_KINDS, default="int8")
+    parser.add_argument("--pq-m", type=int, default=48)
+    parser.add_argument("--pq-nbits", type=int, default=8)
+    args = parser.parse_args()
+
+    path = write_quantized_index(args.folder, args.kind, pq_m=args.pq_m, pq_nbits=args.pq_nbits)
+    print(f"✅ {args.kind} index written to {path} ({os.path.getsize(path) / 1024 / 1024:.2f} MB)")
+
+
+if __name__ == "__main__":
+    main()
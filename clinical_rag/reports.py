@@ -0,0 +1,257 @@
+"""
+Background generation of per-study CRA narrative reports.
+
+Interactive report requests used to cost a full ``/api/chat`` round trip
+through the LLM. ``ReportScheduler`` pre-generates one narrative report per
+study whenever the data version changes, in parallel with a rate limit on LLM
+calls, and caches them on disk per data version::
+
+    report_cache/<data_version>/<study>.json
+
+The API then serves reports straight from the cache. With several workers
+only one of them runs the scheduler (``start``); the others only serve, and
+poll the data version at most every ``version_ttl`` seconds instead of
+hashing the data files on every request.
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+
+def normalize_study_id(study_id: str) -> str:
+    """Map "study 10", "Study 10" or "10" to "Study 10"."""
+    number = re.sub(r"(?i)^\s*study\s*", "", str(study_id)).strip()
+    return f"Study {number}"
+
+
+class RateLimiter:
+    """Spaces calls evenly so at most ``per_minute`` start in any minute."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ReportStore:
+    """JSON files per (data version, study)."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _path(self, version: str, study: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_-]+", "_", study)
+        return os.path.join(self.cache_dir, version, f"{safe}.json")
+
+    def get(self, version: str, study: str) -> Optional[dict]:
+        path = self._path(version, study)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def put(self, version: str, study: str, report: dict):
+        path = self._path(version, study)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def prune(self, keep_version: str):
+        """Delete reports of every other data version."""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name != keep_version:
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+
+class ReportScheduler:
+    """
+    Regenerates per-study reports in the background when the data version changes.
+
+    Args:
+        generate: study name -> report markdown (typically a RAG + LLM call)
+        list_studies: () -> study names
+        data_version: () -> current data version string
+        cache_dir: Report cache directory
+        max_workers: Reports generated in parallel
+        requests_per_minute: LLM call rate limit shared by all workers
+        poll_interval: Seconds between data version checks
+        version_ttl: Seconds a polled data version is reused when serving
+            without running the scheduler
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str], str],
+        list_studies: Callable[[], List[str]],
+        data_version: Callable[[], str],
+        cache_dir: str = "report_cache",
+        max_workers: int = 3,
+        requests_per_minute: float = 20,
+        poll_interval: float = 300,
+        version_ttl: float = 30,
+    ):
+        self.generate = generate
+        self.list_studies = list_studies
+        self.data_version = data_version
+        self.store = ReportStore(cache_dir)
+        self.poll_interval = poll_interval
+        self.version_ttl = version_ttl
+        self.limiter = RateLimiter(requests_per_minute)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cra-report")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._version: Optional[str] = None
+        self._studies: List[str] = []
+        self._pending: Dict[str, str] = {}   # study -> version being generated
+        self._errors: Dict[str, str] = {}
+        self._polled: Optional[str] = None   # Data version seen when not running
+        self._polled_at = 0.0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Generate missing reports now and keep watching the data version."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name="cra-report-watch", daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        """True in the process that generates the reports."""
+        return self._thread is not None
+
+    def stop(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _watch(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️ Report refresh failed: {e}")
+            self._stop.wait(self.poll_interval)
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def refresh(self, force: bool = False) -> int:
+        """
+        Schedule generation for every study without a cached report for the
+        current data version.
+
+        Args:
+            force: Regenerate even reports that are already cached
+
+        Returns:
+            Number of reports scheduled
+        """
+        version = self.data_version()
+        studies = self.list_studies()
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._errors.clear()
+                self.store.prune(keep_version=version)
+            self._studies = studies
+            todo = [
+                s for s in studies
+                if self._pending.get(s) != version
+                and (force or self.store.get(version, s) is None)
+            ]
+            for study in todo:
+                self._pending[study] = version
+        for study in todo:
+            self._executor.submit(self._run, study, version)
+        return len(todo)
+
+    def _run(self, study: str, version: str):
+        try:
+            self.limiter.acquire()
+            start = time.perf_counter()
+            content = self.generate(study)
+            self.store.put(version, study, {
+                "study": study,
+                "data_version": version,
+                "generated_at": datetime.now(timezone.utc).isoformat(),
+                "generation_s": round(time.perf_counter() - start, 2),
+                "report": content,
+            })
+            with self._lock:
+                self._errors.pop(study, None)
+        except Exception as e:
+            with self._lock:
+                self._errors[study] = str(e)
+        finally:
+            with self._lock:
+                if self._pending.get(study) == version:
+                    del self._pending[study]
+
+    # ------------------------------------------------------------------
+    # Serving
+    # ------------------------------------------------------------------
+
+    def current_version(self) -> str:
+        """
+        Data version reports are served for: the one the scheduler last saw
+        when running here, else the polled data version (cached for
+        ``version_ttl`` seconds).
+        """
+        with self._lock:
+            if self._version is not None:
+                return self._version
+            if self._polled is not None and time.monotonic() - self._polled_at < self.version_ttl:
+                return self._polled
+        version = self.data_version()
+        with self._lock:
+            self._polled, self._polled_at = version, time.monotonic()
+        return version
+
+    def get_report(self, study_id: str) -> Optional[dict]:
+        """Cached report for ``study_id`` at the current data version."""
+        return self.store.get(self.current_version(), normalize_study_id(study_id))
+
+    def status(self) -> dict:
+        version = self.current_version()
+        with self._lock:
+            studies = list(self._studies)
+            pending = sorted(s for s, v in self._pending.items() if v == version)
+            errors = dict(self._errors)
+        if not studies and not self.running:
+            studies = self.list_studies()
+        ready = [s for s in studies if self.store.get(version, s) is not None]
+        return {
+            "data_version": version,
+            "studies": len(studies),
+            "ready": len(ready),
+            "pending": pending,
+            "errors": errors,
+        }
+
+    def is_pending(self, study_id: str) -> bool:
+        with self._lock:
+            return normalize_study_id(study_id) in self._pending
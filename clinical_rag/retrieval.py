@@ -0,0 +1,503 @@
+"""
+Shared retrieval engine for the FastAPI backend and the Gradio Space.
+
+Both deployments previously had their own retrieval (``advanced_retrieve`` in
+``rag_pipeline_new.py`` and a plain-MMR ``retrieve_documents`` in the Space)
+and their own context formatting. ``RetrievalEngine`` is the single
+implementation, configured by one tuned ``RetrievalConfig``:
+
+1. MMR over ``k * fetch_multiplier`` candidates for diversity across studies
+2. Optional study filter
+3. Priority-aware re-ranking (data dictionary > study/CRA > site/DQI > subject)
+4. Study balancing so no single study dominates the context
+
+Long documents are indexed per ``##`` section (``clinical_rag.chunking``):
+retrieval ranks sections, at most ``max_sections_per_parent`` per document,
+and ``format_context`` merges the sections of one document into one block.
+
+Ranking works on integer FAISS positions: candidates are ranked with a
+precomputed priority-boost table, study balancing and backfill happen in a
+single pass with set-based dedupe, and ``Document`` objects are only
+materialized for the final k results.
+
+Query embeddings and retrieval results are cached (LRU) because the chat UIs
+replay example questions and follow-ups constantly.
+
+Each stage (embed, faiss_search, mmr, rerank) is recorded as a span on the
+current request trace (``clinical_rag.tracing``); outside a request the spans
+are no-ops.
+"""
+
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from clinical_rag.tracing import annotate, span
+
+# Priority by doc_type, used when a document carries no explicit ``priority``
+# (the Space's combined JSONL only stores doc_type).
+DOC_TYPE_PRIORITY = {
+    "data_dictionary": 0,
+    "study_summary": 1,
+    "study": 1,
+    "cra_report": 1,
+    "cra_monitoring_report": 1,
+    "study_dqi": 2,
+    "site_summary": 2,
+    "site": 2,
+    "subject_dqi": 3,
+    "subject_profile": 3,
+    "subject": 3,
+}
+
+# Higher score = higher priority
+PRIORITY_BOOST = {
+    0: 100,  # Data dictionary
+    1: 50,   # Study summaries, CRA reports
+    2: 25,   # Site docs, DQI summaries
+    3: 10,   # Subject-level docs
+}
+
+
+@dataclass
+class RetrievalConfig:
+    """Tuning knobs of the multi-stage retrieval."""
+    k: int = 12
+    candidate_multiplier: int = 3     # MMR returns k * candidate_multiplier candidates
+    fetch_multiplier: int = 5         # MMR considers k * fetch_multiplier neighbours
+    lambda_mult: float = 0.7          # Relevance (1.0) vs diversity (0.0)
+    min_per_study: int = 2
+    study_share_divisor: int = 5      # max_per_study = max(min_per_study, k // divisor)
+    always_include_priority: int = 1  # Priorities <= this bypass study balancing
+    priority_boost: Dict[int, int] = field(default_factory=lambda: dict(PRIORITY_BOOST))
+    max_sections_per_parent: int = 3  # Section chunks of one document in the results
+    max_chars_per_doc: Optional[int] = None
+    cache_size: int = 256
+
+
+def doc_priority(doc) -> int:
+    """Explicit ``priority`` metadata, else derived from ``doc_type``."""
+    priority = doc.metadata.get("priority")
+    if priority is None:
+        priority = DOC_TYPE_PRIORITY.get(doc.metadata.get("doc_type", ""), 3)
+    return int(priority)
+
+
+def _normalize_study(study) -> str:
+    return str(study or "").lower().strip().replace("study ", "")
+
+
+def study_matches(doc, study_filter: str) -> bool:
+    """Case-insensitive study match that accepts "Study 10" or "10"."""
+    return _normalize_study(doc.metadata.get("study", "")) == _normalize_study(study_filter)
+
+
+def rank_candidates(
+    candidates: Sequence[int],
+    meta: Callable[[int], Tuple[int, str]],
+    k: int,
+    config: "RetrievalConfig",
+    study_filter: Optional[str] = None,
+    parent: Optional[Callable[[int], Optional[str]]] = None,
+) -> List[int]:
+    """
+    Stages 2-4 on integer doc ids: study filter, priority re-rank, study balancing.
+
+    Args:
+        candidates: Doc ids (FAISS positions) in MMR order
+        meta: Doc id -> (priority, study)
+        k: Number of results
+        config: Retrieval configuration
+        study_filter: Optional study filter (e.g., "Study 10")
+        parent: Doc id -> parent document id of a section chunk (None for
+            whole documents); caps sections per document
+
+    Returns:
+        Up to k doc ids, best first
+    """
+    # Dedupe while keeping MMR order; fetch each id's metadata once
+    seen = set()
+    entries = []
+    for rank, doc_id in enumerate(candidates):
+        if doc_id in seen:
+            continue
+        seen.add(doc_id)
+        priority, study = meta(doc_id)
+        entries.append((doc_id, priority, study, rank))
+
+    # Stage 2: Apply study filter if specified
+    if study_filter:
+        wanted = _normalize_study(study_filter)
+        filtered = [e for e in entries if _normalize_study(e[2]) == wanted]
+        if len(filtered) >= k // 2:
+            entries = filtered
+
+    # Stage 3: Priority boost from a lookup table (MMR rank breaks ties)
+    boost = config.priority_boost
+    entries.sort(key=lambda e: (-boost.get(e[1], 0), e[3]))
+
+    # Stage 4: One pass - admit high-priority docs and per-study quota (and
+    # per-document section quota), keep the rest in order as backfill
+    max_per_study = max(config.min_per_study, k // config.study_share_divisor)
+    selected, backfill = [], []
+    study_count = defaultdict(int)
+    parent_count = defaultdict(int)
+    for doc_id, priority, study, _ in entries:
+        if len(selected) >= k:
+            break
+        parent_id = parent(doc_id) if parent else None
+        if parent_id is not None and parent_count[parent_id] >= config.max_sections_per_parent:
+            backfill.append(doc_id)
+        elif priority <= config.always_include_priority or study_count[study] < max_per_study:
+            selected.append(doc_id)
+            study_count[study] += 1
+            if parent_id is not None:
+                parent_count[parent_id] += 1
+        else:
+            backfill.append(doc_id)
+
+    if len(selected) < k:
+        selected.extend(backfill[:k - len(selected)])
+    return selected
+
+
+def format_context(docs, max_chars_per_doc: Optional[int] = None) -> str:
+    """Format documents with source information for the LLM context (sections of one document merged)."""
+    from clinical_rag.chunking import merge_sections
+
+    if not docs:
+        return "No relevant documents found."
+
+    docs = merge_sections(docs)
+
+    formatted = []
+    for i, doc in enumerate(docs, 1):
+        study = doc.metadata.get("study", "Unknown")
+        doc_type = doc.metadata.get("doc_type", "Unknown")
+        content = doc.page_content
+        if max_chars_per_doc and len(content) > max_chars_per_doc:
+            content = content[:max_chars_per_doc] + "..."
+        formatted.append(f"[Document {i} | {doc_type} | {study}]\n{content}")
+
+    return "\n\n---\n\n".join(formatted)
+
+
+class _LRUCache:
+    """Small thread-safe LRU cache."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RetrievalEngine:
+    """
+    Multi-stage retrieval with diversity and priority-aware re-ranking.
+
+    Usage:
+        engine = RetrievalEngine(vector_store)
+        docs = engine.retrieve("What's the status of Study 16?", study_filter="Study 16")
+        context = engine.format_context(docs)
+    """
+
+    def __init__(self, vector_store, config: Optional[RetrievalConfig] = None):
+        self.vector_store = vector_store
+        self.config = config or RetrievalConfig()
+        self._embedding_cache = _LRUCache(self.config.cache_size)
+        self._result_cache = _LRUCache(self.config.cache_size)
+        self._meta: Dict[int, Tuple[int, str]] = {}
+        self._parents: Dict[int, Optional[str]] = {}
+        self._parents_loaded = False
+        self._meta_lock = threading.Lock()
+        self._preload_metadata()
+
+    def _preload_metadata(self):
+        """Compact docstores expose priority/study columns and parent ids; load them in one query each."""
+        docstore = self.vector_store.docstore
+        columns = getattr(docstore, "metadata_columns", None)
+        if columns is None:
+            return
+        priorities, studies, doc_types = columns()
+        for idx, (priority, study, doc_type) in enumerate(zip(priorities, studies, doc_types)):
+            if priority is None:
+                priority = DOC_TYPE_PRIORITY.get(doc_type or "", 3)
+            self._meta[idx] = (int(priority), study or "Unknown")
+        if hasattr(docstore, "parent_ids"):
+            self._parents.update(docstore.parent_ids())
+            self._parents_loaded = True
+
+    @staticmethod
+    def _normalize(question: str) -> str:
+        return " ".join(question.lower().split())
+
+    def embed_query(self, question: str):
+        key = self._normalize(question)
+        embedding = self._embedding_cache.get(key)
+        if embedding is None:
+            with span("embed", queries=1):
+                embedding = self.vector_store.embedding_function.embed_query(question)
+            self._embedding_cache.put(key, embedding)
+        return embedding
+
+    def document(self, doc_id: int):
+        """Materialize the Document at FAISS position ``doc_id``."""
+        docstore = self.vector_store.docstore
+        if hasattr(docstore, "get"):
+            return docstore.get(doc_id)
+        return docstore.search(self.vector_store.index_to_docstore_id[doc_id])
+
+    def doc_meta(self, doc_id: int) -> Tuple[int, str]:
+        """(priority, study) of a doc id, cached after the first lookup."""
+        meta = self._meta.get(doc_id)
+        if meta is None:
+            self._load_meta(doc_id)
+            meta = self._meta[doc_id]
+        return meta
+
+    def doc_parent(self, doc_id: int) -> Optional[str]:
+        """Parent document id of a section chunk, None for a whole document."""
+        if not self._parents_loaded and doc_id not in self._parents:
+            self._load_meta(doc_id)
+        return self._parents.get(doc_id)
+
+    def _load_meta(self, doc_id: int):
+        doc = self.document(doc_id)
+        with self._meta_lock:
+            self._meta[doc_id] = (doc_priority(doc), doc.metadata.get("study", "Unknown"))
+            self._parents[doc_id] = doc.metadata.get("parent_id")
+
+    def parent_documents(self, doc_ids: Sequence[int]) -> List:
+        """
+        Whole documents for ``doc_ids``: every section of a chunked document
+        (its consecutive index positions) merged back together, once per
+        document, in first-seen order.
+        """
+        from clinical_rag.chunking import merge_sections
+
+        docs, seen = [], set()
+        for doc_id in doc_ids:
+            doc = self.document(doc_id)
+            parent_id = doc.metadata.get("parent_id")
+            if parent_id is None:
+                docs.append(doc)
+                continue
+            if parent_id in seen:
+                continue
+            seen.add(parent_id)
+            first = doc_id - int(doc.metadata.get("section_index", 0))
+            for position in range(first, first + int(doc.metadata.get("section_count", 1))):
+                section = doc if position == doc_id else self.document(position)
+                if section.metadata.get("parent_id") == parent_id:
+                    docs.append(section)
+        return merge_sections(docs)
+
+    def embed_queries(self, questions: Sequence[str]) -> List:
+        """Embed many questions with a single encoder call for the cache misses."""
+        keys = [self._normalize(q) for q in questions]
+        embeddings = [self._embedding_cache.get(key) for key in keys]
+        missing = [i for i, emb in enumerate(embeddings) if emb is None]
+        if missing:
+            with span("embed", queries=len(missing)):
+                fresh = self.vector_store.embedding_function.embed_documents([questions[i] for i in missing])
+            for i, emb in zip(missing, fresh):
+                embeddings[i] = emb
+                self._embedding_cache.put(keys[i], emb)
+        return embeddings
+
+    def candidate_ids(self, question: str, k: int) -> List[int]:
+        """Stage 1: MMR candidates for diversity, as FAISS positions."""
+        return self.candidate_ids_by_vector(self.embed_query(question), k)
+
+    def candidate_ids_by_vector(self, embedding, k: int) -> List[int]:
+        return self.candidate_ids_batch([embedding], k)[0]
+
+    def candidate_ids_batch(self, embeddings: Sequence, k: int) -> List[List[int]]:
+        """Stage 1 for many queries: one batched FAISS search, then MMR per query."""
+        cfg = self.config
+        queries = np.asarray(embeddings, dtype=np.float32)
+        with span("faiss_search", queries=len(queries), fetch_k=k * cfg.fetch_multiplier):
+            _, found = self.vector_store.index.search(queries, k * cfg.fetch_multiplier)
+        with span("mmr", queries=len(queries)):
+            return [self._mmr(query, row, k * cfg.candidate_multiplier) for query, row in zip(queries, found)]
+
+    def _mmr(self, query, found, k: int) -> List[int]:
+        from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+        index = self.vector_store.index
+        positions = [int(i) for i in found if i != -1]
+        if not positions:
+            return []
+        vectors = np.vstack([index.reconstruct(p) for p in positions])
+        selected = maximal_marginal_relevance(query, vectors, k=k, lambda_mult=self.config.lambda_mult)
+        return [positions[i] for i in selected]
+
+    def rank(self, candidates: Sequence[int], k: int, study_filter: Optional[str] = None) -> List[int]:
+        """Stages 2-4: study filter, priority re-ranking and study balancing."""
+        with span("rerank", candidates=len(candidates)) as s:
+            ids = rank_candidates(candidates, self.doc_meta, k, self.config, study_filter, self.doc_parent)
+            s["docs"] = len(ids)
+        return ids
+
+    def _cache_key(self, question: str, k: int, study_filter: Optional[str]):
+        return (self._normalize(question), k, (study_filter or "").strip().lower())
+
+    def retrieve_ids(self, question: str, k: Optional[int] = None, study_filter: Optional[str] = None) -> List[int]:
+        """Like ``retrieve`` but returns FAISS positions instead of Documents."""
+        k = k or self.config.k
+        key = self._cache_key(question, k, study_filter)
+        cached = self._result_cache.get(key)
+        annotate(retrieval_cache_hit=cached is not None)
+        if cached is not None:
+            return list(cached)
+
+        ids = self.rank(self.candidate_ids(question, k), k, study_filter)
+        self._result_cache.put(key, tuple(ids))
+        return ids
+
+    def retrieve(self, question: str, k: Optional[int] = None, study_filter: Optional[str] = None) -> List:
+        """
+        Retrieve the k most useful documents for ``question``.
+
+        Args:
+            question: The user's question
+            k: Total number of documents to retrieve (default: config.k)
+            study_filter: Optional study filter (e.g., "Study 10")
+
+        Returns:
+            List of relevant documents with diversity across studies
+        """
+        return [self.document(i) for i in self.retrieve_ids(question, k, study_filter)]
+
+    def retrieve_batch(
+        self,
+        questions: Sequence[str],
+        k: Optional[int] = None,
+        study_filters: Optional[Sequence[Optional[str]]] = None,
+    ) -> List[List]:
+        """
+        Retrieve documents for many questions at once.
+
+        Uncached questions are embedded in one encoder call and searched with
+        one batched FAISS search; ranking then runs per question.
+
+        Args:
+            questions: Questions to answer
+            k: Documents per question (default: config.k)
+            study_filters: Optional study filter per question (same length)
+
+        Returns:
+            One list of documents per question, in input order
+        """
+        k = k or self.config.k
+        study_filters = list(study_filters) if study_filters is not None else [None] * len(questions)
+        if len(study_filters) != len(questions):
+            raise ValueError("study_filters must have one entry per question")
+
+        results: List[Optional[List[int]]] = []
+        pending = []
+        for i, (question, study_filter) in enumerate(zip(questions, study_filters)):
+            cached = self._result_cache.get(self._cache_key(question, k, study_filter))
+            results.append(list(cached) if cached is not None else None)
+            if cached is None:
+                pending.append(i)
+
+        if pending:
+            embeddings = self.embed_queries([questions[i] for i in pending])
+            candidates = self.candidate_ids_batch(embeddings, k)
+            for i, cand in zip(pending, candidates):
+                ids = self.rank(cand, k, study_filters[i])
+                self._result_cache.put(self._cache_key(questions[i], k, study_filters[i]), tuple(ids))
+                results[i] = ids
+
+        return [[self.document(doc_id) for doc_id in ids] for ids in results]
+
+    def format_context(self, docs) -> str:
+        with span("format_context", docs=len(docs)) as s:
+            context = format_context(docs, max_chars_per_doc=self.config.max_chars_per_doc)
+            s["chars"] = len(context)
+        return context
+
+    def clear_cache(self):
+        self._embedding_cache.clear()
+        self._result_cache.clear()
+
+    def cache_stats(self) -> dict:
+        return {
+            "embedding_hits": self._embedding_cache.hits,
+            "embedding_misses": self._embedding_cache.misses,
+            "result_hits": self._result_cache.hits,
+            "result_misses": self._result_cache.misses,
+        }
+
+
+def load_vector_store(folder: str, embeddings, quantization: str = "flat", mmap_index: bool = False):
+    """
+    Load a persisted vector store in whichever format ``folder`` holds.
+
+    Compact stores (``docstore/``) are preferred; older ``save_local`` pickles
+    are still accepted. ``mmap_index`` memory-maps the FAISS index of compact
+    stores (shared between processes through the page cache). A snapshot
+    root (``clinical_rag.snapshots``) loads its active snapshot.
+    """
+    from clinical_rag.docstore import is_compact_store, load_compact
+    from clinical_rag.snapshots import snapshot_path
+
+    folder = snapshot_path(folder)
+
+    if is_compact_store(folder):
+        if quantization != "flat":
+            from clinical_rag.quantization import load_quantized
+
+            return load_quantized(folder, embeddings, kind=quantization, mmap_index=mmap_index)
+        return load_compact(folder, embeddings, mmap_index=mmap_index)
+
+    from langchain_community.vectorstores import FAISS
+
+    return FAISS.load_local(folder, embeddings, allow_dangerous_deserialization=True)
+
+
+def persisted_index_exists(folder: str) -> bool:
+    """True if ``folder`` (or its active snapshot) holds a usable (non-LFS-pointer) persisted index."""
+    from clinical_rag.docstore import is_compact_store
+    from clinical_rag.snapshots import snapshot_path
+
+    folder = snapshot_path(folder)
+
+    def real_file(path):
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return False
+        with open(path, "rb") as f:
+            return not f.read(24).startswith(b"version https://git-lfs")
+
+    if not real_file(os.path.join(folder, "index.faiss")):
+        return False
+    return is_compact_store(folder) or real_file(os.path.join(folder, "index.pkl"))
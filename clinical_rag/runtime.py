@@ -0,0 +1,170 @@
+"""
+Lazily initialized singletons of the RAG backend.
+
+``rag_pipeline_new.py`` used to create everything at import time: the LLM
+router, the embedding model (plus a test embedding), the document scan and
+the index build. Importing the app for a test, a benchmark or a uvicorn
+worker took minutes. Now each heavy object is created on first use, once per
+process, and the index is built separately (``python -m clinical_rag.build``):
+
+- ``get_llm_router()``: LLM backends (``clinical_rag.llm_backends``)
+- ``get_embeddings()``: all-MiniLM-L6-v2, or the shared embedding process
+  when EMBEDDING_SERVER_ADDRESS is set (``clinical_rag.embedding_server``)
+- ``get_index()``: the active index snapshot (``clinical_rag.snapshots``),
+  swapped in the background when a build publishes a new one
+  (INDEX_CHECK_SECONDS); ``get_vector_store()`` / ``get_retrieval_engine()``
+  return the active snapshot's vector store (INDEX_MMAP,
+  VECTOR_QUANTIZATION) and multi-stage retrieval engine. Callers fetch them
+  per request and keep the reference for its duration.
+
+The server calls ``warm_up()`` in the background at start-up. Initialization
+times are recorded in ``STARTUP_TIMINGS`` (reported by /health); each entry
+includes the dependencies it had to create first, so ``warm_up`` creates them
+in dependency order.
+
+Usage:
+    from clinical_rag.runtime import get_retrieval_engine
+    docs = get_retrieval_engine().retrieve("Open issues in Study 16", k=12)
+"""
+
+import functools
+import os
+import threading
+import time
+from typing import Callable, Dict, TypeVar
+
+from clinical_rag.embedding_pipeline import EMBEDDING_MODEL
+
+VECTORSTORE_PATH = "faiss_index_optimized"
+
+T = TypeVar("T")
+
+STARTUP_TIMINGS: Dict[str, float] = {}
+_instances: Dict[str, object] = {}
+
+
+def singleton(name: str) -> Callable[[Callable[[], T]], Callable[[], T]]:
+    """
+    Turn a zero-argument factory into a thread-safe lazy getter; the first
+    call's duration is recorded as ``STARTUP_TIMINGS[name]``. A factory that
+    raises is retried on the next call.
+    """
+    def decorator(factory: Callable[[], T]) -> Callable[[], T]:
+        lock = threading.Lock()
+
+        @functools.wraps(factory)
+        def get() -> T:
+            instance = _instances.get(name)
+            if instance is None:
+                with lock:
+                    instance = _instances.get(name)
+                    if instance is None:
+                        start = time.perf_counter()
+                        instance = factory()
+                        STARTUP_TIMINGS[name] = time.perf_counter() - start
+                        _instances[name] = instance
+            return instance
+
+        return get
+
+    return decorator
+
+
+def is_loaded(name: str) -> bool:
+    """True once the singleton ``name`` has been created."""
+    return name in _instances
+
+
+@singleton("llm_router")
+def get_llm_router():
+    from clinical_rag.llm_backends import build_router
+
+    if not os.environ.get("HUGGINGFACEHUB_API_TOKEN"):
+        print("⚠️ Warning: HUGGINGFACEHUB_API_TOKEN not set. Please set it in your environment.")
+    # Gemma 27B plus Groq / local backends when configured (LLM_* in env.example)
+    router = build_router(temperature=0.4, max_tokens=4096)
+    print(f"✅ LLM initialized: {', '.join(router.backends)} (mode: {router.fixed or 'auto'})")
+    return router
+
+
+@singleton("embeddings")
+def get_embeddings():
+    from clinical_rag.embedding_server import embeddings_from_env
+
+    embeddings = embeddings_from_env()
+    if embeddings is None:
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        embeddings = HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True, 'batch_size': 64},
+        )
+    # The first call loads the model weights; do it here, not in a request
+    dim = len(embeddings.embed_query("test clinical trial data"))
+    print(f"✅ Embeddings initialized: all-MiniLM-L6-v2 ({type(embeddings).__name__}, dim {dim})")
+    return embeddings
+
+
+def load_snapshot(path: str):
+    """(vector store, retrieval engine) for the snapshot directory ``path``."""
+    from clinical_rag.retrieval import RetrievalConfig, RetrievalEngine, load_vector_store
+
+    quantization = os.environ.get("VECTOR_QUANTIZATION", "flat")
+    if quantization != "flat":
+        from clinical_rag.quantization import quantized_index_name
+
+        # Snapshots are never modified once published; the build creates the quantized index
+        if not os.path.exists(os.path.join(path, f"{quantized_index_name(quantization)}.faiss")):
+            print(f"⚠️ {path} has no {quantization} index, serving the flat one "
+                  f"(rebuild with: python -m clinical_rag.build --quantization {quantization})")
+            quantization = "flat"
+    mmap_index = os.environ.get("INDEX_MMAP", "0") == "1"
+    store = load_vector_store(path, get_embeddings(), quantization=quantization, mmap_index=mmap_index)
+    print(f"✅ Vector store loaded from {path}: {store.index.ntotal:,} documents ({quantization}"
+          f"{', memory-mapped' if mmap_index else ''})")
+    return store, RetrievalEngine(store, RetrievalConfig(k=12))
+
+
+@singleton("index")
+def get_index():
+    from clinical_rag.snapshots import IndexManager
+
+    manager = IndexManager(
+        VECTORSTORE_PATH, load_snapshot,
+        check_interval=float(os.environ.get("INDEX_CHECK_SECONDS", "30")),
+    )
+    manager.start()
+    return manager
+
+
+def get_vector_store():
+    return get_index().active.value[0]
+
+
+def get_retrieval_engine():
+    # A new engine per snapshot: its embedding / result caches never outlive the index
+    return get_index().active.value[1]
+
+
+def warm_up():
+    """Create all singletons (in dependency order) and load local LLMs; errors are logged, not raised."""
+    for getter in (get_llm_router, get_embeddings, get_index):
+        try:
+            getter()
+        except Exception as e:
+            print(f"⚠️ Warm-up of {getter.__name__} failed: {e}")
+    if is_loaded("llm_router"):
+        # Local models load here instead of on the first question
+        start = time.perf_counter()
+        get_llm_router().warm_up()
+        STARTUP_TIMINGS["llm_backends"] = time.perf_counter() - start
+    print(startup_report())
+
+
+def startup_report() -> str:
+    """Format the initialization timings as a small table."""
+    lines = ["⏱️ Startup timings:"]
+    for phase, seconds in dict(STARTUP_TIMINGS).items():
+        lines.append(f"   {phase:<22}{seconds * 1000:>10.0f} ms")
+    return "\n".join(lines)
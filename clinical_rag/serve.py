@@ -0,0 +1,136 @@
+"""
+Production entry point: N uvicorn workers over one read-only index.
+
+Running ``rag_pipeline_new.py`` directly serves from a single process. This
+launcher:
+
+1. builds ``faiss_index_optimized/`` once if it is missing (or with
+   ``--rebuild``; same as ``python -m clinical_rag.build``)
+2. optionally starts one ``clinical_rag.embedding_server`` process that
+   hosts the embedding model for all workers (``--embedding-server``)
+3. runs ``rag_pipeline_new:app`` with ``--workers`` uvicorn processes that
+   load the existing index read-only (INDEX_MMAP=1):
+   ``docstore/contents.bin``, ``offsets.npy`` and ``embeddings.npy`` are
+   memory-mapped, so the workers share one copy through the page cache
+   instead of holding N. The FAISS index itself is not shared: with the
+   pinned faiss-cpu 1.7.4, ``IO_FLAG_MMAP`` only maps IVF inverted lists, so
+   each worker reads its own copy of a flat (1,536 bytes per entry) or
+   quantized (``VECTOR_QUANTIZATION``, 48-768 bytes) index into RAM
+
+Per-process state is kept consistent across workers: sessions default to the
+SQLite store, and only the worker holding the ``report_jobs`` lock runs the
+background CRA report jobs (see ``is_leader``).
+
+Usage:
+    python -m clinical_rag.serve --workers 4 --embedding-server
+    WEB_CONCURRENCY=4 python -m clinical_rag.serve
+"""
+
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+from typing import Dict
+
+from clinical_rag.embedding_server import ADDRESS_ENV, AUTHKEY_ENV, RemoteEmbeddings, default_address
+from clinical_rag.embedding_pipeline import available_cores
+from clinical_rag.retrieval import persisted_index_exists
+from clinical_rag.runtime import VECTORSTORE_PATH
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = "rag_pipeline_new:app"
+LOCK_DIR_ENV = "SERVE_LOCK_DIR"
+
+# Lock files held for the life of the process (see is_leader)
+_held_locks: Dict[str, object] = {}
+
+
+def is_leader(name: str) -> bool:
+    """
+    True in exactly one of the workers started by this launcher (the first to
+    take ``<SERVE_LOCK_DIR>/<name>.lock``), and always True when the app runs
+    as a single process. Used for once-per-deployment background work.
+    """
+    lock_dir = os.environ.get(LOCK_DIR_ENV)
+    if not lock_dir:
+        return True
+    if name in _held_locks:
+        return True
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows): fall back to running the job in every worker
+        return True
+    f = open(os.path.join(lock_dir, f"{name}.lock"), "a")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _held_locks[name] = f
+    return True
+
+
+def start_embedding_server(env: dict) -> subprocess.Popen:
+    """Start the shared embedding process and point the workers at it."""
+    env[ADDRESS_ENV] = default_address()
+    env[AUTHKEY_ENV] = secrets.token_hex(16)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "clinical_rag.embedding_server", "--address", env[ADDRESS_ENV]],
+        cwd=ROOT, env=env,
+    )
+    client = RemoteEmbeddings(env[ADDRESS_ENV], bytes.fromhex(env[AUTHKEY_ENV]))
+    if not client.wait_ready() or process.poll() is not None:
+        process.terminate()
+        raise SystemExit("Embedding server did not start")
+    client.embed_query("warm-up")
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the RAG API with multiple workers")
+    parser.add_argument("--workers", type=int,
+                        default=int(os.environ.get("WEB_CONCURRENCY", "0")) or available_cores())
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--embedding-server", action="store_true",
+                        default=os.environ.get("EMBEDDING_SERVER", "0") == "1",
+                        help="Host the embedding model in one shared process")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index before serving")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    # The app resolves consolidated_data/ etc. relative to the working directory
+    os.chdir(ROOT)
+    if args.rebuild or not persisted_index_exists(VECTORSTORE_PATH):
+        from clinical_rag.build import build_index
+
+        build_index(quantization=os.environ.get("VECTOR_QUANTIZATION"))
+
+    env = dict(os.environ)
+
+    embedding_server = start_embedding_server(env) if args.embedding_server else None
+    lock_dir = tempfile.mkdtemp(prefix="clinical-rag-serve-")
+    env.update({"INDEX_MMAP": "1", LOCK_DIR_ENV: lock_dir})
+    if args.workers > 1 and "SESSION_STORE" not in env:
+        # In-memory sessions would only be visible to the worker that created them
+        env["SESSION_STORE"] = "sqlite"
+    # uvicorn spawns the workers with this process's environment
+    os.environ.update(env)
+
+    print(f"🚀 Serving {APP} on http://{args.host}:{args.port} with {args.workers} worker(s)"
+          f"{' + shared embedding server' if embedding_server else ''}")
+    try:
+        uvicorn.run(APP, host=args.host, port=args.port, workers=args.workers,
+                    app_dir=ROOT, log_level="info")
+    finally:
+        if embedding_server is not None:
+            embedding_server.terminate()
+            embedding_server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+Server-side conversation memory with rolling summaries.
+
+Clients used to resend the whole ``chat_history`` on every turn. With a
+session id, the server keeps the conversation itself:
+
+- the last ``keep_recent_turns`` question/answer pairs verbatim
+- everything older folded into a running summary, updated incrementally in
+  the background (LLM summarizer, extractive fallback)
+- the history rendered into the prompt capped at ``max_history_tokens``
+
+Stores: ``MemorySessionStore`` (in-process, LRU + TTL) or
+``SQLiteSessionStore`` (survives restarts, shared by workers on one host).
+Every change is a read-modify-write through ``store.update`` (one
+``BEGIN IMMEDIATE`` transaction in SQLite), so workers answering the same
+session never drop each other's turns. A summary only replaces the turns it
+was built from: it is discarded if another worker folded turns first
+(``summarized_turns`` changed).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from clinical_rag.prompts import estimate_tokens
+
+Turn = Tuple[str, str]  # (role, content), role is "user" or "assistant"
+# current session (None if there is none) -> session to save, or None to leave it unchanged
+Change = Callable[[Optional["Session"]], Optional["Session"]]
+
+
+@dataclass
+class Session:
+    session_id: str
+    summary: str = ""
+    turns: List[Turn] = field(default_factory=list)
+    summarized_turns: int = 0  # Messages folded into the summary so far
+    updated_at: float = field(default_factory=time.time)
+
+
+class MemorySessionStore:
+    """In-process sessions; least recently used are evicted beyond ``max_sessions``."""
+
+    def __init__(self, max_sessions: int = 1000, ttl_s: float = 24 * 3600):
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.time() - session.updated_at > self.ttl_s:
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return Session(session.session_id, session.summary, list(session.turns),
+                       session.summarized_turns, session.updated_at)
+
+    def _save(self, session: Session):
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            return self._get(session_id)
+
+    def save(self, session: Session):
+        with self._lock:
+            self._save(session)
+
+    def update(self, session_id: str, change: Change) -> Optional[Session]:
+        """Apply ``change`` to the current session atomically; returns what was saved."""
+        with self._lock:
+            session = change(self._get(session_id))
+            if session is not None:
+                self._save(session)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """Sessions in a SQLite file (WAL mode, one row per session)."""
+
+    def __init__(self, path: str = "sessions.sqlite", ttl_s: float = 7 * 24 * 3600):
+        self.path = path
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        # Autocommit; update() opens its own write transaction
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, summary TEXT, turns TEXT, "
+            "summarized_turns INTEGER, updated_at REAL)"
+        )
+        self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - ttl_s,))
+
+    def _get(self, session_id: str) -> Optional[Session]:
+        row = self._conn.execute(
+            "SELECT summary, turns, summarized_turns, updated_at FROM sessions WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None or time.time() - row[3] > self.ttl_s:
+            return None
+        return Session(session_id, row[0], [tuple(t) for t in json.loads(row[1])], row[2], row[3])
+
+    def _save(self, session: Session):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)",
+            (session.session_id, session.summary, json.dumps(session.turns),
+             session.summarized_turns, session.updated_at),
+        )
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            return self._get(session_id)
+
+    def save(self, session: Session):
+        with self._lock:
+            self._save(session)
+
+    def update(self, session_id: str, change: Change) -> Optional[Session]:
+        """
+        Apply ``change`` to the current session in one write transaction;
+        other processes on the same file wait for it. Returns what was saved.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                session = change(self._get(session_id))
+                if session is not None:
+                    self._save(session)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def extractive_summary(previous: str, turns: List[Turn], max_chars: int = 1200) -> str:
+    """
+    Summary without an LLM: each question plus the first sentence of its
+    answer, appended to the previous summary and trimmed from the oldest end.
+    """
+    lines = [previous] if previous else []
+    for role, content in turns:
+        text = " ".join(content.split())
+        if role == "user":
+            lines.append(f"- Asked: {text[:200]}")
+        else:
+            first = text.split(". ")[0]
+            lines.append(f"  Answer: {first[:240]}")
+    summary = "\n".join(lines)
+    if len(summary) > max_chars:
+        summary = "..." + summary[-max_chars:]
+    return summary
+
+
+class ConversationMemory:
+    """
+    Session memory rendered into the RAG prompt.
+
+    Args:
+        store: MemorySessionStore or SQLiteSessionStore
+        summarize: (previous summary, turns to fold) -> new summary; defaults
+            to ``extractive_summary``. Failures fall back to it as well.
+        max_history_tokens: Cap on the rendered history
+        keep_recent_turns: Question/answer pairs kept verbatim
+        max_message_chars: Truncation of each verbatim message
+    """
+
+    def __init__(
+        self,
+        store,
+        summarize: Optional[Callable[[str, List[Turn]], str]] = None,
+        max_history_tokens: int = 600,
+        keep_recent_turns: int = 3,
+        max_message_chars: int = 600,
+    ):
+        self.store = store
+        self.summarize = summarize or extractive_summary
+        self.max_history_tokens = max_history_tokens
+        self.keep_recent_messages = keep_recent_turns * 2
+        self.max_message_chars = max_message_chars
+        self._lock = threading.Lock()
+        self._compacting = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-summary")
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def get(self, session_id: str) -> Optional[Session]:
+        return self.store.get(session_id)
+
+    def history(self, session_id: str) -> str:
+        """Summary + most recent messages, newest kept first when over the token cap."""
+        session = self.store.get(session_id)
+        if session is None or (not session.summary and not session.turns):
+            return "**Previous Conversation:** None (this is a new conversation)"
+
+        budget = self.max_history_tokens
+        blocks = []
+        if session.summary:
+            summary = session.summary
+            max_chars = (budget // 2) * 4
+            if len(summary) > max_chars:
+                summary = "..." + summary[-max_chars:]
+            blocks.append(f"**Conversation summary:**\n{summary}")
+            budget -= estimate_tokens(blocks[0])
+
+        recent = []
+        for role, content in reversed(session.turns):
+            if len(content) > self.max_message_chars:
+                content = content[:self.max_message_chars] + "..."
+            line = f"**{'User' if role == 'user' else 'Assistant'}:** {content}"
+            cost = estimate_tokens(line)
+            if cost > budget:
+                break
+            recent.append(line)
+            budget -= cost
+        if recent:
+            blocks.append("**Recent messages:**\n" + "\n".join(reversed(recent)))
+        return "**Previous Conversation (for context):**\n" + "\n\n".join(blocks)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def seed(self, session_id: str, messages: List[Turn], question: Optional[str] = None):
+        """
+        Start a session from client-provided history (e.g. a conversation
+        restored from the browser after a server restart). No-op if the
+        session already has turns.
+        """
+        turns = [(role, content) for role, content in messages if content]
+        if question and turns and turns[-1] == ("user", question):
+            turns = turns[:-1]
+
+        def start(session: Optional[Session]) -> Optional[Session]:
+            if session is not None and (session.turns or session.summary):
+                return None
+            return Session(session_id, turns=turns)
+
+        if self.store.update(session_id, start) is not None:
+            self._maybe_compact(session_id, len(turns))
+
+    def record(self, session_id: str, question: str, answer: str):
+        """Append one question/answer pair and fold old turns into the summary if needed."""
+        def append(session: Optional[Session]) -> Session:
+            session = session or Session(session_id)
+            session.turns.extend([("user", question), ("assistant", answer)])
+            session.updated_at = time.time()
+            return session
+
+        session = self.store.update(session_id, append)
+        self._maybe_compact(session_id, len(session.turns))
+
+    def delete(self, session_id: str) -> bool:
+        return self.store.delete(session_id)
+
+    def _maybe_compact(self, session_id: str, message_count: int):
+        if message_count <= self.keep_recent_messages:
+            return
+        with self._lock:
+            if session_id in self._compacting:
+                return
+            self._compacting.add(session_id)
+        self._executor.submit(self._compact, session_id)
+
+    def _compact(self, session_id: str):
+        try:
+            session = self.store.get(session_id)
+            if session is None:
+                return
+            fold = len(session.turns) - self.keep_recent_messages
+            if fold <= 0:
+                return
+            old_turns = session.turns[:fold]
+            try:
+                summary = self.summarize(session.summary, old_turns)
+            except Exception as e:
+                print(f"⚠️ Session summary failed, using extractive summary: {e}")
+                summary = extractive_summary(session.summary, old_turns)
+
+            def fold_in(current: Optional[Session]) -> Optional[Session]:
+                # Drop the summary if another worker folded turns meanwhile (or the
+                # session was replaced); turns are append-only otherwise
+                if (current is None or current.summarized_turns != session.summarized_turns
+                        or current.turns[:fold] != old_turns):
+                    return None
+                current.summary = summary.strip()
+                current.turns = current.turns[fold:]
+                current.summarized_turns += fold
+                return current
+
+            self.store.update(session_id, fold_in)
+        finally:
+            with self._lock:
+                self._compacting.discard(session_id)
+
+    def flush(self, timeout: float = 30.0):
+        """Wait for pending summaries (benchmarks, shutdown)."""
+        self._executor.submit(lambda: None).result(timeout=timeout)
+
+
+def build_memory(summarize: Optional[Callable[[str, List[Turn]], str]] = None) -> ConversationMemory:
+    """ConversationMemory configured from ``SESSION_*`` environment variables."""
+    if os.environ.get("SESSION_STORE", "memory") == "sqlite":
+        store = SQLiteSessionStore(os.environ.get("SESSION_DB_PATH", "sessions.sqlite"))
+    else:
+        store = MemorySessionStore(max_sessions=int(os.environ.get("SESSION_MAX", "1000")))
+    return ConversationMemory(
+        store,
+        summarize=summarize,
+        max_history_tokens=int(os.environ.get("SESSION_HISTORY_TOKENS", "600")),
+        keep_recent_turns=int(os.environ.get("SESSION_RECENT_TURNS", "3")),
+    )
@@ -0,0 +1,221 @@
+"""
+Versioned, immutable index snapshots with atomic activation.
+
+A rebuild used to overwrite ``faiss_index_optimized/`` in place while the
+API was serving from (and memory-mapping) the same files. Builds now go to a
+new snapshot directory that is never modified once published::
+
+    faiss_index_optimized/
+        CURRENT                         name of the active snapshot (one line)
+        snapshots/<version>/            index.faiss, docstore/, embeddings.npy,
+                                        manifest.json
+        snapshots/.staging-<data hash>/ build in progress (resumable)
+
+``<version>`` is ``<UTC build time>-<data hash>``; ``manifest.json`` records
+the data hash (``clinical_rag.data_version`` over the RAG files), build
+time, model, document count and build timings. Publishing renames the
+staging directory into place and then replaces ``CURRENT`` atomically
+(``os.replace``), so readers see either the old or the new snapshot, never a
+partial one. A folder without ``CURRENT`` holding ``index.faiss`` directly
+(the original layout, and what the Docker image ships) is served as-is.
+
+``IndexManager`` keeps the loaded index of the active snapshot, polls
+``CURRENT`` and swaps to a new snapshot in the background: the replacement
+is fully loaded before a single reference assignment makes it active, and
+requests already running keep the object they started with.
+
+Usage:
+    staging = staging_dir("faiss_index_optimized", data_hash)
+    ...build into staging...
+    version = publish("faiss_index_optimized", staging, {"data_hash": data_hash, ...})
+
+    manager = IndexManager("faiss_index_optimized", load=lambda path: ...)
+    manager.start()
+    manager.active.value
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, List, Optional
+
+CURRENT_FILE = "CURRENT"
+SNAPSHOTS_DIRNAME = "snapshots"
+MANIFEST_FILE = "manifest.json"
+STAGING_PREFIX = ".staging-"
+LEGACY_VERSION = "legacy"
+
+
+def staging_dir(root: str, data_hash: str) -> str:
+    """Build directory for ``data_hash``; reused by a rerun after an interruption."""
+    return os.path.join(root, SNAPSHOTS_DIRNAME, f"{STAGING_PREFIX}{data_hash}")
+
+
+def read_manifest(path: str) -> dict:
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def active_version(root: str) -> Optional[str]:
+    """Version named by ``CURRENT``, ``"legacy"`` for the flat layout, None if there is no index."""
+    current = os.path.join(root, CURRENT_FILE)
+    if os.path.exists(current):
+        with open(current, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    if os.path.exists(os.path.join(root, "index.faiss")):
+        return LEGACY_VERSION
+    return None
+
+
+def snapshot_path(root: str, version: Optional[str] = None) -> str:
+    """Directory of ``version`` (default: the active one); ``root`` itself for the flat layout."""
+    version = version or active_version(root)
+    if version is None or version == LEGACY_VERSION:
+        return root
+    return os.path.join(root, SNAPSHOTS_DIRNAME, version)
+
+
+def list_versions(root: str) -> List[str]:
+    """Published snapshots, oldest first."""
+    folder = os.path.join(root, SNAPSHOTS_DIRNAME)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name for name in os.listdir(folder) if not name.startswith("."))
+
+
+def publish(root: str, staging: str, manifest: dict, keep: int = 3) -> str:
+    """
+    Turn a finished staging build into the active snapshot.
+
+    Args:
+        root: Index root folder
+        staging: Directory the build was written to (see ``staging_dir``)
+        manifest: Manifest fields (``data_hash`` at least); version and
+            build time are added
+        keep: Published snapshots kept, the new one included. Older ones are
+            deleted; a server still on one keeps reading it through the files
+            it opened when loading it (FAISS index, docstore mappings, sqlite)
+
+    Returns:
+        The new version
+    """
+    built_at = datetime.now(timezone.utc)
+    version = f"{built_at:%Y%m%dT%H%M%SZ}-{manifest.get('data_hash', 'unknown')}"
+    manifest = dict(manifest, version=version, built_at=built_at.isoformat())
+    with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    final = snapshot_path(root, version)
+    os.replace(staging, final)
+    tmp = os.path.join(root, f"{CURRENT_FILE}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+
+    for old in list_versions(root)[:-keep]:
+        if old != version:
+            shutil.rmtree(snapshot_path(root, old), ignore_errors=True)
+    return version
+
+
+@dataclass
+class ActiveIndex:
+    """A loaded snapshot: ``value`` is whatever the loader returned."""
+    version: str
+    path: str
+    manifest: dict
+    value: Any
+    loaded_at: float = field(default_factory=time.time)
+
+
+class IndexManager:
+    """
+    The loaded active snapshot, swapped when ``CURRENT`` changes.
+
+    Args:
+        root: Index root folder
+        load: snapshot directory -> loaded index (e.g. vector store + engine)
+        check_interval: Seconds between ``CURRENT`` checks (0 = no watcher)
+    """
+
+    def __init__(self, root: str, load: Callable[[str], Any], check_interval: float = 30):
+        self.root = root
+        self.load = load
+        self.check_interval = check_interval
+        self.swaps = 0
+        self.last_error: Optional[str] = None
+        self._listeners: List[Callable[[ActiveIndex], None]] = []
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.active = self._load(active_version(root))
+
+    def _load(self, version: Optional[str]) -> ActiveIndex:
+        if version is None:
+            raise FileNotFoundError(f"No index at {self.root}/; build it with: python -m clinical_rag.build")
+        path = snapshot_path(self.root, version)
+        return ActiveIndex(version, path, read_manifest(path), self.load(path))
+
+    def on_swap(self, callback: Callable[[ActiveIndex], None]):
+        """Call ``callback(new_active)`` after every swap (cache invalidation)."""
+        self._listeners.append(callback)
+
+    def refresh(self) -> bool:
+        """Load and activate the snapshot named by ``CURRENT`` if it changed."""
+        with self._refresh_lock:
+            version = active_version(self.root)
+            if version is None or version == self.active.version:
+                return False
+            try:
+                replacement = self._load(version)
+            except Exception as e:
+                # Keep serving the old snapshot; retried on the next check
+                self.last_error = f"{version}: {e}"
+                print(f"⚠️ Index snapshot {version} failed to load: {e}")
+                return False
+            previous, self.active = self.active, replacement
+            self.swaps += 1
+            self.last_error = None
+            for callback in self._listeners:
+                try:
+                    callback(replacement)
+                except Exception as e:
+                    print(f"⚠️ Index swap listener failed: {e}")
+            print(f"🔁 Index snapshot {previous.version} -> {replacement.version}")
+            return True
+
+    def start(self):
+        """Watch ``CURRENT`` in a daemon thread."""
+        if self._thread is not None or self.check_interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._watch, name="index-snapshot-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️ Index snapshot check failed: {e}")
+
+    def status(self) -> dict:
+        active = self.active
+        return {
+            "version": active.version,
+            "data_hash": active.manifest.get("data_hash"),
+            "built_at": active.manifest.get("built_at"),
+            "documents": active.manifest.get("documents"),
+            "loaded_at": datetime.fromtimestamp(active.loaded_at, timezone.utc).isoformat(),
+            "swaps": self.swaps,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,373 @@
+"""
+Embedded, read-only SQL over the consolidated data (DuckDB).
+
+The chat endpoint only sees up to 12 retrieved text documents, so questions
+like "top 10 sites by safety discrepancies in Study 16" were approximated
+from whatever site reports happened to be retrieved. ``SqlEngine`` runs exact
+queries in-process instead:
+
+- tables are loaded once into DuckDB's columnar storage: the subject tables
+  from the memory-mapped Arrow tables of ``clinical_rag.columnar`` (no CSV
+  parsing), the site and study summaries from their JSONL (without the
+  document text)
+- only a single SELECT statement per call, with ``$name`` / ``?`` parameters;
+  file access and configuration changes are disabled once the tables are
+  registered, results are capped at ``max_rows`` and queries are interrupted
+  after ``timeout_s``
+- the tables are reloaded when the data version of their sources changes
+
+``SqlTool`` maps ranking and counting questions ("which 5 sites have the most
+missing pages in Study 3", "how many critical risk subjects are in Study 1")
+to parameterized queries and formats the result as a context block for the
+LLM.
+
+Tables:
+- ``subjects``: ``all_subjects_full``, one row per subject (issue counts,
+  Site, Country, Region, SubjectStatus, risk_category, model predictions)
+- ``clinical``: ``global_clinical_data`` (Data_Quality_Index, Clean_Patient_Status)
+- ``sites``: ``rag_site_documents.jsonl`` (study, site, total_subjects, total_issues)
+- ``studies``: ``rag_study_documents.jsonl`` (study, total_subjects, total_issues)
+"""
+
+import datetime
+import decimal
+import json
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Union
+
+import duckdb
+import pyarrow as pa
+
+from clinical_rag.columnar import load_table
+from clinical_rag.data_version import compute_data_version
+
+# SQL table name -> columnar table stem under the data folder
+ARROW_TABLES = {
+    "subjects": "all_subjects_full",
+    "clinical": "global_clinical_data",
+}
+# SQL table name -> JSONL file; the long "document" text is not loaded
+JSONL_TABLES = {
+    "sites": "rag_site_documents.jsonl",
+    "studies": "rag_study_documents.jsonl",
+}
+SOURCE_FILES = tuple(
+    f"{stem}{ext}" for stem in ARROW_TABLES.values() for ext in (".csv", ".arrow")
+) + tuple(JSONL_TABLES.values())
+
+Params = Optional[Union[Sequence, Dict[str, object]]]
+
+
+def _json_value(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    return value
+
+
+class SqlEngine:
+    """
+    Read-only DuckDB connection over the consolidated tables.
+
+    Args:
+        base_path: Folder with the consolidated data
+        max_rows: Default and maximum rows returned per query
+        timeout_s: Queries running longer are interrupted
+        memory_limit: DuckDB memory limit
+        threads: DuckDB worker threads
+        check_interval: Seconds between data version checks
+    """
+
+    def __init__(
+        self,
+        base_path: str = "consolidated_data",
+        max_rows: int = 1000,
+        timeout_s: float = 5.0,
+        memory_limit: str = "512MB",
+        threads: int = 2,
+        check_interval: float = 60,
+    ):
+        self.base_path = base_path
+        self.max_rows = max_rows
+        self.timeout_s = timeout_s
+        self.memory_limit = memory_limit
+        self.threads = threads
+        self.check_interval = check_interval
+        self.version: Optional[str] = None
+        self._con: Optional[duckdb.DuckDBPyConnection] = None
+        self._tables: Dict[str, List[dict]] = {}
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Connection
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> duckdb.DuckDBPyConnection:
+        con = duckdb.connect(":memory:", config={"threads": self.threads, "memory_limit": self.memory_limit})
+
+        def create(name: str, table: pa.Table):
+            # Registered objects are connection-local; tables are visible to every cursor
+            con.register("_source", table)
+            con.execute(f'CREATE TABLE "{name}" AS SELECT * FROM _source')
+            con.unregister("_source")
+
+        for name, stem in ARROW_TABLES.items():
+            try:
+                create(name, load_table(os.path.join(self.base_path, stem)))
+            except FileNotFoundError:
+                continue
+        for name, filename in JSONL_TABLES.items():
+            path = os.path.join(self.base_path, filename)
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+            for row in rows:
+                row.pop("document", None)
+            create(name, pa.Table.from_pylist(rows))
+        # From here on: no file access, no settings changes (also for user SQL)
+        con.execute("SET enable_external_access = false")
+        con.execute("SET lock_configuration = true")
+        return con
+
+    def _connection(self) -> duckdb.DuckDBPyConnection:
+        if self._con is not None and time.monotonic() - self._checked < self.check_interval:
+            return self._con
+        with self._lock:
+            if self._con is None or time.monotonic() - self._checked >= self.check_interval:
+                version = compute_data_version(self.base_path, SOURCE_FILES)
+                if self._con is None or version != self.version:
+                    con = self._connect()
+                    tables = {
+                        name: [{"name": c[0], "type": c[1]} for c in con.execute(f'DESCRIBE "{name}"').fetchall()]
+                        for (name,) in con.execute("SELECT table_name FROM duckdb_tables()").fetchall()
+                    }
+                    # The previous connection is released once its running queries finish
+                    self._con, self._tables, self.version = con, tables, version
+                self._checked = time.monotonic()
+            return self._con
+
+    def tables(self) -> Dict[str, List[dict]]:
+        """Table name -> columns ({name, type})."""
+        self._connection()
+        return dict(self._tables)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _check_read_only(self, con: duckdb.DuckDBPyConnection, sql: str):
+        # The connection is shared by request threads; each call parses on its own cursor
+        cursor = con.cursor()
+        try:
+            statements = cursor.extract_statements(sql)
+        except duckdb.Error as e:
+            raise ValueError(f"Invalid SQL: {e}") from e
+        finally:
+            cursor.close()
+        if len(statements) != 1:
+            raise ValueError("Exactly one SQL statement is allowed")
+        if statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("Only SELECT statements are allowed")
+
+    def query(self, sql: str, params: Params = None, max_rows: Optional[int] = None) -> dict:
+        """
+        Run one read-only SELECT.
+
+        Args:
+            sql: SELECT statement; ``?`` or ``$name`` placeholders for values
+            params: Positional list or name -> value dict for the placeholders
+            max_rows: Row cap (at most the engine's ``max_rows``)
+
+        Returns:
+            {columns, rows, row_count, truncated, elapsed_ms, data_version}
+
+        Raises:
+            ValueError: Not a single SELECT, or invalid SQL / parameters
+            TimeoutError: The query ran longer than ``timeout_s``
+        """
+        con = self._connection()
+        self._check_read_only(con, sql)
+        limit = min(max_rows or self.max_rows, self.max_rows)
+
+        cursor = con.cursor()
+        timer = threading.Timer(self.timeout_s, cursor.interrupt)
+        start = time.perf_counter()
+        timer.start()
+        try:
+            result = cursor.execute(sql, params) if params else cursor.execute(sql)
+            columns = [d[0] for d in result.description]
+            rows = result.fetchmany(limit + 1)
+        except duckdb.InterruptException as e:
+            raise TimeoutError(f"Query exceeded {self.timeout_s:g}s") from e
+        except (duckdb.ParserException, duckdb.BinderException, duckdb.CatalogException,
+                duckdb.InvalidInputException, duckdb.ConversionException, duckdb.PermissionException) as e:
+            # PermissionException: file access / settings changes after lock-down
+            raise ValueError(str(e)) from e
+        finally:
+            timer.cancel()
+            cursor.close()
+
+        return {
+            "columns": columns,
+            "rows": [[_json_value(v) for v in row] for row in rows[:limit]],
+            "row_count": min(len(rows), limit),
+            "truncated": len(rows) > limit,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+            "data_version": self.version,
+        }
+
+
+# ----------------------------------------------------------------------
+# RAG tool
+# ----------------------------------------------------------------------
+
+# Question wording -> subjects column (first match wins)
+METRICS = (
+    (r"safety\s+discrepanc", "safety_discrepancy_count"),
+    (r"open\s+(issues|queries|edrr)", "open_issues_count"),
+    (r"missing\s+(crf\s+)?pages?", "missing_pages_count"),
+    (r"missing\s+labs?", "missing_lab_count"),
+    (r"(outstanding|overdue)\s+visits?", "outstanding_visits_count"),
+    (r"meddra", "meddra_coding_pending"),
+    (r"who-?dd|whodrug", "whodd_coding_pending"),
+    (r"inactivated", "inactivated_forms_count"),
+    (r"issues", "total_issues"),
+)
+ENTITIES = {"site": "Site", "subject": "Subject", "patient": "Subject", "countr": "Country",
+            "region": "Region", "stud": "Study"}
+RISK_LEVELS = ("low", "medium", "high", "critical")
+
+_RANKING = re.compile(r"\b(top|most|highest|worst|largest|fewest|lowest|least)\b", re.IGNORECASE)
+_LIMIT = re.compile(r"\b(?:top|which|what|the|list)\s+(\d{1,3})\b", re.IGNORECASE)
+_ASCENDING = re.compile(r"\b(fewest|lowest|least)\b", re.IGNORECASE)
+_COUNT = re.compile(r"\bhow\s+many\b", re.IGNORECASE)
+_ENTITY = re.compile(r"\b(sites?|subjects?|patients?|countr(?:y|ies)|regions?|stud(?:y|ies))\b", re.IGNORECASE)
+_STUDY = re.compile(r"\bstudy\s*(\d+)\b", re.IGNORECASE)
+_RISK = re.compile(r"\b(low|medium|high|critical)[\s-]+risk\b", re.IGNORECASE)
+
+
+@dataclass
+class ToolCall:
+    description: str
+    sql: str
+    params: Dict[str, object] = field(default_factory=dict)
+
+
+class SqlTool:
+    """Exact answers for ranking/counting questions, as LLM context."""
+
+    def __init__(self, engine: SqlEngine, default_limit: int = 10, max_limit: int = 50):
+        self.engine = engine
+        self.default_limit = default_limit
+        self.max_limit = max_limit
+        self._studies: frozenset = frozenset()
+        self._studies_version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def studies(self) -> frozenset:
+        """Normalized (trimmed, upper-case) study names of the subjects table."""
+        self.engine.tables()
+        with self._lock:
+            if self._studies_version != self.engine.version:
+                result = self.engine.query(
+                    "SELECT DISTINCT upper(trim(Study)) FROM subjects WHERE Study IS NOT NULL",
+                    max_rows=self.engine.max_rows,
+                )
+                self._studies = frozenset(row[0] for row in result["rows"])
+                self._studies_version = result["data_version"]
+            return self._studies
+
+    def plan(self, question: str, study_filter: Optional[str] = None) -> Optional[ToolCall]:
+        """
+        The query answering ``question``, or None if it is not a ranking/count
+        question or names a study that is not in the data.
+        """
+        columns = {c["name"] for c in self.engine.tables().get("subjects", [])}
+        if not columns:
+            return None
+        text = question.lower()
+        metric = next((col for pattern, col in METRICS if re.search(pattern, text) and col in columns), None)
+
+        study_match = _STUDY.search(question)
+        study = f"Study {study_match.group(1)}" if study_match else study_filter
+        where, params = [], {}
+        if study:
+            # Study labels are not uniform in the data ("STUDY 21", "Study 6 ")
+            if study.strip().upper() not in self.studies():
+                return None
+            where.append("upper(trim(Study)) = $study")
+            params["study"] = study.strip().upper()
+        risk = _RISK.search(question)
+        if risk and "risk_category" in columns:
+            where.append("lower(risk_category) = $risk")
+            params["risk"] = risk.group(1).lower()
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        scope = ", ".join(
+            part for part in (f"{params['risk']} risk" if "risk" in params else None, study) if part
+        ) or "all studies"
+
+        # Entity asked about; "Study 16" names the scope, not the entity
+        entities = [
+            m.group(1).lower() for m in _ENTITY.finditer(question)
+            if not _STUDY.match(question, m.start())
+        ]
+        group = next((ENTITIES[key] for key in ENTITIES if entities and entities[0].startswith(key)), None)
+
+        if _RANKING.search(question) and metric and group in columns:
+            limit_match = _LIMIT.search(question)
+            limit = min(int(limit_match.group(1)) if limit_match else self.default_limit, self.max_limit)
+            order = "ASC" if _ASCENDING.search(question) else "DESC"
+            keys = [group] + (["Study"] if group == "Site" and not study else [])
+            key_sql = ", ".join(f'"{k}"' for k in keys)
+            params["limit"] = limit
+            return ToolCall(
+                description=f"{'Bottom' if order == 'ASC' else 'Top'} {limit} by {metric} per {group} ({scope})",
+                sql=f'SELECT {key_sql}, count(*) AS subjects, sum("{metric}") AS "{metric}" '
+                    f"FROM subjects {where_sql} GROUP BY {key_sql} "
+                    f'ORDER BY "{metric}" {order}, subjects DESC LIMIT $limit',
+                params=params,
+            )
+
+        if _COUNT.search(question) and group == "Subject":
+            select = "count(*) AS subjects"
+            if metric:
+                select += (f', sum("{metric}") AS "{metric}", '
+                           f'count(*) FILTER (WHERE "{metric}" > 0) AS "subjects_with_{metric}"')
+            return ToolCall(
+                description=f"Subject count{f' and {metric}' if metric else ''} ({scope})",
+                sql=f"SELECT {select} FROM subjects {where_sql}",
+                params=params,
+            )
+        return None
+
+    def run(self, call: ToolCall) -> dict:
+        return self.engine.query(call.sql, call.params)
+
+    def context(self, question: str, study_filter: Optional[str] = None) -> Optional[str]:
+        """Markdown block with the exact result, or None if no query applies."""
+        call = self.plan(question, study_filter)
+        if call is None:
+            return None
+        result = self.run(call)
+        lines = [
+            "## Exact figures (SQL over the consolidated subject data)",
+            f"**Query:** {call.description}",
+            "",
+            "| " + " | ".join(result["columns"]) + " |",
+            "|" + "---|" * len(result["columns"]),
+        ]
+        for row in result["rows"]:
+            lines.append("| " + " | ".join("" if v is None else str(v) for v in row) + " |")
+        if not result["rows"]:
+            lines.append("(no matching rows)")
+        return "\n".join(lines)
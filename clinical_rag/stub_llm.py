@@ -0,0 +1,181 @@
+"""
+Local stub of an OpenAI-compatible chat completions server.
+
+Used by tests and benchmarks so that nothing depends on the remote Gemma
+endpoint. Latency, failure rate and output length are configurable, which
+makes it possible to exercise timeouts, retries, hedging and the circuit
+breaker deterministically.
+
+Usage:
+    python -m clinical_rag.stub_llm --port 8089 --latency-ms 300 --tail-ms 3000 --tail-rate 0.05
+
+    with StubLLMServer(latency_ms=50) as stub:
+        client = LLMClient(LLMClientConfig(base_url=stub.base_url, api_key=None))
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "StubLLM/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._send(200, {"status": "ok", "requests": self.server.stub.requests})
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        stub.count()
+
+        rng = stub.rng()
+        if rng.random() < stub.error_rate:
+            self._send(503, {"error": "stub: simulated upstream failure"}, {"Retry-After": "0"})
+            return
+
+        messages = request.get("messages", [])
+        prompt_chars = sum(len(m.get("content", "")) for m in messages)
+        question = messages[-1].get("content", "") if messages else ""
+        max_tokens = int(request.get("max_tokens") or stub.output_tokens)
+        tokens = min(max_tokens, stub.output_tokens)
+
+        delay = stub.latency_ms + rng.uniform(0, stub.jitter_ms) + tokens * stub.ms_per_token
+        if rng.random() < stub.tail_rate:
+            delay += stub.tail_ms
+        time.sleep(delay / 1000)
+        text = (
+            f"## Summary\nStub answer to: {question[:120]}\n\n"
+            + " ".join(["token"] * max(0, tokens - 8))
+        )
+        self._send(200, {
+            "id": f"stub-{stub.requests}",
+            "object": "chat.completion",
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": tokens,
+                "total_tokens": prompt_chars // 4 + tokens,
+            },
+        })
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on purpose (hedging cancels the slower request)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubLLMServer:
+    """
+    Threaded stub server; usable as a context manager.
+
+    Args:
+        host: Bind address
+        port: Bind port (0 picks a free port)
+        latency_ms: Base response latency
+        jitter_ms: Uniform extra latency
+        tail_ms: Extra latency of slow (tail) responses
+        tail_rate: Fraction of responses that are slow
+        error_rate: Fraction of requests answered with HTTP 503
+        output_tokens: Words in each answer (capped by max_tokens)
+        ms_per_token: Decode time per output token (makes latency scale with max_tokens)
+        seed: Random seed (None for nondeterministic)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 100,
+                 jitter_ms: float = 0, tail_ms: float = 0, tail_rate: float = 0,
+                 error_rate: float = 0, output_tokens: int = 256, ms_per_token: float = 0,
+                 seed: int = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tail_ms = tail_ms
+        self.tail_rate = tail_rate
+        self.error_rate = error_rate
+        self.output_tokens = output_tokens
+        self.ms_per_token = ms_per_token
+        self.requests = 0
+        self._seed = seed
+        self._lock = threading.Lock()
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.stub = self
+        self._thread = None
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def rng(self) -> random.Random:
+        with self._lock:
+            return random.Random(None if self._seed is None else self._seed + self.requests)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--tail-ms", type=float, default=0)
+    parser.add_argument("--tail-rate", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--output-tokens", type=int, default=256)
+    parser.add_argument("--ms-per-token", type=float, default=0)
+    args = parser.parse_args()
+
+    stub = StubLLMServer(
+        host=args.host, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        tail_ms=args.tail_ms, tail_rate=args.tail_rate, error_rate=args.error_rate,
+        output_tokens=args.output_tokens, ms_per_token=args.ms_per_token,
+    )
+    print(f"🧪 Stub LLM listening on {stub.base_url} (set LLM_BASE_URL to use it)")
+    try:
+        stub._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
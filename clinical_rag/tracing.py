@@ -0,0 +1,316 @@
+"""
+Request tracing, stage timings and Prometheus metrics.
+
+Each API request gets a ``Trace`` (request id, spans, attributes). Code on the
+request path records stages with ``span("faiss_search")``; the current trace
+travels in a ``contextvars.ContextVar``, so the retrieval engine does not need
+a trace argument and ``span`` is a no-op outside a request (CLI, benchmarks).
+``asyncio.to_thread`` copies the context, so spans from worker threads land
+in the right trace.
+
+When a trace finishes it is:
+- folded into ``METRICS`` (served as Prometheus text on ``/metrics``)
+- appended to a local JSONL trace log (``TRACE_LOG_PATH``, sampled by
+  ``TRACE_SAMPLE_RATE``)
+"""
+
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+_current: contextvars.ContextVar = contextvars.ContextVar("rag_trace", default=None)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+class Trace:
+    """Spans and attributes of one request."""
+
+    def __init__(self, name: str, request_id: Optional[str] = None):
+        self.name = name
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans: List[dict] = []
+        self.attrs: Dict[str, object] = {}
+        self.error: Optional[str] = None
+        self.status = "ok"
+        self.duration_s: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def set(self, **attrs):
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def add_span(self, name: str, start: float, duration: float, attrs: dict):
+        with self._lock:
+            self.spans.append({
+                "name": name,
+                "start_ms": round((start - self._t0) * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+                **attrs,
+            })
+
+    def record_error(self, exc: BaseException):
+        self.error = f"{type(exc).__name__}: {exc}"
+        self.status = "error"
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Seconds per stage name (a stage may occur several times)."""
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            totals[s["name"]] = totals.get(s["name"], 0.0) + s["duration_ms"] / 1000
+        return totals
+
+    def to_dict(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round((self.duration_s or 0) * 1000, 3),
+            "status": self.status,
+            "error": self.error,
+            "attrs": self.attrs,
+            "spans": self.spans,
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time a stage of the current request. Yields a dict; keys added to it
+    (sizes, counts) are stored on the span.
+    """
+    trace = _current.get()
+    extra = dict(attrs)
+    if trace is None:
+        yield extra
+        return
+    start = time.perf_counter()
+    try:
+        yield extra
+    except BaseException as e:
+        extra["error"] = type(e).__name__
+        raise
+    finally:
+        trace.add_span(name, start, time.perf_counter() - start, extra)
+
+
+def annotate(**attrs):
+    """Set attributes on the current trace (no-op outside a request)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.set(**attrs)
+
+
+def record_error(exc: BaseException):
+    trace = _current.get()
+    if trace is not None:
+        trace.record_error(exc)
+
+
+# ----------------------------------------------------------------------
+# Metrics
+# ----------------------------------------------------------------------
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Minimal Prometheus registry: counters, histograms and callback gauges."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, _Histogram]] = {}
+        self._hist_buckets: Dict[str, tuple] = {}
+        self._gauges: Dict[str, Callable[[], Dict[tuple, float]]] = {}
+
+    def counter(self, name: str, help_text: str):
+        self._help[name] = ("counter", help_text)
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self._help[name] = ("histogram", help_text)
+        self._histograms.setdefault(name, {})
+        self._hist_buckets[name] = tuple(buckets)
+
+    def gauge(self, name: str, help_text: str, collect: Callable[[], Dict[tuple, float]]):
+        """``collect`` returns {labels tuple: value}; called on every scrape."""
+        self._help[name] = ("gauge", help_text)
+        self._gauges[name] = collect
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms[name]
+            if key not in series:
+                series[key] = _Histogram(self._hist_buckets[name])
+            series[key].observe(value)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, series in self._counters.items():
+                lines += [f"# HELP {name} {self._help[name][1]}", f"# TYPE {name} counter"]
+                for labels, value in series.items():
+                    lines.append(f"{name}{_label_str(labels)} {value:g}")
+            for name, series in self._histograms.items():
+                lines += [f"# HELP {name} {self._help[name][1]}", f"# TYPE {name} histogram"]
+                for labels, hist in series.items():
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets + (float("inf"),), hist.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{name}_bucket{_label_str(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_label_str(labels)} {hist.sum:.6f}")
+                    lines.append(f"{name}_count{_label_str(labels)} {hist.count}")
+        for name, collect in self._gauges.items():
+            try:
+                values = collect()
+            except Exception:
+                continue
+            lines += [f"# HELP {name} {self._help[name][1]}", f"# TYPE {name} gauge"]
+            for labels, value in values.items():
+                lines.append(f"{name}{_label_str(tuple(labels))} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+METRICS.counter("rag_requests_total", "API requests by endpoint and status")
+METRICS.counter("rag_errors_total", "Failed API requests by endpoint and error type")
+METRICS.histogram("rag_request_duration_seconds", "End-to-end request latency")
+METRICS.histogram("rag_stage_duration_seconds", "Time per pipeline stage within a request")
+METRICS.histogram("rag_docs_retrieved", "Documents sent to the LLM per request", SIZE_BUCKETS)
+METRICS.histogram("rag_context_tokens", "Estimated context tokens per request", SIZE_BUCKETS)
+METRICS.histogram("rag_output_tokens", "Estimated answer tokens per request", SIZE_BUCKETS)
+METRICS.histogram("rag_llm_queue_wait_seconds", "Time requests waited for an LLM slot (admission queue)")
+METRICS.counter("rag_llm_admission_total", "LLM admission decisions by outcome (admitted / queue_full / client_limit / queue_timeout)")
+
+# Trace attributes exported as histograms
+_SIZE_ATTRS = {
+    "docs": "rag_docs_retrieved",
+    "context_tokens": "rag_context_tokens",
+    "output_tokens": "rag_output_tokens",
+}
+
+
+# ----------------------------------------------------------------------
+# Trace log
+# ----------------------------------------------------------------------
+
+class TraceLog:
+    """Append-only JSONL trace log with one rotated backup (``<path>.1``)."""
+
+    def __init__(self, path: str, sample_rate: float = 1.0, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def write(self, trace: Trace):
+        # Errors are always kept; successful requests are sampled
+        if trace.status == "ok" and random.random() >= self.sample_rate:
+            return
+        line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+# TRACE_LOG_PATH="" disables the trace log (metrics are still collected)
+_trace_log_path = os.environ.get("TRACE_LOG_PATH", "traces.jsonl")
+_trace_log: Optional[TraceLog] = TraceLog(
+    _trace_log_path, sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", "1.0"))
+) if _trace_log_path else None
+
+
+def start_trace(name: str, request_id: Optional[str] = None) -> Tuple[Trace, contextvars.Token]:
+    """Begin a request trace and make it current."""
+    trace = Trace(name, request_id)
+    return trace, _current.set(trace)
+
+
+@contextmanager
+def local_trace(name: str):
+    """Make a trace current without reporting it (benchmarks, offline jobs)."""
+    trace, token = start_trace(name)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def finish_trace(trace: Trace, token: Optional[contextvars.Token] = None, status_code: int = 200):
+    """Close the trace: record metrics, write the trace log, restore the context."""
+    if trace.duration_s is not None:
+        return
+    trace.duration_s = time.perf_counter() - trace._t0
+    if status_code >= 500 and trace.status == "ok":
+        trace.status = "error"
+    endpoint = trace.name
+
+    METRICS.inc("rag_requests_total", endpoint=endpoint, status=str(status_code))
+    METRICS.observe("rag_request_duration_seconds", trace.duration_s, endpoint=endpoint)
+    if trace.status == "error":
+        error_type = (trace.error or f"HTTP {status_code}").split(":")[0]
+        METRICS.inc("rag_errors_total", endpoint=endpoint, error=error_type)
+    for stage, seconds in trace.stage_totals().items():
+        METRICS.observe("rag_stage_duration_seconds", seconds, stage=stage)
+    for attr, metric in _SIZE_ATTRS.items():
+        if isinstance(trace.attrs.get(attr), (int, float)):
+            METRICS.observe(metric, trace.attrs[attr], endpoint=endpoint)
+
+    if _trace_log is not None:
+        try:
+            _trace_log.write(trace)
+        except OSError as e:
+            print(f"⚠️ Trace log write failed: {e}")
+    if token is not None:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Finished from another context (end of a streamed response)
+            pass
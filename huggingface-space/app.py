@@ -4,14 +4,66 @@ Hugging Face Spaces Deployment
 """
 
 import os
+import sys
 import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+_STARTUP_T0 = time.perf_counter()
+
 import gradio as gr
 from collections import defaultdict
-from langchain_huggingface import HuggingFaceEmbeddings, ChatHuggingFace, HuggingFaceEndpoint
+from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+
+# Shared retrieval core: copied next to app.py on deploy, one level up in the repo
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if not os.path.isdir(os.path.join(_HERE, "clinical_rag")):
+    sys.path.insert(0, os.path.dirname(_HERE))
+
+from clinical_rag.docstore import save_compact
+from clinical_rag.llm_backends import build_router
+from clinical_rag.prompts import build_messages, select_profile
+from clinical_rag.retrieval import (
+    RetrievalConfig,
+    RetrievalEngine,
+    format_context,
+    load_vector_store,
+    persisted_index_exists,
+)
+
+# ============================================================================
+# Startup Timing
+# ============================================================================
+# Cold starts are the most visible latency of the Space, so every startup
+# phase is timed and reported once the app is ready to answer.
+
+STARTUP_TIMINGS = {"imports": time.perf_counter() - _STARTUP_T0}
+_timings_lock = threading.Lock()
+
+
+@contextmanager
+def timed_phase(name: str):
+    """Record the wall-clock duration of a startup phase."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _timings_lock:
+            STARTUP_TIMINGS[name] = time.perf_counter() - start
+
+
+def startup_report() -> str:
+    """Format the per-phase startup timings as a small table."""
+    with _timings_lock:
+        timings = dict(STARTUP_TIMINGS)
+    lines = ["⏱️ Startup timings:"]
+    for phase, seconds in timings.items():
+        lines.append(f"   {phase:<22}{seconds * 1000:>10.0f} ms")
+    return "\n".join(lines)
 
 # ============================================================================
 # Configuration
@@ -23,33 +75,25 @@ HF_TOKEN = os.environ.get("HUGGINGFACEHUB_API_TOKEN")
 if not HF_TOKEN:
     print("⚠️ Warning: HUGGINGFACEHUB_API_TOKEN not set. Please add it to Space secrets.")
 
+INDEX_PATH = "faiss_index"
+
 # ============================================================================
-# Initialize LLM
+# Initialize LLM (lazily, on the first question)
 # ============================================================================
 
-print("🚀 Initializing LLM...")
-llm = HuggingFaceEndpoint(
-    repo_id="google/gemma-3-27b-it",
-    temperature=0.4,
-    max_new_tokens=2048,
-)
-model = ChatHuggingFace(llm=llm)
-print("✅ LLM initialized: Gemma 27B")
+_router = None
+_router_lock = threading.Lock()
 
-# ============================================================================
-# Initialize Embeddings
-# ============================================================================
 
-print("🔄 Loading embeddings model...")
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",
-    model_kwargs={'device': 'cpu'},
-    encode_kwargs={
-        'normalize_embeddings': True,
-        'batch_size': 32
-    }
-)
-print("✅ Embeddings initialized: all-MiniLM-L6-v2")
+def get_llm_router():
+    """Create the LLM backends (Gemma 27B, plus Groq / local CPU model if configured) on first use."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            with timed_phase("llm_client"):
+                _router = build_router(temperature=0.4, max_tokens=2048)
+            print(f"✅ LLM initialized: {', '.join(_router.backends)}")
+    return _router
 
 # ============================================================================
 # Load Documents and Create Vector Store
@@ -109,122 +153,118 @@ def load_documents():
     
     return documents
 
-def create_vector_store(documents):
-    """Create or load FAISS vector store."""
-    index_path = "faiss_index"
-    
-    # Try to load existing index
-    if os.path.exists(f"{index_path}/index.faiss"):
+def load_embeddings():
+    """Load the MiniLM sentence embedding model."""
+    print("🔄 Loading embeddings model...")
+    with timed_phase("embeddings_model"):
+        embeddings = HuggingFaceEmbeddings(
+            model_name="sentence-transformers/all-MiniLM-L6-v2",
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={
+                'normalize_embeddings': True,
+                'batch_size': 32
+            }
+        )
+    print("✅ Embeddings initialized: all-MiniLM-L6-v2")
+    return embeddings
+
+
+def create_vector_store(embeddings):
+    """Load the persisted FAISS index, or build one from the documents."""
+    # Try to load existing index - documents are only parsed if this fails
+    if persisted_index_exists(INDEX_PATH):
         print("📂 Loading existing FAISS index...")
         try:
-            vector_store = FAISS.load_local(
-                index_path, 
-                embeddings,
-                allow_dangerous_deserialization=True
-            )
+            with timed_phase("index_load"):
+                vector_store = load_vector_store(INDEX_PATH, embeddings)
             print("✅ FAISS index loaded")
             return vector_store
         except Exception as e:
             print(f"⚠️ Failed to load index: {e}")
-    
+
+    with timed_phase("document_load"):
+        documents = load_documents()
+
     # Create new index
     if documents:
         print("🔧 Creating new FAISS index...")
-        vector_store = FAISS.from_documents(documents, embeddings)
+        with timed_phase("index_build"):
+            vector_store = FAISS.from_documents(documents, embeddings)
         
-        # Save for future use
-        os.makedirs(index_path, exist_ok=True)
-        vector_store.save_local(index_path)
+            # Save for future use
+            save_compact(vector_store, INDEX_PATH)
         print("✅ FAISS index created and saved")
         return vector_store
     
     return None
 
-# Load documents and create vector store
-print("\n" + "="*60)
-print("Loading Clinical Trial RAG System")
-print("="*60 + "\n")
 
-documents = load_documents()
-vector_store = create_vector_store(documents)
+def _initialize_retrieval():
+    """Background startup: embeddings model, then vector store and engine."""
+    embeddings = load_embeddings()
+    vector_store = create_vector_store(embeddings)
+    engine = RetrievalEngine(vector_store, RetrievalConfig(k=8)) if vector_store is not None else None
+    with _timings_lock:
+        STARTUP_TIMINGS["retrieval_ready"] = time.perf_counter() - _STARTUP_T0
+    print(startup_report())
+    return engine
 
-# ============================================================================
-# RAG Chain Setup
-# ============================================================================
 
-RAG_PROMPT = """You are ClinicalAI, an expert assistant for clinical trial data analysis.
-Your role is to help Clinical Research Associates (CRAs) and data managers understand trial data.
+# Start loading while the Gradio UI is being built; chat() waits on this.
+print("\n" + "="*60)
+print("Loading Clinical Trial RAG System (background)")
+print("="*60 + "\n")
 
-CONTEXT FROM RETRIEVED DOCUMENTS:
-{context}
+_startup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-startup")
+_engine_future = _startup_executor.submit(_initialize_retrieval)
 
-USER QUESTION: {question}
 
-INSTRUCTIONS:
-1. Answer based ONLY on the provided context
-2. If the context doesn't contain relevant information, say so clearly
-3. Use specific numbers and data points when available
-4. Format your response with clear sections using markdown
-5. Highlight critical risks and actionable items
-6. Be concise but thorough
+def get_retrieval_engine():
+    """Block until the background startup has produced the retrieval engine."""
+    return _engine_future.result()
 
-RESPONSE:"""
+# ============================================================================
+# RAG Chain Setup
+# ============================================================================
 
-prompt = ChatPromptTemplate.from_template(RAG_PROMPT)
-output_parser = StrOutputParser()
+# Shared with the backend (clinical_rag/prompts.py): static instructions first
+# so the endpoint can reuse its prefix cache, and a response profile
+# (brief / standard / full) that bounds the answer length.
 
 def retrieve_documents(question: str, k: int = 8):
-    """Retrieve relevant documents using MMR."""
-    if vector_store is None:
+    """Retrieve relevant documents with the shared multi-stage retrieval."""
+    engine = get_retrieval_engine()
+    if engine is None:
         return []
     
     try:
-        docs = vector_store.max_marginal_relevance_search(
-            question,
-            k=k,
-            fetch_k=k * 3,
-            lambda_mult=0.7
-        )
-        return docs
+        return engine.retrieve(question, k=k)
     except Exception as e:
         print(f"Retrieval error: {e}")
         return []
 
-def format_context(docs):
-    """Format retrieved documents into context string."""
-    if not docs:
-        return "No relevant documents found."
-    
-    context_parts = []
-    for i, doc in enumerate(docs, 1):
-        metadata = doc.metadata
-        doc_type = metadata.get('doc_type', 'unknown')
-        study = metadata.get('study', 'N/A')
-        
-        context_parts.append(f"[Document {i} - {doc_type.upper()} - Study: {study}]")
-        context_parts.append(doc.page_content[:1500])  # Limit content length
-        context_parts.append("")
-    
-    return "\n".join(context_parts)
-
 def chat(message: str, history: list) -> str:
     """Process chat message and return response."""
     if not message.strip():
         return "Please enter a question about clinical trial data."
     
     try:
+        # Simple lookups may go to a small local model, which gets fewer documents
+        router = get_llm_router()
+        backend = router.select(message)
+
         # Retrieve relevant documents
-        docs = retrieve_documents(message, k=8)
+        docs = retrieve_documents(message, k=backend.limit_k(8))
         
         # Format context
         context = format_context(docs)
         
         # Generate response
-        chain = prompt | model | output_parser
-        response = chain.invoke({
-            "context": context,
-            "question": message
-        })
+        profile = select_profile(message)
+        response, _ = router.generate(
+            build_messages(profile, context, message),
+            question=message, backend=backend, max_tokens=profile.max_tokens,
+        )
         
         # Add source information
         if docs:
@@ -271,6 +311,7 @@ footer {
 """
 
 # Create Gradio interface
+_ui_start = time.perf_counter()
 with gr.Blocks(css=CUSTOM_CSS, title="ClinicalAI - Clinical Trial Assistant") as demo:
     gr.Markdown("""
     # 🏥 ClinicalAI - Clinical Trial RAG Assistant
@@ -301,6 +342,10 @@ with gr.Blocks(css=CUSTOM_CSS, title="ClinicalAI - Clinical Trial Assistant") as
     - Risk assessments, DQI scores, CRA reports
     """)
 
+STARTUP_TIMINGS["ui_build"] = time.perf_counter() - _ui_start
+STARTUP_TIMINGS["ui_ready"] = time.perf_counter() - _STARTUP_T0
+print(f"✅ UI ready in {STARTUP_TIMINGS['ui_ready'] * 1000:.0f} ms (retrieval still loading in background)")
+
 # Launch the app
 if __name__ == "__main__":
     demo.launch(
@@ -61,6 +61,13 @@ Copy-Item "$SourceDir\requirements.txt" -Destination . -Force
 Copy-Item "$SourceDir\README.md" -Destination . -Force
 Copy-Item "$SourceDir\.gitattributes" -Destination . -Force
 
+# Copy shared retrieval core (lives at the repo root)
+if (Test-Path "$SourceDir\..\clinical_rag") {
+    New-Item -ItemType Directory -Path "clinical_rag" -Force | Out-Null
+    Copy-Item "$SourceDir\..\clinical_rag\*.py" -Destination "clinical_rag\" -Force
+    Write-Host "  ✅ clinical_rag package copied" -ForegroundColor Green
+}
+
 # Copy data folder
 if (Test-Path "$SourceDir\data") {
     New-Item -ItemType Directory -Path "data" -Force | Out-Null
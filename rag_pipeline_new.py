@@ -44,24 +44,28 @@
 
 
 # ============================================================================
-# CELL 2: Setup LLM (Gemma 27B via HuggingFace Inference API)
+# CELL 2: Setup LLM (Gemma 27B via HuggingFace Inference API + optional backends)
 # ============================================================================
+# Gemma 27B for generation - optimized for conversational responses.
+# Remote backends share a pooled client with timeouts, retries, optional
+# hedging and a circuit breaker (LLM_* settings in env.example; LLM_BASE_URL
+# can point at the local stub server: python -m clinical_rag.stub_llm).
+# Groq (GROQ_API_KEY) and a local quantized CPU model (llama-cpp-python) are
+# added when configured; simple lookups are routed to the fastest backend.
+#
+# The router, the embedding model and the vector store are lazily created
+# singletons (clinical_rag.runtime): importing this module is cheap, and the
+# server warms them up in the background at start-up.
 import os
-from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
-
-# Load HuggingFace token from environment variable
-# Set your token: export HUGGINGFACEHUB_API_TOKEN=hf_your_token_here
-if not os.environ.get("HUGGINGFACEHUB_API_TOKEN"):
-    print("⚠️ Warning: HUGGINGFACEHUB_API_TOKEN not set. Please set it in your environment.")
-
-# Gemma 27B for generation - optimized for conversational responses
-llm = HuggingFaceEndpoint(
-    repo_id="google/gemma-3-27b-it",
-    temperature=0.4,
-    max_new_tokens=4096,  # Increased for longer, more detailed responses
+from clinical_rag.runtime import (
+    get_index,
+    get_llm_router,
+    get_retrieval_engine,
+    is_loaded,
+    singleton,
+    STARTUP_TIMINGS,
+    warm_up,
 )
-model = ChatHuggingFace(llm=llm)
-print("✅ LLM initialized: Gemma 27B")
 
 
 # In[5]:
@@ -70,246 +74,35 @@ print("✅ LLM initialized: Gemma 27B")
 # ============================================================================
 # CELL 3: Setup Embeddings (all-MiniLM-L6-v2 - lightweight & fast)
 # ============================================================================
-from langchain_huggingface import HuggingFaceEmbeddings
-
 # all-MiniLM-L6-v2: 384-dimensional embeddings, optimized for semantic similarity
-# Much faster than Gemma 300M while maintaining good quality
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",
-    model_kwargs={'device': 'cpu'},
-    encode_kwargs={
-        'normalize_embeddings': True,  # Normalize for cosine similarity
-        'batch_size': 64  # Larger batches for faster processing
-    }
-)
-
-# Test embedding
-test_embedding = embeddings.embed_query("test clinical trial data")
-print(f"✅ Embeddings initialized: all-MiniLM-L6-v2")
-print(f"   Embedding dimension: {len(test_embedding)}")
+# Much faster than Gemma 300M while maintaining good quality: get_embeddings().
+# Under python -m clinical_rag.serve --embedding-server the model lives in one
+# shared process (EMBEDDING_SERVER_ADDRESS) instead of one copy per worker.
 
 
 # In[6]:
 
 
 # ============================================================================
-# CELL 4: Load and Analyze RAG Documents
-# ============================================================================
-import json
-import os
-from collections import defaultdict
-from langchain_core.documents import Document
-
-# Document store paths with descriptions
-RAG_FILES = {
-    "rag_study_documents.jsonl": {
-        "description": "Study-level summaries (highest priority)",
-        "doc_type": "study_summary",
-        "priority": 1
-    },
-    "rag_cra_reports.jsonl": {
-        "description": "CRA monitoring reports",
-        "doc_type": "cra_report",
-        "priority": 1
-    },
-    "rag_study_dqi_summaries.jsonl": {
-        "description": "Study DQI summaries",
-        "doc_type": "study_dqi",
-        "priority": 2
-    },
-    "rag_site_documents.jsonl": {
-        "description": "Site performance reports",
-        "doc_type": "site_summary",
-        "priority": 2
-    },
-    "rag_dqi_documents.jsonl": {
-        "description": "Subject DQI scores",
-        "doc_type": "subject_dqi",
-        "priority": 3
-    },
-    "rag_subject_documents.jsonl": {
-        "description": "Subject profiles",
-        "doc_type": "subject_profile",
-        "priority": 3
-    }
-}
-
-BASE_PATH = "consolidated_data"
-
-# Analyze document distribution
-print("📊 Analyzing RAG document distribution...\n")
-study_doc_counts = defaultdict(lambda: defaultdict(int))
-total_by_type = defaultdict(int)
-
-for filename, config in RAG_FILES.items():
-    filepath = os.path.join(BASE_PATH, filename)
-    if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    study = data.get('study', 'Unknown')
-                    study_doc_counts[study][config['doc_type']] += 1
-                    total_by_type[config['doc_type']] += 1
-                except:
-                    pass
-
-print("Document counts by type:")
-for doc_type, count in sorted(total_by_type.items(), key=lambda x: -x[1]):
-    print(f"  • {doc_type}: {count:,}")
-
-print("\n📈 Study distribution (top 5 by document count):")
-study_totals = {study: sum(counts.values()) for study, counts in study_doc_counts.items()}
-for study, total in sorted(study_totals.items(), key=lambda x: -x[1])[:5]:
-    print(f"  • {study}: {total:,} documents")
-
-print(f"\n⚠️  Data imbalance detected: Study 16 has {study_totals.get('Study 16', 0):,} docs vs Study 14 has {study_totals.get('Study 14', 0):,} docs")
-
-
-# In[7]:
-
-
-# ============================================================================
-# CELL 5: Load Documents with Stratified Sampling Strategy
-# ============================================================================
-# Strategy to handle data imbalance:
-# 1. Load ALL high-priority documents (study summaries, CRA reports) - they're few
-# 2. Load ALL site documents - moderate count
-# 3. Sample subject-level documents proportionally (max per study)
-
-import random
-from collections import defaultdict
-
-MAX_SUBJECTS_PER_STUDY = 100  # Cap subject docs per study to prevent dominance
-
-documents = []
-doc_counts = defaultdict(int)
-
-# Load data dictionary first (always include)
-data_dict_path = os.path.join(BASE_PATH, "rag_data_dictionary.md")
-if os.path.exists(data_dict_path):
-    with open(data_dict_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-        documents.append(Document(
-            page_content=content,
-            metadata={
-                "source": "rag_data_dictionary.md",
-                "doc_type": "data_dictionary",
-                "study": "ALL",
-                "priority": 0
-            }
-        ))
-        doc_counts["data_dictionary"] += 1
-
-# Load documents by priority
-for filename, config in RAG_FILES.items():
-    filepath = os.path.join(BASE_PATH, filename)
-    if not os.path.exists(filepath):
-        continue
-
-    # For subject-level docs, we'll sample
-    if config['priority'] == 3:  # Subject-level docs
-        # First pass: group by study
-        study_docs = defaultdict(list)
-        with open(filepath, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    content = data.get('content') or data.get('document', '')
-                    if not content:
-                        continue
-                    study = data.get('study', 'Unknown')
-                    study_docs[study].append((data, content))
-                except:
-                    pass
-
-        # Sample from each study
-        for study, docs in study_docs.items():
-            # Prioritize high-risk subjects
-            sorted_docs = sorted(docs, key=lambda x: -x[0].get('total_issues', 0))
-            sampled = sorted_docs[:MAX_SUBJECTS_PER_STUDY]
-
-            for data, content in sampled:
-                metadata = {k: v for k, v in data.items() if k not in ['content', 'document']}
-                metadata['source'] = filename
-                metadata['doc_type'] = config['doc_type']
-                metadata['priority'] = config['priority']
-                documents.append(Document(page_content=content, metadata=metadata))
-                doc_counts[config['doc_type']] += 1
-    else:
-        # Load all non-subject documents
-        with open(filepath, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    content = data.get('content') or data.get('document', '')
-                    if not content:
-                        continue
-
-                    metadata = {k: v for k, v in data.items() if k not in ['content', 'document']}
-                    metadata['source'] = filename
-                    metadata['doc_type'] = config['doc_type']
-                    metadata['priority'] = config['priority']
-                    documents.append(Document(page_content=content, metadata=metadata))
-                    doc_counts[config['doc_type']] += 1
-                except:
-                    pass
-
-print(f"📚 Loaded {len(documents):,} documents with stratified sampling:\n")
-for doc_type, count in sorted(doc_counts.items(), key=lambda x: -x[1]):
-    print(f"  • {doc_type}: {count:,}")
-
-# Verify study balance after sampling
-study_counts = defaultdict(int)
-for doc in documents:
-    study_counts[doc.metadata.get('study', 'Unknown')] += 1
-
-print(f"\n📊 Study distribution after sampling (top 5):")
-for study, count in sorted(study_counts.items(), key=lambda x: -x[1])[:5]:
-    print(f"  • {study}: {count} documents")
-
-
-# In[8]:
-
-
-# ============================================================================
-# CELL 6: Create FAISS Vector Store with Document Indexing
+# CELL 4-6: RAG Documents and FAISS Vector Store
 # ============================================================================
-import faiss
-from langchain_community.docstore.in_memory import InMemoryDocstore
-from langchain_community.vectorstores import FAISS
-
-# Initialize FAISS index
-embedding_dim = len(embeddings.embed_query("hello world"))
-index = faiss.IndexFlatL2(embedding_dim)
-
-vector_store = FAISS(
-    embedding_function=embeddings,
-    index=index,
-    docstore=InMemoryDocstore(),
-    index_to_docstore_id={},
-)
-
-# Add documents in batches
-print(f"🔄 Adding {len(documents):,} documents to FAISS vector store...")
-
-batch_size = 500  # Optimized for MiniLM
-total_docs = len(documents)
-
-for i in range(0, total_docs, batch_size):
-    batch = documents[i:i+batch_size]
-    vector_store.add_documents(batch)
-
-    current = min(i + batch_size, total_docs)
-    pct = (current / total_docs) * 100
-    print(f"  Progress: {current:,}/{total_docs:,} ({pct:.1f}%)", end='\r')
-
-print(f"\n✅ Vector store created with {total_docs:,} documents")
-
-# Save for future use
-VECTORSTORE_PATH = "faiss_index_optimized"
-vector_store.save_local(VECTORSTORE_PATH)
-print(f"💾 Saved to: {VECTORSTORE_PATH}/")
+# The documents (clinical_rag.corpus: all study/site/report documents, subject
+# documents sampled per study to handle the data imbalance) are indexed by the
+# build CLI, separately from serving:
+#
+#     python -m clinical_rag.build [--quantization int8]
+#
+# Study summaries, site reports and CRA reports are indexed per ## section
+# (clinical_rag.chunking): retrieval matches sections and the prompt gets only
+# those, under a one-line document header.
+# Each build is a versioned snapshot under faiss_index_optimized/ (index.faiss +
+# compact docstore/ + embeddings.npy + manifest.json), activated atomically;
+# get_index() loads the active one (INDEX_MMAP=1 memory-maps the docstore and
+# embeddings; the FAISS index is a per-process copy, VECTOR_QUANTIZATION
+# selects a compressed one) and swaps to a newly
+# published snapshot in the background without dropping requests.
+from clinical_rag.corpus import BASE_PATH
+from clinical_rag.runtime import VECTORSTORE_PATH
 
 
 # In[9]:
@@ -323,9 +116,12 @@ print(f"💾 Saved to: {VECTORSTORE_PATH}/")
 # 2. Use MMR for diversity across studies
 # 3. Apply post-retrieval re-ranking based on relevance + priority
 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from collections import defaultdict
+from clinical_rag.prompts import build_messages, estimate_tokens, select_profile
+
+# RetrievalEngine (get_retrieval_engine()) is shared with the Hugging Face
+# Space (huggingface-space/app.py)
+
 
 def advanced_retrieve(question: str, k: int = 15, study_filter: str = None):
     """
@@ -339,185 +135,57 @@ def advanced_retrieve(question: str, k: int = 15, study_filter: str = None):
     Returns:
         List of relevant documents with diversity across studies
     """
-    # Stage 1: Get more candidates using MMR for diversity
-    retriever = vector_store.as_retriever(
-        search_type="mmr",
-        search_kwargs={
-            "k": k * 3,  # Over-fetch for re-ranking
-            "fetch_k": k * 5,  # Fetch even more for MMR diversity
-            "lambda_mult": 0.7  # Balance relevance (1.0) vs diversity (0.0)
-        }
-    )
+    return get_retrieval_engine().retrieve(question, k=k, study_filter=study_filter)
 
-    candidates = retriever.invoke(question)
 
-    # Stage 2: Apply study filter if specified
-    if study_filter:
-        # Normalize study filter for matching
-        study_filter_normalized = study_filter.strip().lower()
-        filtered = [
-            doc for doc in candidates
-            if doc.metadata.get('study', '').lower().strip() == study_filter_normalized
-            or doc.metadata.get('study', '').lower().strip().replace('study ', '') == study_filter_normalized.replace('study ', '')
-        ]
-        if len(filtered) >= k // 2:
-            candidates = filtered
-
-    # Stage 3: Priority-aware re-ranking
-    # Score = base_score + priority_boost
-    def get_priority_score(doc):
-        priority = doc.metadata.get('priority', 3)
-        doc_type = doc.metadata.get('doc_type', '')
-
-        # Higher score = higher priority
-        priority_boost = {
-            0: 100,  # Data dictionary
-            1: 50,   # Study summaries, CRA reports
-            2: 25,   # Site docs, DQI summaries
-            3: 10    # Subject-level docs
-        }
+# In[10]:
 
-        return priority_boost.get(priority, 0)
-
-    # Sort by priority (stable sort preserves MMR ordering within priority)
-    candidates_sorted = sorted(candidates, key=get_priority_score, reverse=True)
-
-    # Stage 4: Ensure study diversity in final results
-    final_docs = []
-    study_count = defaultdict(int)
-    max_per_study = max(2, k // 5)  # At least 2 docs per study, but limit dominance
-
-    for doc in candidates_sorted:
-        study = doc.metadata.get('study', 'Unknown')
-        doc_type = doc.metadata.get('doc_type', '')
-
-        # Always include high-priority docs
-        if doc.metadata.get('priority', 3) <= 1:
-            final_docs.append(doc)
-            study_count[study] += 1
-        # For lower priority, enforce study diversity
-        elif study_count[study] < max_per_study:
-            final_docs.append(doc)
-            study_count[study] += 1
-
-        if len(final_docs) >= k:
-            break
-
-    # If we don't have enough, add remaining candidates
-    if len(final_docs) < k:
-        for doc in candidates_sorted:
-            if doc not in final_docs:
-                final_docs.append(doc)
-            if len(final_docs) >= k:
-                break
 
-    return final_docs[:k]
+# ============================================================================
+# CELL 8: RAG Query Function with Humanized Prompt
+# ============================================================================
 
-print("✅ Advanced retrieval function defined")
-print("   Features:")
-print("   • MMR for diversity across studies")
-print("   • Priority-aware re-ranking (study summaries > subjects)")
-print("   • Study balancing to prevent single-study dominance")
-print("   • Optional study filtering")
+# The prompt lives in clinical_rag.prompts: slim static instructions plus a
+# response profile (brief / standard / full) with its own max_tokens, laid out
+# so the static prefix comes first and backend prefix caching can apply.
+# Default profile: RESPONSE_PROFILE env var (standard).
 
 
-# In[10]:
+def generate_answer(context: str, question: str, chat_history: str, backend=None, profile=None):
+    """
+    Blocking LLM call (CLI, background report jobs).
 
+    Args:
+        profile: ResponseProfile (default: chosen from the question)
 
-# ============================================================================
-# CELL 8: RAG Query Function with Humanized Prompt
-# ============================================================================
+    Returns:
+        (answer, name of the backend that produced it)
+    """
+    profile = profile or select_profile(question)
+    return get_llm_router().generate(
+        build_messages(profile, context, question, chat_history),
+        question=question, backend=backend, max_tokens=profile.max_tokens,
+    )
 
-# Humanized, detailed prompt for clinical trial assistant
-RAG_PROMPT = ChatPromptTemplate.from_messages([
-    ("system", """You are an expert Clinical Trial Data Analyst and CRA (Clinical Research Associate) Assistant. 
-Your role is to help clinical research teams understand their trial data, identify issues, and prioritize actions.
-
-**IMPORTANT - Response Detail Level:**
-- By DEFAULT, always provide COMPREHENSIVE, DETAILED, and THOROUGH responses
-- Include extensive explanations, context, and supporting data
-- Only provide brief/concise responses if the user EXPLICITLY asks for:
-  - "brief", "short", "concise", "quick", "summary only", "just tell me", "in short", "TL;DR"
-- When in doubt, err on the side of MORE detail, not less
-
-**Your Communication Style:**
-- Be conversational yet professional
-- Provide thorough, detailed explanations with full context
-- Use clinical research terminology appropriately
-- Highlight concerning patterns and offer deep insights
-- Be proactive in identifying potential issues and their root causes
-- Include relevant statistics, percentages, and comparisons
-- Explain the "why" behind findings, not just the "what"
-
-**Response Structure (use ALL sections for detailed responses):**
-
-## Summary
-A comprehensive overview of your key findings (3-5 sentences covering the main points).
-
-## Detailed Analysis
-Provide an EXTENSIVE analysis of the data. Explain:
-- What the data shows with specific numbers and metrics
-- Why it matters for the clinical trial and patient safety
-- Any patterns, trends, anomalies, or correlations you notice
-- Comparisons across studies/sites/time periods if relevant
-- Statistical context and benchmarks
-- Potential root causes for issues identified
-- Impact assessment of findings
-
-## Key Findings
-• Bullet point ALL important discoveries (aim for 5-10 points)
-• Include specific numbers, percentages, and metrics
-• Highlight critical and concerning issues
-• Note any positive trends or improvements
-• Compare to benchmarks or other studies when possible
-
-## Recommended Actions
-Prioritized list of actions the CRA team should take:
-1. **Immediate actions** (safety/critical issues) - with specific steps
-2. **Short-term actions** (data quality within 1-2 weeks) - with clear deliverables
-3. **Medium-term actions** (process improvements) - with expected outcomes
-4. **Monitoring recommendations** - ongoing surveillance needs
-
-## Sources Referenced
-List the specific documents and studies that informed your analysis with document types.
-
-**Conversation Memory:**
-You have access to recent conversation history below. Use this context to:
-- Understand ongoing discussions and follow-up questions
-- Maintain consistency with previous responses
-- Build upon previously discussed topics
-- Reference earlier findings when relevant
-
-{chat_history}
-
-**Important Guidelines:**
-- Only use information from the provided context
-- If information is not available, clearly state this and suggest what data would help
-- Be specific with numbers, percentages, and study names
-- If asked about a specific study, focus on that study but provide cross-study context when relevant
-- When providing recommendations, make them actionable and specific
-
----
-**Context (Clinical Trial Data):**
-{context}"""),
-    ("human", "{question}")
-])
+
+async def agenerate_answer(context: str, question: str, chat_history: str, backend=None, profile=None):
+    """LLM call for async endpoints; does not block the event loop."""
+    profile = profile or select_profile(question)
+    messages = build_messages(profile, context, question, chat_history)
+    with span("llm", profile=profile.name, max_tokens=profile.max_tokens,
+              prompt_tokens=sum(estimate_tokens(m["content"]) for m in messages)) as s:
+        answer, backend_name = await get_llm_router().agenerate(
+            messages, question=question, backend=backend, max_tokens=profile.max_tokens,
+        )
+        s.update(backend=backend_name, output_tokens=estimate_tokens(answer))
+    return answer, backend_name
 
 def format_docs_with_metadata(docs):
     """Format documents with source information for better context."""
-    formatted = []
-    for i, doc in enumerate(docs, 1):
-        source = doc.metadata.get('source', 'Unknown')
-        study = doc.metadata.get('study', 'Unknown')
-        doc_type = doc.metadata.get('doc_type', 'Unknown')
-
-        header = f"[Document {i} | {doc_type} | {study}]"
-        formatted.append(f"{header}\n{doc.page_content}")
+    return get_retrieval_engine().format_context(docs)
 
-    return "\n\n---\n\n".join(formatted)
 
-
-def ask(question: str, study_filter: str = None, k: int = 12, verbose: bool = True):
+def ask(question: str, study_filter: str = None, k: int = 12, verbose: bool = True, profile: str = None):
     """
     Ask a question about clinical trial data using RAG.
 
@@ -526,11 +194,13 @@ def ask(question: str, study_filter: str = None, k: int = 12, verbose: bool = Tr
         study_filter: Optional - filter to a specific study (e.g., "Study 10")
         k: Number of documents to retrieve (default: 12)
         verbose: Whether to print sources (default: True)
+        profile: Optional - "brief", "standard" or "full" (default: from the question)
 
     Examples:
         ask("What are the main issues across all studies?")
         ask("What's the status of Study 16?", study_filter="Study 16")
         ask("Which sites have the most critical subjects?")
+        ask("Full CRA report for Study 10", profile="full")
     """
     if verbose:
         print("=" * 80)
@@ -539,8 +209,11 @@ def ask(question: str, study_filter: str = None, k: int = 12, verbose: bool = Tr
             print(f"📁 Study Filter: {study_filter}")
         print("=" * 80 + "\n")
 
+    # Pick the LLM backend first: small local models get fewer documents
+    backend = get_llm_router().select(question, study_filter)
+
     # Retrieve relevant documents
-    docs = advanced_retrieve(question, k=k, study_filter=study_filter)
+    docs = advanced_retrieve(question, k=backend.limit_k(k), study_filter=study_filter)
 
     if not docs:
         print("❌ No relevant documents found.")
@@ -550,15 +223,17 @@ def ask(question: str, study_filter: str = None, k: int = 12, verbose: bool = Tr
     context = format_docs_with_metadata(docs)
 
     # Generate response (no chat history for CLI function)
-    chain = RAG_PROMPT | model | StrOutputParser()
-
-    response = chain.invoke({
-        "context": context,
-        "question": question,
-        "chat_history": "**Previous Conversation:** None (this is a new conversation)"
-    })
+    response, backend_name = generate_answer(
+        context,
+        question,
+        "**Previous Conversation:** None (this is a new conversation)",
+        backend=backend,
+        profile=select_profile(question, profile),
+    )
 
     print(response)
+    if verbose:
+        print(f"\n🤖 Answered by: {backend_name}")
 
     if verbose:
         print("\n" + "-" * 80)
@@ -579,47 +254,18 @@ def ask(question: str, study_filter: str = None, k: int = 12, verbose: bool = Tr
             study_str = ", ".join(f"{s}({c})" for s, c in study_counts.items())
             print(f"  • {doc_type}: {study_str}")
 
-print("✅ RAG Query function 'ask()' is ready!")
-print("\nUsage examples:")
-print('  ask("What are the critical issues across all studies?")')
-print('  ask("Tell me about Study 10", study_filter="Study 10")')
-print('  ask("Which studies have the worst data quality?")')
-
-
-# In[11]:
-
-
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 
 
 # In[12]:
 
 
 # ============================================================================
-# CELL 9: Alternative - Load Existing Vector Store (Skip Cells 4-6)
+# CELL 9: Load the Vector Store Now (optional)
 # ============================================================================
-# If you've already created the vector store, use this cell to load it directly
+# Everything loads on first use; run this to pay the start-up cost up front.
+# Older pickle-based indexes: python -m clinical_rag.docstore faiss_index_optimized
 
-# Uncomment the following to load an existing vector store:
-"""
-from langchain_community.vectorstores import FAISS
-
-VECTORSTORE_PATH = "faiss_index_optimized"
-# Or use the original: VECTORSTORE_PATH = "faiss_index"
-
-if os.path.exists(VECTORSTORE_PATH):
-    vector_store = FAISS.load_local(
-        VECTORSTORE_PATH,
-        embeddings,
-        allow_dangerous_deserialization=True,
-    )
-    print(f"✅ Loaded vector store from: {VECTORSTORE_PATH}")
-else:
-    print(f"❌ Vector store not found at: {VECTORSTORE_PATH}")
-    print("   Please run cells 4-6 to create it first.")
-"""
-print("ℹ️  This cell is for loading pre-built vector stores.")
+# warm_up()  # prints the per-singleton startup timings
 
 
 # ## 🎯 Query Your Clinical Trial Data
@@ -707,13 +353,18 @@ print("ℹ️  This cell is for loading pre-built vector stores.")
 # ============================================================================
 # This creates a backend server that the React frontend will connect to
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.routing import Match
 import json
+import time
 import asyncio
-from typing import Optional
+import threading
+from typing import Literal, Optional, Union
+from clinical_rag.llm_client import LLMError
+from clinical_rag.tracing import METRICS, annotate, current_trace, finish_trace, record_error, span, start_trace
 
 # Create FastAPI app
 app = FastAPI(
@@ -729,8 +380,82 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing"],
 )
 
+@app.on_event("startup")
+async def start_warm_up():
+    # Load the LLM router, embeddings and index in the background: the server
+    # accepts connections (and /health) at once, the first requests wait for
+    # the singletons they need. WARMUP_ON_STARTUP=0 leaves it to first use.
+    if os.environ.get("WARMUP_ON_STARTUP", "1") == "1":
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+# ============================================================================
+# Request Tracing
+# ============================================================================
+# Every /api/* request gets a trace: request id, per-stage spans (embed,
+# faiss_search, mmr, rerank, format_context, llm, sse_emit) and sizes (docs,
+# context tokens, output tokens). Finished traces feed /metrics (Prometheus)
+# and the local trace log (TRACE_LOG_PATH, TRACE_SAMPLE_RATE).
+
+def route_template(request: Request) -> str:
+    """Route path ("/api/studies/{study_id}") so metric labels stay bounded."""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    if not request.url.path.startswith("/api/"):
+        return await call_next(request)
+
+    trace, token = start_trace(route_template(request), request.headers.get("x-request-id"))
+    try:
+        response = await call_next(request)
+    except Exception as e:
+        trace.record_error(e)
+        finish_trace(trace, token, 500)
+        raise
+    response.headers["X-Request-ID"] = trace.request_id
+
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        # SSE: the trace ends when the last event has been sent
+        body = response.body_iterator
+
+        async def traced_body():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                finish_trace(trace, status_code=response.status_code)
+
+        response.body_iterator = traced_body()
+        return response
+
+    response.headers["Server-Timing"] = ", ".join(
+        f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in trace.stage_totals().items()
+    )
+    finish_trace(trace, token, response.status_code)
+    return response
+
+def error_payload(e: Exception) -> dict:
+    """Structured error: message, exception type, failing stage and request id."""
+    record_error(e)
+    trace = current_trace()
+    failed = [s["name"] for s in trace.spans if "error" in s] if trace else []
+    return {
+        "detail": str(e),
+        "error": type(e).__name__,
+        "stage": failed[-1] if failed else None,
+        "request_id": trace.request_id if trace else None,
+    }
+
+def error_response(e: Exception, status_code: int = 500) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content=error_payload(e))
+
 # Request/Response Models
 class ChatMessage(BaseModel):
     role: str  # 'user' or 'assistant'
@@ -740,11 +465,27 @@ class ChatRequest(BaseModel):
     question: str
     study_filter: Optional[str] = None
     k: int = 12
-    chat_history: Optional[list[ChatMessage]] = None  # Last N messages for memory
+    chat_history: Optional[list[ChatMessage]] = None  # Last N messages for memory (without session_id)
+    session_id: Optional[str] = Field(None, max_length=128)  # Server-side memory; replaces chat_history
+    response_profile: Optional[Literal["brief", "standard", "full"]] = None  # Default: from the question
 
 class ChatResponse(BaseModel):
     answer: str
     sources: list
+    backend: Optional[str] = None
+    session_id: Optional[str] = None
+    retrieval_mode: Optional[str] = None  # new / reuse / merge (follow-up handling)
+    degraded: bool = False  # Retrieval-only answer: no LLM slot was available
+
+class BatchQuestion(BaseModel):
+    question: str
+    study_filter: Optional[str] = None
+
+class BatchChatRequest(BaseModel):
+    questions: list[BatchQuestion] = Field(..., min_length=1, max_length=500)
+    k: int = 12
+    max_concurrency: int = Field(4, ge=1, le=16)  # Parallel LLM calls
+    response_profile: Optional[Literal["brief", "standard", "full"]] = None
 
 # Helper function to format chat history for the prompt
 def format_chat_history(chat_history: Optional[list[ChatMessage]], max_messages: int = 10) -> str:
@@ -767,6 +508,255 @@ def format_chat_history(chat_history: Optional[list[ChatMessage]], max_messages:
     
     return "\n".join(formatted)
 
+def extract_sources(docs) -> list:
+    """Unique (study, doc_type) sources of the retrieved documents."""
+    sources = []
+    seen = set()
+    for doc in docs:
+        source_info = {
+            "doc_type": doc.metadata.get("doc_type", "unknown"),
+            "study": doc.metadata.get("study", "Unknown"),
+            "source": doc.metadata.get("source", "Unknown")
+        }
+        source_key = f"{source_info['study']}_{source_info['doc_type']}"
+        if source_key not in seen:
+            sources.append(source_info)
+            seen.add(source_key)
+    return sources
+
+# ============================================================================
+# Server-side Conversation Memory
+# ============================================================================
+# With a session_id the server keeps the conversation: recent turns verbatim,
+# older ones folded into a running summary, history capped in tokens
+# (SESSION_* settings in env.example). Clients no longer resend chat_history.
+from clinical_rag.followup import FollowUpRetriever
+from clinical_rag.sessions import build_memory
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a CRA and a clinical "
+    "trial data assistant. Merge the new messages into the current summary. Keep study, "
+    "site and subject names, key numbers, conclusions and open questions. Plain text, "
+    "at most 150 words."
+)
+
+def summarize_conversation(previous: str, turns: list) -> str:
+    """Fold older turns into the session summary (fastest available backend)."""
+    transcript = "\n".join(
+        f"{'User' if role == 'user' else 'Assistant'}: {content[:1500]}" for role, content in turns
+    )
+    messages = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Current summary:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"},
+    ]
+    router = get_llm_router()
+    fast = router.for_complexity("simple")
+    summary, _ = router.generate(messages, backend=fast[0] if fast else None, max_tokens=300)
+    return summary
+
+conversation_memory = build_memory(summarize=summarize_conversation)
+
+# Per-session retrieval state: follow-ups ("what about its sites?") are
+# rewritten with the study under discussion and reuse or merge the previous
+# turn's documents instead of starting from scratch
+@singleton("followup_retriever")
+def get_followup_retriever():
+    followup = FollowUpRetriever(get_retrieval_engine())
+    # Remembered turns hold document positions of the snapshot they came from
+    get_index().on_swap(lambda active: followup.reset(active.value[1]))
+    return followup
+
+def retrieve_for_request(request: ChatRequest, k: int):
+    """
+    Returns:
+        (documents, info) where info["mode"] is new, reuse or merge
+    """
+    if request.session_id:
+        return get_followup_retriever().retrieve(request.session_id, request.question, k, request.study_filter)
+    return advanced_retrieve(request.question, k=k, study_filter=request.study_filter), {"mode": "new"}
+
+def resolve_chat_history(request: ChatRequest) -> str:
+    """Prompt history: the server-side session if session_id is set, else the client's chat_history."""
+    if request.session_id:
+        if request.chat_history:
+            # Restores a conversation the server does not know (e.g. after a restart)
+            conversation_memory.seed(
+                request.session_id,
+                [(m.role, m.content) for m in request.chat_history],
+                question=request.question,
+            )
+        return conversation_memory.history(request.session_id)
+    return format_chat_history(request.chat_history, max_messages=10)
+
+# ============================================================================
+# SQL over the Consolidated Data
+# ============================================================================
+# Read-only DuckDB engine over the subject tables and site/study summaries
+# (clinical_rag.sql_engine). Ranking and counting questions ("top 10 sites
+# by safety discrepancies in Study 16") get an exact result table prepended
+# to the retrieved context; /api/sql runs parameterized SELECTs.
+from clinical_rag.sql_engine import SqlEngine, SqlTool
+
+sql_engine = SqlEngine(
+    BASE_PATH,
+    max_rows=int(os.environ.get("SQL_MAX_ROWS", "1000")),
+    timeout_s=float(os.environ.get("SQL_TIMEOUT_SECONDS", "5")),
+)
+sql_tool = SqlTool(sql_engine)
+SQL_TOOL_ENABLED = os.environ.get("SQL_TOOL_ENABLED", "1") == "1"
+SQL_API_ENABLED = os.environ.get("SQL_API_ENABLED", "1") == "1"
+
+def sql_context(question: str, study_filter: Optional[str] = None) -> str:
+    """Exact figures for ranking/count questions, or "" (retrieved docs only)."""
+    if not SQL_TOOL_ENABLED:
+        return ""
+    try:
+        with span("sql_tool") as info:
+            block = sql_tool.context(question, study_filter)
+            info["matched"] = block is not None
+    except Exception as e:
+        print(f"⚠️ SQL tool failed: {e}")
+        return ""
+    return f"{block}\n\n---\n\n" if block else ""
+
+# ============================================================================
+# Background CRA Report Generation
+# ============================================================================
+# Per-study narrative reports are pre-generated after each data refresh
+# (detected via a content hash of consolidated_data/) and served from cache.
+from clinical_rag.data_version import compute_data_version
+from clinical_rag.reports import ReportScheduler, normalize_study_id
+from clinical_rag.serve import is_leader
+
+CRA_REPORT_QUESTION = (
+    "Generate a complete CRA monitoring report for {study}: data quality status, "
+    "issue breakdown, priority subjects and sites, and recommended actions."
+)
+
+def list_report_studies() -> list:
+    """Study names from the study summary documents."""
+    studies = []
+    with open(os.path.join(BASE_PATH, "rag_study_documents.jsonl"), "r", encoding="utf-8") as f:
+        for line in f:
+            study = json.loads(line).get("study")
+            if study:
+                studies.append(study)
+    return studies
+
+def generate_study_report(study: str) -> str:
+    """Narrative CRA report for one study via the RAG chain."""
+    question = CRA_REPORT_QUESTION.format(study=study)
+    # A full report needs whole documents, not just the best-matching sections
+    engine = get_retrieval_engine()
+    docs = engine.parent_documents(engine.retrieve_ids(question, k=12, study_filter=study))
+    answer, _ = generate_answer(
+        format_docs_with_metadata(docs), question, format_chat_history(None),
+        profile=select_profile(question, "full"),
+    )
+    return answer
+
+report_scheduler = ReportScheduler(
+    generate=generate_study_report,
+    list_studies=list_report_studies,
+    data_version=lambda: compute_data_version(BASE_PATH),
+    cache_dir=os.environ.get("REPORT_CACHE_DIR", "report_cache"),
+    max_workers=int(os.environ.get("REPORT_WORKERS", "3")),
+    requests_per_minute=float(os.environ.get("REPORT_REQUESTS_PER_MINUTE", "20")),
+    poll_interval=float(os.environ.get("REPORT_POLL_SECONDS", "300")),
+)
+
+def report_jobs_here() -> bool:
+    """
+    With several workers (clinical_rag.serve) only one of them runs the jobs;
+    the others serve the reports it writes to the shared cache.
+    """
+    if os.environ.get("REPORT_JOBS_ENABLED", "1") != "1":
+        return True  # Jobs off: refreshes are manual, in whichever worker gets them
+    return is_leader("report_jobs")
+
+@app.on_event("startup")
+async def start_report_jobs():
+    if os.environ.get("REPORT_JOBS_ENABLED", "1") == "1" and report_jobs_here():
+        report_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_report_jobs():
+    report_scheduler.stop()
+
+# ============================================================================
+# Admission Control for LLM Calls
+# ============================================================================
+# At most LLM_MAX_IN_FLIGHT LLM calls per worker (the deployment-wide cap is
+# that times the number of workers); further chat requests wait
+# in a queue (LLM_QUEUE_DEPTH, round-robin across clients, LLM_MAX_PER_CLIENT
+# each) for up to LLM_QUEUE_TIMEOUT_S. When that is exceeded the request gets
+# 429 + Retry-After, or with LLM_OVERLOAD_MODE=degrade an answer built from
+# the retrieved documents alone (clinical_rag.admission).
+import hmac
+from clinical_rag.admission import AdmissionController, Overloaded
+from clinical_rag.chunking import merge_sections
+
+llm_admission = AdmissionController.from_env()
+LLM_OVERLOAD_MODE = os.environ.get("LLM_OVERLOAD_MODE", "reject")
+RETRIEVAL_ONLY_BACKEND = "retrieval-only"
+
+# Callers sending "Authorization: Bearer <CLIENT_ID_TOKEN>" (e.g. a backend
+# fronting many users) may name the client to queue for in X-Client-ID
+CLIENT_ID_TOKEN = os.environ.get("CLIENT_ID_TOKEN", "")
+
+def client_key(request: Request) -> str:
+    """
+    Client identity for fair queueing: X-Client-ID from authenticated callers,
+    else the peer address. Behind a proxy uvicorn sets the peer from
+    X-Forwarded-For when the proxy is listed in FORWARDED_ALLOW_IPS; the
+    headers themselves are client-controlled and not read here.
+    """
+    client_id = request.headers.get("x-client-id")
+    if client_id and CLIENT_ID_TOKEN:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), CLIENT_ID_TOKEN.encode()):
+            return f"id:{client_id[:128]}"
+    return request.client.host if request.client else "unknown"
+
+def overloaded_response(e: Overloaded) -> JSONResponse:
+    response = JSONResponse(status_code=429, content={**error_payload(e), "retry_after": e.retry_after})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+def retrieval_only_answer(docs, max_docs: int = 5, max_chars: int = 600) -> str:
+    """Answer without the LLM: the top retrieved documents, trimmed."""
+    parts = [
+        "⚠️ The assistant is under heavy load, so this answer was not generated by the AI model. "
+        "These are the most relevant records for your question:"
+    ]
+    for doc in merge_sections(docs)[:max_docs]:
+        content = doc.page_content.strip()
+        if len(content) > max_chars:
+            content = content[:max_chars].rsplit(" ", 1)[0] + "..."
+        parts.append(f"**{doc.metadata.get('study', 'Unknown')} - {doc.metadata.get('doc_type', 'unknown')}**\n{content}")
+    return "\n\n".join(parts)
+
+async def admitted_answer(client: str, docs, context: str, question: str, chat_history: str, backend=None, profile=None):
+    """
+    ``agenerate_answer`` once an LLM slot is free.
+
+    Returns:
+        (answer, backend name, degraded); degraded answers come from
+        ``retrieval_only_answer`` (LLM_OVERLOAD_MODE=degrade), otherwise
+        ``Overloaded`` is raised
+    """
+    try:
+        async with llm_admission.slot(client):
+            answer, backend_name = await agenerate_answer(
+                context, question, chat_history, backend=backend, profile=profile,
+            )
+        return answer, backend_name, False
+    except Overloaded:
+        if LLM_OVERLOAD_MODE != "degrade":
+            raise
+        annotate(degraded=True)
+        return retrieval_only_answer(docs), RETRIEVAL_ONLY_BACKEND, True
+
 # ============================================================================
 # API Endpoints
 # ============================================================================
@@ -778,103 +768,137 @@ async def root():
 @app.get("/health")
 async def health():
     """Root-level health check for container orchestration."""
-    return {"status": "healthy", "vector_store_loaded": vector_store is not None}
+    return {
+        "status": "healthy",
+        "vector_store_loaded": is_loaded("index"),
+        "index": get_index().status() if is_loaded("index") else None,
+        "llm": get_llm_router().snapshot() if is_loaded("llm_router") else None,
+        "llm_admission": llm_admission.status(),
+        "startup_s": {name: round(seconds, 3) for name, seconds in STARTUP_TIMINGS.items()},
+    }
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "ok", "vector_store_loaded": vector_store is not None}
+    return {
+        "status": "ok",
+        "vector_store_loaded": is_loaded("index"),
+        "index_version": get_index().active.version if is_loaded("index") else None,
+    }
 
 # Non-streaming chat endpoint
 @app.post("/api/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """
     Process a question and return the AI-generated answer.
-    Supports conversation memory via chat_history parameter.
+    Supports conversation memory via session_id (server-side) or chat_history.
     """
+    client = client_key(http_request)
     try:
-        # Retrieve documents
-        docs = advanced_retrieve(
-            question=request.question,
-            k=request.k,
-            study_filter=request.study_filter
-        )
+        if LLM_OVERLOAD_MODE != "degrade":
+            # Fail fast before retrieval when the LLM queue is already full
+            llm_admission.check(client)
+        # Singletons may still be loading (warm-up): resolve them off the event loop
+        router = await asyncio.to_thread(get_llm_router)
+        backend = router.select(request.question, request.study_filter)
+
+        # Retrieve documents (follow-ups in a session reuse the previous turn's)
+        docs, retrieval_info = await asyncio.to_thread(retrieve_for_request, request, backend.limit_k(request.k))
 
         if not docs:
             raise HTTPException(status_code=404, detail="No relevant documents found")
 
-        # Format context
-        context = format_docs_with_metadata(docs)
+        # Format context (exact SQL figures first for ranking/count questions)
+        context = await asyncio.to_thread(sql_context, request.question, request.study_filter)
+        context += format_docs_with_metadata(docs)
+        annotate(docs=len(docs), context_chars=len(context), context_tokens=estimate_tokens(context),
+                 retrieval_mode=retrieval_info["mode"])
         
-        # Format chat history for memory (last 10 messages)
-        chat_history_str = format_chat_history(request.chat_history, max_messages=10)
-
-        # Generate response with memory
-        chain = RAG_PROMPT | model | StrOutputParser()
-        response = chain.invoke({
-            "context": context,
-            "question": request.question,
-            "chat_history": chat_history_str
-        })
-
-        # Extract sources
-        sources = []
-        seen = set()
-        for doc in docs:
-            source_info = {
-                "doc_type": doc.metadata.get("doc_type", "unknown"),
-                "study": doc.metadata.get("study", "Unknown"),
-                "source": doc.metadata.get("source", "Unknown")
-            }
-            source_key = f"{source_info['study']}_{source_info['doc_type']}"
-            if source_key not in seen:
-                sources.append(source_info)
-                seen.add(source_key)
+        # Conversation memory: server-side session or client chat_history
+        chat_history_str = resolve_chat_history(request)
 
-        return ChatResponse(answer=response, sources=sources)
+        # Generate response with memory (waits for an LLM slot)
+        response, backend_name, degraded = await admitted_answer(
+            client, docs, context, request.question, chat_history_str, backend=backend,
+            profile=select_profile(request.question, request.response_profile),
+        )
+        annotate(backend=backend_name, output_tokens=estimate_tokens(response))
+        if request.session_id and not degraded:
+            conversation_memory.record(request.session_id, request.question, response)
+
+        return ChatResponse(
+            answer=response,
+            sources=extract_sources(docs),
+            backend=backend_name,
+            session_id=request.session_id,
+            retrieval_mode=retrieval_info["mode"],
+            degraded=degraded,
+        )
 
+    except HTTPException:
+        raise
+    except Overloaded as e:
+        return overloaded_response(e)
+    except LLMError as e:
+        return error_response(e, status_code=503)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return error_response(e)
 
 # Streaming chat endpoint
 @app.post("/api/chat/stream")
-async def chat_stream(request: ChatRequest):
+async def chat_stream(request: ChatRequest, http_request: Request):
     """
     Stream the AI-generated response using Server-Sent Events.
-    Supports conversation memory via chat_history parameter.
+    Supports conversation memory via session_id (server-side) or chat_history.
     """
+    client = client_key(http_request)
+    if LLM_OVERLOAD_MODE != "degrade":
+        # Rejected here the client still gets a real 429 (not an error event)
+        try:
+            llm_admission.check(client)
+        except Overloaded as e:
+            return overloaded_response(e)
+
     async def generate():
         try:
-            # Retrieve documents
-            docs = advanced_retrieve(
-                question=request.question,
-                k=request.k,
-                study_filter=request.study_filter
-            )
+            # Singletons may still be loading (warm-up): resolve them off the event loop
+            router = await asyncio.to_thread(get_llm_router)
+            backend = router.select(request.question, request.study_filter)
+
+            # Retrieve documents (follow-ups in a session reuse the previous turn's)
+            docs, retrieval_info = await asyncio.to_thread(retrieve_for_request, request, backend.limit_k(request.k))
 
             if not docs:
                 yield f"data: {json.dumps({'error': 'No relevant documents found'})}\n\n"
                 return
 
-            # Format context
-            context = format_docs_with_metadata(docs)
+            # Format context (exact SQL figures first for ranking/count questions)
+            context = await asyncio.to_thread(sql_context, request.question, request.study_filter)
+            context += format_docs_with_metadata(docs)
+            annotate(docs=len(docs), context_chars=len(context), context_tokens=estimate_tokens(context),
+                     retrieval_mode=retrieval_info["mode"])
             
-            # Format chat history for memory (last 10 messages)
-            chat_history_str = format_chat_history(request.chat_history, max_messages=10)
+            # Conversation memory: server-side session or client chat_history
+            chat_history_str = resolve_chat_history(request)
 
             # Generate response with memory (non-streaming from HuggingFace, but we chunk it for SSE)
-            chain = RAG_PROMPT | model | StrOutputParser()
-            full_response = chain.invoke({
-                "context": context,
-                "question": request.question,
-                "chat_history": chat_history_str
-            })
+            full_response, backend_name, degraded = await admitted_answer(
+                client, docs, context, request.question, chat_history_str, backend=backend,
+                profile=select_profile(request.question, request.response_profile),
+            )
+            annotate(backend=backend_name, output_tokens=estimate_tokens(full_response))
+            if request.session_id and not degraded:
+                conversation_memory.record(request.session_id, request.question, full_response)
 
             # Stream response in chunks
             chunk_size = 50
-            for i in range(0, len(full_response), chunk_size):
-                chunk = full_response[i:i+chunk_size]
-                yield f"data: {json.dumps({'chunk': chunk, 'done': False})}\n\n"
-                await asyncio.sleep(0.02)  # Small delay for streaming effect
+            with span("sse_emit", chars=len(full_response)) as emit:
+                events = 0
+                for i in range(0, len(full_response), chunk_size):
+                    chunk = full_response[i:i+chunk_size]
+                    yield f"data: {json.dumps({'chunk': chunk, 'done': False})}\n\n"
+                    events += 1
+                    await asyncio.sleep(0.02)  # Small delay for streaming effect
+                emit["events"] = events
 
             # Send sources at the end
             sources = []
@@ -884,10 +908,24 @@ async def chat_stream(request: ChatRequest):
                     "study": doc.metadata.get("study", "Unknown")
                 })
 
-            yield f"data: {json.dumps({'done': True, 'sources': sources})}\n\n"
+            done_event = {
+                "done": True,
+                "sources": sources,
+                "backend": backend_name,
+                "session_id": request.session_id,
+                "retrieval_mode": retrieval_info["mode"],
+                "degraded": degraded,
+            }
+            trace = current_trace()
+            if trace:
+                done_event["request_id"] = trace.request_id
+            yield f"data: {json.dumps(done_event)}\n\n"
 
         except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            error = error_payload(e)
+            if isinstance(e, Overloaded):
+                error["retry_after"] = e.retry_after
+            yield f"data: {json.dumps({**error, 'error': error['detail'], 'error_type': error['error']})}\n\n"
 
     return StreamingResponse(
         generate(),
@@ -898,6 +936,161 @@ async def chat_stream(request: ChatRequest):
         }
     )
 
+# Batch chat endpoint
+@app.post("/api/chat/batch")
+async def chat_batch(request: BatchChatRequest, http_request: Request):
+    """
+    Answer many questions in one request (e.g. the weekly monitoring question
+    set for each study). Retrieval for all questions is batched - one encoder
+    call and one FAISS search - then LLM calls run with bounded concurrency.
+    Each answer is sent as a Server-Sent Event as soon as it completes; the
+    final event reports throughput in questions per minute. LLM calls share
+    the admission queue with chat requests, as one client.
+    """
+    client = client_key(http_request)
+
+    async def generate():
+        start = time.perf_counter()
+        questions = [item.question for item in request.questions]
+        study_filters = [item.study_filter for item in request.questions]
+
+        try:
+            # Singletons may still be loading (warm-up): resolve them off the event loop
+            engine = await asyncio.to_thread(get_retrieval_engine)
+            router = await asyncio.to_thread(get_llm_router)
+            all_docs = await asyncio.to_thread(engine.retrieve_batch, questions, request.k, study_filters)
+        except Exception as e:
+            error = error_payload(e)
+            yield f"data: {json.dumps({**error, 'error': error['detail'], 'error_type': error['error'], 'done': True})}\n\n"
+            return
+
+        retrieval_s = time.perf_counter() - start
+        yield f"data: {json.dumps({'retrieved': len(questions), 'retrieval_s': round(retrieval_s, 3)})}\n\n"
+
+        # More would only be turned away by the per-client admission limit
+        semaphore = asyncio.Semaphore(min(request.max_concurrency, llm_admission.max_per_client))
+
+        async def answer(index: int, item: BatchQuestion, docs: list) -> dict:
+            async with semaphore:
+                t0 = time.perf_counter()
+                result = {"index": index, "question": item.question, "study_filter": item.study_filter}
+                try:
+                    if not docs:
+                        raise ValueError("No relevant documents found")
+                    backend = router.select(item.question, item.study_filter)
+                    docs = docs[:backend.limit_k(len(docs))]
+                    context = await asyncio.to_thread(sql_context, item.question, item.study_filter)
+                    result["answer"], result["backend"], degraded = await admitted_answer(
+                        client, docs, context + format_docs_with_metadata(docs), item.question,
+                        format_chat_history(None), backend=backend,
+                        profile=select_profile(item.question, request.response_profile),
+                    )
+                    result["sources"] = extract_sources(docs)
+                    if degraded:
+                        result["degraded"] = True
+                except Overloaded as e:
+                    result["error"] = str(e)
+                    result["retry_after"] = e.retry_after
+                except Exception as e:
+                    result["error"] = str(e)
+                result["latency_s"] = round(time.perf_counter() - t0, 3)
+                return result
+
+        tasks = [
+            asyncio.create_task(answer(i, item, docs))
+            for i, (item, docs) in enumerate(zip(request.questions, all_docs))
+        ]
+        completed = failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if "error" in result:
+                    failed += 1
+                else:
+                    completed += 1
+                yield f"data: {json.dumps({**result, 'done': False})}\n\n"
+        finally:
+            # Client disconnected (generator closed or cancelled): stop the remaining LLM calls
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        elapsed = time.perf_counter() - start
+        summary = {
+            "done": True,
+            "completed": completed,
+            "failed": failed,
+            "retrieval_s": round(retrieval_s, 3),
+            "elapsed_s": round(elapsed, 3),
+            "questions_per_minute": round(len(questions) / elapsed * 60, 1) if elapsed else None,
+        }
+        yield f"data: {json.dumps(summary)}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        }
+    )
+
+# Metrics
+METRICS.gauge(
+    "rag_llm_backend_available", "1 if the LLM backend accepts calls (circuit breaker closed)",
+    lambda: {
+        (("backend", name),): float(info["available"])
+        for name, info in (get_llm_router().snapshot()["backends"].items() if is_loaded("llm_router") else ())
+    },
+)
+METRICS.gauge(
+    "rag_llm_in_flight", "LLM calls running and requests waiting for a slot",
+    lambda: {(("state", "running"),): llm_admission.in_flight, (("state", "queued"),): llm_admission.queued},
+)
+METRICS.gauge(
+    "rag_retrieval_cache_total", "Retrieval cache lookups by cache and outcome",
+    lambda: {
+        (("cache", key.split("_")[0]), ("outcome", key.split("_")[1])): value
+        for key, value in (get_retrieval_engine().cache_stats().items() if is_loaded("index") else ())
+    },
+)
+METRICS.gauge(
+    "rag_followup_turns", "Session turns by retrieval mode (new / reuse / merge)",
+    lambda: {
+        (("mode", mode),): count
+        for mode, count in (get_followup_retriever().stats().items() if is_loaded("followup_retriever") else ())
+    },
+)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of request, stage and size metrics."""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+# Conversation session endpoints
+@app.get("/api/sessions/{session_id}")
+async def get_session(session_id: str):
+    """Server-side memory of a conversation: running summary and recent turns."""
+    session = conversation_memory.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found")
+    return {
+        "session_id": session.session_id,
+        "summary": session.summary,
+        "summarized_messages": session.summarized_turns,
+        "recent": [{"role": role, "content": content} for role, content in session.turns],
+        "history_prompt": conversation_memory.history(session_id),
+    }
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Forget a conversation."""
+    if is_loaded("followup_retriever"):
+        get_followup_retriever().forget(session_id)
+    if not conversation_memory.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found")
+    return {"deleted": session_id}
+
 # Dashboard data endpoints
 @app.get("/api/dashboard")
 async def get_dashboard_data():
@@ -906,7 +1099,7 @@ async def get_dashboard_data():
         with open("consolidated_data/dashboard_api.json", "r") as f:
             return json.load(f)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return error_response(e)
 
 @app.get("/api/studies")
 async def get_studies():
@@ -916,7 +1109,7 @@ async def get_studies():
             data = json.load(f)
             return {"studies": data.get("studies", [])}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return error_response(e)
 
 @app.get("/api/studies/{study_id}")
 async def get_study_details(study_id: str):
@@ -938,7 +1131,49 @@ async def get_study_details(study_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return error_response(e)
+
+@app.get("/api/studies/{study_id}/report")
+async def get_study_report(study_id: str):
+    """
+    Pre-generated narrative CRA report for a study.
+    Returns 202 with the static template report while generation is pending.
+    """
+    report = await asyncio.to_thread(report_scheduler.get_report, study_id)
+    if report:
+        return report
+
+    study = normalize_study_id(study_id)
+    if study not in list_report_studies():
+        raise HTTPException(status_code=404, detail=f"Study {study_id} not found")
+
+    fallback = None
+    with open(os.path.join(BASE_PATH, "rag_cra_reports.jsonl"), "r", encoding="utf-8") as f:
+        for line in f:
+            doc = json.loads(line)
+            if doc.get("study") == study:
+                fallback = doc.get("document")
+                break
+
+    return JSONResponse(status_code=202, content={
+        "study": study,
+        "status": "pending" if report_scheduler.is_pending(study) else "not_generated",
+        "report": fallback,
+    })
+
+@app.get("/api/reports/status")
+async def get_report_status():
+    """Progress of background report generation for the current data version."""
+    return await asyncio.to_thread(report_scheduler.status)
+
+@app.post("/api/reports/refresh")
+async def refresh_reports(force: bool = False):
+    """Schedule report generation now (e.g. right after a data refresh)."""
+    if not report_scheduler.running and not report_jobs_here():
+        # Another worker generates the reports; scheduling here would duplicate the LLM calls
+        raise HTTPException(status_code=409, detail="Report jobs run in another worker, retry the request")
+    scheduled = await asyncio.to_thread(report_scheduler.refresh, force)
+    return {"scheduled": scheduled, **(await asyncio.to_thread(report_scheduler.status))}
 
 @app.get("/api/sites")
 async def get_sites():
@@ -957,7 +1192,7 @@ async def get_sites():
                 })
         return {"sites": sites}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return error_response(e)
 
 @app.get("/api/ml-results")
 async def get_ml_results():
@@ -1021,21 +1256,22 @@ async def get_ml_results():
             }
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return error_response(e)
 
 @app.get("/api/subjects")
 async def get_subjects():
     """Get all subjects with their status and predictions."""
     try:
-        import pandas as pd
         import numpy as np
+        from clinical_rag.columnar import load_table, sample_table
 
-        df = pd.read_csv("consolidated_data/all_subjects_full.csv")
-        total_count = len(df)
+        # Memory-mapped Arrow table (typed, categorical); falls back to Parquet/CSV
+        table = load_table("consolidated_data/all_subjects_full")
+        total_count = table.num_rows
 
-        # Sample 1000 subjects for performance
-        if len(df) > 1000:
-            df = df.sample(n=1000, random_state=42)
+        # Sample 1000 subjects for performance; only the sample leaves Arrow
+        df = sample_table(table, 1000, seed=42).to_pandas()
+        df = df.astype({col: object for col in df.select_dtypes("category").columns})
 
         # Replace NaN values with appropriate defaults to make JSON serializable
         df = df.fillna({
@@ -1080,19 +1316,123 @@ async def get_subjects():
             "study_distribution": study_dist
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return error_response(e)
 
-print("✅ FastAPI app created with endpoints:")
-print("   GET  /                     - Health check")
-print("   GET  /api/health           - API health status")
-print("   POST /api/chat             - Chat with RAG (non-streaming)")
-print("   POST /api/chat/stream      - Chat with RAG (streaming SSE)")
-print("   GET  /api/dashboard        - Dashboard KPIs")
-print("   GET  /api/studies          - List all studies")
-print("   GET  /api/studies/{id}     - Study details")
-print("   GET  /api/sites            - List all sites")
-print("   GET  /api/subjects         - Subject records with status")
-print("   GET  /api/ml-results       - ML model results & strategy")
+# ============================================================================
+# Analytics Cube
+# ============================================================================
+# Subject table pre-aggregated by Study/Site/Country/Region/SubjectStatus/
+# risk_category (clinical_rag.cube), built once per data version; any
+# group-by/filter combination is answered from it.
+from clinical_rag.cube import CubeCache
+
+analytics_cube = CubeCache(
+    BASE_PATH,
+    cache_dir=os.environ.get("CUBE_CACHE_DIR", "cube_cache"),
+    check_interval=float(os.environ.get("CUBE_CHECK_SECONDS", "60")),
+)
+
+class AnalyticsQuery(BaseModel):
+    group_by: list[str] = Field(default_factory=list)  # Dimensions; empty = grand total
+    filters: dict[str, Union[str, list[str]]] = Field(default_factory=dict)  # Dimension -> value(s)
+    measures: Optional[list[str]] = None  # Default: all
+    sort_by: Optional[str] = None  # Default: first measure
+    descending: bool = True
+    limit: Optional[int] = Field(None, ge=1, le=10000)
+
+@app.get("/api/analytics/cube")
+async def get_analytics_cube():
+    """Dimensions (with their values) and measures available to /api/analytics/query."""
+    try:
+        cube = await asyncio.to_thread(analytics_cube.get)
+        return {**analytics_cube.status(), "dimensions": cube.members(), "measures": cube.measures}
+    except Exception as e:
+        return error_response(e)
+
+@app.post("/api/analytics/query")
+async def analytics_query(request: AnalyticsQuery):
+    """Group-by / filter aggregate over the analytics cube."""
+    try:
+        cube = await asyncio.to_thread(analytics_cube.get)
+        start = time.perf_counter()
+        with span("cube_query", group_by=",".join(request.group_by)) as info:
+            rows = cube.query(
+                group_by=request.group_by,
+                filters=request.filters,
+                measures=request.measures,
+                sort_by=request.sort_by,
+                descending=request.descending,
+                limit=request.limit,
+            )
+            info["rows"] = len(rows)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        return error_response(e)
+    return {
+        "data_version": cube.version,
+        "group_by": request.group_by,
+        "rows": rows,
+        "row_count": len(rows),
+        "query_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+
+# ============================================================================
+# SQL API
+# ============================================================================
+
+class SqlQuery(BaseModel):
+    sql: str = Field(..., max_length=20000)  # One SELECT; ? or $name placeholders
+    params: Optional[Union[list, dict]] = None  # Placeholder values
+    max_rows: Optional[int] = Field(None, ge=1)  # Capped at SQL_MAX_ROWS
+
+@app.get("/api/sql/tables")
+async def get_sql_tables():
+    """Tables and columns available to /api/sql."""
+    if not SQL_API_ENABLED:
+        raise HTTPException(status_code=404, detail="SQL API disabled")
+    try:
+        return {"tables": await asyncio.to_thread(sql_engine.tables), "data_version": sql_engine.version}
+    except Exception as e:
+        return error_response(e)
+
+@app.post("/api/sql")
+async def run_sql(request: SqlQuery):
+    """Read-only, parameterized SELECT over the consolidated data."""
+    if not SQL_API_ENABLED:
+        raise HTTPException(status_code=404, detail="SQL API disabled")
+    try:
+        with span("sql") as info:
+            result = await asyncio.to_thread(sql_engine.query, request.sql, request.params, request.max_rows)
+            info["rows"] = result["row_count"]
+        return result
+    except (ValueError, TimeoutError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        return error_response(e)
+
+def print_endpoints():
+    print("✅ FastAPI app created with endpoints:")
+    print("   GET  /                     - Health check")
+    print("   GET  /api/health           - API health status")
+    print("   GET  /metrics              - Prometheus metrics (stage timings, sizes)")
+    print("   POST /api/chat             - Chat with RAG (non-streaming)")
+    print("   POST /api/chat/stream      - Chat with RAG (streaming SSE)")
+    print("   POST /api/chat/batch       - Batch questions (streaming SSE)")
+    print("   GET  /api/sessions/{id}    - Server-side conversation memory")
+    print("   GET  /api/dashboard        - Dashboard KPIs")
+    print("   GET  /api/studies          - List all studies")
+    print("   GET  /api/studies/{id}     - Study details")
+    print("   GET  /api/studies/{id}/report - Pre-generated CRA report")
+    print("   GET  /api/reports/status   - Report generation status")
+    print("   POST /api/reports/refresh  - Regenerate reports")
+    print("   GET  /api/sites            - List all sites")
+    print("   GET  /api/subjects         - Subject records with status")
+    print("   GET  /api/ml-results       - ML model results & strategy")
+    print("   GET  /api/analytics/cube   - Analytics cube dimensions & measures")
+    print("   POST /api/analytics/query  - Group-by/filter aggregates from the cube")
+    print("   GET  /api/sql/tables       - SQL tables & columns")
+    print("   POST /api/sql              - Read-only parameterized SQL")
 
 
 # In[20]:
@@ -1104,30 +1444,20 @@ print("   GET  /api/ml-results       - ML model results & strategy")
 # Run this cell to start the backend server on port 8000
 # The React frontend will connect to this server
 
-import threading
 import uvicorn
+from clinical_rag.retrieval import persisted_index_exists
 
 def run_server():
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
 
 if __name__ == "__main__":
+    if not persisted_index_exists(VECTORSTORE_PATH):
+        # First run: build the index (python -m clinical_rag.build does the same)
+        from clinical_rag.build import build_index
+        build_index(VECTORSTORE_PATH, BASE_PATH, quantization=os.environ.get("VECTOR_QUANTIZATION"))
+    print_endpoints()
     print("🚀 FastAPI server starting on http://localhost:8000")
     print("📖 API docs available at http://localhost:8000/docs")
     # Run directly in main thread
     run_server()
 
-
-# In[ ]:
-
-
-# Test retrieval
-try:
-    if 'vector_store' in globals():
-        print(f"Vector store type: {type(vector_store)}")
-        docs = advanced_retrieve("test", k=1)
-        print(f"Retrieved {len(docs)} docs")
-    else:
-        print("vector_store is NOT defined")
-except Exception as e:
-    print(f"Error: {e}")
-
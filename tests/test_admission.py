@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from clinical_rag.admission import AdmissionController, Overloaded
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def hold(admission, client, release, log=None):
+    async with admission.slot(client):
+        if log is not None:
+            log.append(client)
+        await release.wait()
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_admits_immediately_below_limit():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=2)
+        async with admission.slot("a") as waited:
+            assert waited < 0.1
+            assert admission.status()["in_flight"] == 1
+        assert admission.status()["in_flight"] == 0
+        assert admission.status()["outcomes"] == {"admitted": 1}
+
+    run(scenario())
+
+
+def test_queue_full():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=1, max_queue=1)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(admission, client, release)) for client in ("a", "b")]
+        await settle()
+        assert admission.status()["queued"] == 1
+        with pytest.raises(Overloaded) as exc:
+            async with admission.slot("c"):
+                pass
+        assert exc.value.reason == "queue_full" and 1 <= exc.value.retry_after <= 60
+        release.set()
+        await asyncio.gather(*tasks)
+        assert admission.in_flight == 0 and admission.queued == 0
+
+    run(scenario())
+
+
+def test_client_limit():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=1, max_queue=5, max_per_client=1)
+        release = asyncio.Event()
+        first = asyncio.create_task(hold(admission, "a", release))
+        await settle()
+        with pytest.raises(Overloaded, match="client limit"):
+            admission.check("a")
+        admission.check("b")
+        second = asyncio.create_task(hold(admission, "b", release))
+        await settle()
+        release.set()
+        await asyncio.gather(first, second)
+        assert admission.status()["outcomes"] == {"client_limit": 1, "admitted": 2}
+
+    run(scenario())
+
+
+def test_queue_timeout():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=1, queue_timeout_s=0.05)
+        release = asyncio.Event()
+        first = asyncio.create_task(hold(admission, "a", release))
+        await settle()
+        with pytest.raises(Overloaded) as exc:
+            async with admission.slot("b"):
+                pass
+        assert exc.value.reason == "queue_timeout"
+        assert admission.queued == 0 and "b" not in admission._per_client
+        release.set()
+        await first
+        assert admission.in_flight == 0
+
+    run(scenario())
+
+
+def test_waiters_are_served_round_robin():
+    async def scenario():
+        admission = AdmissionController(max_in_flight=1, max_per_client=3)
+        release = asyncio.Event()
+        log = []
+        tasks = [asyncio.create_task(hold(admission, "a", release, log))]
+        await settle()
+        for client in ("a", "a", "b"):
+            tasks.append(asyncio.create_task(hold(admission, client, release, log)))
+            await settle()
+        release.set()
+        await asyncio.gather(*tasks)
+        assert log == ["a", "a", "b", "a"]
+
+    run(scenario())
@@ -0,0 +1,73 @@
+import pytest
+
+chunking = pytest.importorskip("clinical_rag.chunking")
+from langchain_core.documents import Document  # noqa: E402
+
+PADDING = "- " + "Subject 1 has several open queries that need follow-up. " * 6
+
+REPORT = f"""# CRA Monitoring Report
+**Report Date**: 2026-01-08
+
+---
+
+## 1. EXECUTIVE SUMMARY
+{PADDING}
+
+## 2. ISSUE BREAKDOWN
+{PADDING}
+
+## 3. RECOMMENDED ACTIONS
+{PADDING}
+"""
+
+
+def report(text: str = REPORT, doc_type: str = "cra_report") -> Document:
+    return Document(page_content=text, metadata={"id": "cra-10", "doc_type": doc_type, "study": "Study 10"})
+
+
+def test_split_sections_keeps_preamble_without_title():
+    sections = chunking.split_sections(REPORT)
+    assert [heading for heading, _ in sections] == [
+        "Overview", "1. EXECUTIVE SUMMARY", "2. ISSUE BREAKDOWN", "3. RECOMMENDED ACTIONS",
+    ]
+    overview = sections[0][1]
+    assert overview == "**Report Date**: 2026-01-08"
+    assert all("---" not in body for _, body in sections)
+
+
+def test_split_sections_without_headings():
+    assert chunking.split_sections("# Title\nplain text") == []
+
+
+def test_long_document_is_split_with_parent_metadata():
+    chunks = chunking.split_document(report())
+    # The one-line overview is folded into the first section
+    assert [c.metadata["section"] for c in chunks] == [
+        "Overview / 1. EXECUTIVE SUMMARY", "2. ISSUE BREAKDOWN", "3. RECOMMENDED ACTIONS",
+    ]
+    assert [c.metadata["id"] for c in chunks] == ["cra-10#0", "cra-10#1", "cra-10#2"]
+    assert {c.metadata["parent_id"] for c in chunks} == {"cra-10"}
+    assert all(c.metadata["section_count"] == 3 for c in chunks)
+    assert all(c.page_content.startswith("# CRA Monitoring Report | Study 10\n\n") for c in chunks)
+    assert "2026-01-08" in chunks[0].page_content
+
+
+def test_short_document_stays_whole():
+    short = report("# Site Report: Site 10\n\n## Site Information\n- Study 1\n\n## Issues\n- 57", "site_summary")
+    assert chunking.split_document(short) == [short]
+
+
+def test_other_doc_types_stay_whole():
+    subject = report(doc_type="subject")
+    assert chunking.split_document(subject) == [subject]
+
+
+def test_merge_sections_rebuilds_parent_in_order():
+    chunks = chunking.split_document(report())
+    other = Document(page_content="Study 3 summary", metadata={"doc_type": "study_summary"})
+    merged = chunking.merge_sections([chunks[2], other, chunks[0]])
+    assert merged[1] is other
+    parent = merged[0]
+    assert parent.metadata["id"] == "cra-10"
+    assert parent.page_content.count("# CRA Monitoring Report") == 1
+    assert parent.page_content.index("EXECUTIVE SUMMARY") < parent.page_content.index("RECOMMENDED ACTIONS")
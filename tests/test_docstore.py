@@ -0,0 +1,93 @@
+import os
+import pickle
+import threading
+
+import pytest
+
+docstore_module = pytest.importorskip("clinical_rag.docstore")
+from langchain_community.docstore.in_memory import InMemoryDocstore  # noqa: E402
+from langchain_core.documents import Document  # noqa: E402
+
+CompactDocstore = docstore_module.CompactDocstore
+
+DOCS = [
+    ("a", Document(page_content="Study 1 summary", metadata={"study": "Study 1", "doc_type": "study_summary",
+                                                             "priority": 1})),
+    ("b", Document(page_content="Site 7 — überfällige Visiten",
+                   metadata={"study": "Study 2", "doc_type": "site_summary", "priority": 2, "parent_id": "s7"})),
+    ("c", Document(page_content="", metadata={"study": "Study 2", "doc_type": "subject"})),
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    assert CompactDocstore.write(str(tmp_path), DOCS) == len(DOCS)
+    store = CompactDocstore(str(tmp_path))
+    yield store
+    store.close()
+
+
+def test_round_trip(store):
+    assert len(store) == 3
+    for idx, (doc_id, doc) in enumerate(DOCS):
+        assert store.doc_id(idx) == doc_id
+        assert store.get(idx).page_content == doc.page_content
+        assert store.get(idx).metadata == doc.metadata
+        assert store.search(doc_id).page_content == doc.page_content
+
+
+def test_missing_documents(store):
+    assert store.search("nope") == "ID nope not found."
+    with pytest.raises(KeyError):
+        store.get(99)
+
+
+def test_metadata_columns_and_parents(store):
+    priority, study, doc_type = store.metadata_columns()
+    assert priority == [1, 2, None]
+    assert study == ["Study 1", "Study 2", "Study 2"]
+    assert doc_type == ["study_summary", "site_summary", "subject"]
+    assert store.parent_ids() == {1: "s7"}
+
+
+def test_empty_store(tmp_path):
+    CompactDocstore.write(str(tmp_path), [])
+    store = CompactDocstore(str(tmp_path))
+    assert len(store) == 0 and store.metadata_columns() == ([], [], [])
+    store.close()
+
+
+def test_store_stays_readable_after_its_files_are_deleted(tmp_path):
+    CompactDocstore.write(str(tmp_path), DOCS)
+    store = CompactDocstore(str(tmp_path))
+    for name in os.listdir(tmp_path):
+        os.remove(tmp_path / name)
+    assert store.get(1).page_content == DOCS[1][1].page_content
+    store.close()
+
+
+def test_concurrent_reads(store):
+    errors = []
+
+    def read():
+        try:
+            for _ in range(200):
+                for idx in range(len(DOCS)):
+                    store.get(idx)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def test_convert_pickle_store_rejects_missing_ids(tmp_path):
+    docstore = InMemoryDocstore({"a": DOCS[0][1]})
+    with open(tmp_path / "index.pkl", "wb") as f:
+        pickle.dump((docstore, {0: "a", 1: "gone"}), f)
+    with pytest.raises(ValueError, match="gone"):
+        docstore_module.convert_pickle_store(str(tmp_path))
@@ -0,0 +1,40 @@
+import pytest
+
+followup = pytest.importorskip("clinical_rag.followup")
+is_follow_up = followup.is_follow_up
+
+
+@pytest.mark.parametrize("question", [
+    "And its sites?",
+    "what about the open queries?",
+    "How about missing pages?",
+    "Also the safety discrepancies",
+    "Which of its sites has the most missing pages?",
+    "How many subjects are in that study?",
+    "Show the issue breakdown for this site",
+    "Are those sites all in Germany?",
+    "What is the enrollment of study 3?",
+])
+def test_follow_up(question):
+    assert is_follow_up(question, "Study 3")
+
+
+@pytest.mark.parametrize("question", [
+    "Is it safe?",
+    "Where are the sites there?",
+    "List them",
+    "Data quality index",
+    "Top 5 sites",
+    "Which sites have the most open queries across all studies?",
+    "And what about all studies?",
+    "Compare open queries across regions",
+    "What are the risk categories for every study?",
+    "How many subjects are in Study 7?",
+    "Why do subjects have missing lab names?",
+])
+def test_not_follow_up(question):
+    assert not is_follow_up(question, "Study 3")
+
+
+def test_named_study_without_previous_study_is_new():
+    assert not is_follow_up("What about Study 3?", None)
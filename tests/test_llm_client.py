@@ -0,0 +1,186 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from clinical_rag.llm_client import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMClient,
+    LLMClientConfig,
+    LLMError,
+    LLMRequestError,
+)
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+OK_BODY = {"choices": [{"message": {"content": "hi"}}], "usage": {"prompt_tokens": 3, "completion_tokens": 1}}
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failures):
+        breaker.record_failure()
+
+
+def expire(breaker: CircuitBreaker):
+    """Pretend ``reset_s`` has passed since the breaker opened."""
+    breaker._opened_at = time.monotonic() - breaker.reset_s - 1
+
+
+# ----------------------------------------------------------------------
+# CircuitBreaker transitions
+# ----------------------------------------------------------------------
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failures=3, reset_s=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_failure_count():
+    breaker = CircuitBreaker(failures=2, reset_s=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_breaker_half_open_allows_a_single_trial():
+    breaker = CircuitBreaker(failures=1, reset_s=30)
+    open_breaker(breaker)
+    expire(breaker)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_trial_success_closes():
+    breaker = CircuitBreaker(failures=1, reset_s=30)
+    open_breaker(breaker)
+    expire(breaker)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_half_open_trial_failure_reopens():
+    breaker = CircuitBreaker(failures=1, reset_s=30)
+    open_breaker(breaker)
+    expire(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_released_trial_lets_the_next_call_try():
+    breaker = CircuitBreaker(failures=1, reset_s=30)
+    open_breaker(breaker)
+    expire(breaker)
+    assert breaker.allow()
+    breaker.release_trial()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+# ----------------------------------------------------------------------
+# LLMClient outcomes as seen by the breaker
+# ----------------------------------------------------------------------
+
+def make_client(handler, **config) -> LLMClient:
+    config.setdefault("backoff_base_s", 0.01)
+    client = LLMClient(LLMClientConfig(base_url="http://llm.test/v1", model="test", api_key=None, **config))
+    client._http = httpx.AsyncClient(base_url="http://llm.test/v1", transport=httpx.MockTransport(handler))
+    return client
+
+
+@pytest.fixture
+def clients():
+    created = []
+    yield lambda handler, **config: created.append(make_client(handler, **config)) or created[-1]
+    for client in created:
+        client.close()
+
+
+def test_malformed_response_is_an_llm_error_and_trial_is_settled(clients):
+    bodies = [{"unexpected": True}, OK_BODY]
+    client = clients(lambda request: httpx.Response(200, json=bodies.pop(0)),
+                     breaker_failures=1, max_retries=0)
+    open_breaker(client.breaker)
+    expire(client.breaker)
+
+    with pytest.raises(LLMError, match="Malformed response"):
+        client.chat_sync(MESSAGES)
+    assert client.breaker.state == "open"
+
+    expire(client.breaker)
+    assert client.chat_sync(MESSAGES) == "hi"
+    assert client.breaker.state == "closed"
+
+
+def test_client_error_does_not_count_as_upstream_failure(clients):
+    client = clients(lambda request: httpx.Response(400, text="prompt too long"), breaker_failures=1)
+    for _ in range(3):
+        with pytest.raises(LLMRequestError):
+            client.chat_sync(MESSAGES)
+    assert client.breaker.state == "closed"
+
+
+def test_client_error_during_trial_releases_it(clients):
+    client = clients(lambda request: httpx.Response(400, text="prompt too long"), breaker_failures=1)
+    open_breaker(client.breaker)
+    expire(client.breaker)
+    with pytest.raises(LLMRequestError):
+        client.chat_sync(MESSAGES)
+    assert client.breaker.allow()
+
+
+def test_cancelled_trial_is_released(clients):
+    async def slow(request):
+        await asyncio.sleep(30)
+        return httpx.Response(200, json=OK_BODY)
+
+    client = clients(slow, breaker_failures=1)
+    open_breaker(client.breaker)
+    expire(client.breaker)
+
+    future = asyncio.run_coroutine_threadsafe(client._chat(MESSAGES, None, None, None), client._loop)
+    deadline = time.monotonic() + 5
+    while not client.breaker._trial_in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    future.cancel()
+    while client.breaker._trial_in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert client.breaker.allow()
+
+
+def test_open_breaker_rejects_without_calling_upstream(clients):
+    calls = []
+    client = clients(lambda request: calls.append(1) or httpx.Response(200, json=OK_BODY), breaker_failures=1)
+    open_breaker(client.breaker)
+    with pytest.raises(CircuitOpenError):
+        client.chat_sync(MESSAGES)
+    assert not calls
+
+
+def test_retry_after_is_capped(clients):
+    responses = [httpx.Response(429, headers={"Retry-After": "3600"}), httpx.Response(200, json=OK_BODY)]
+    client = clients(lambda request: responses.pop(0), max_retry_after_s=0.05)
+    start = time.monotonic()
+    assert client.chat_sync(MESSAGES) == "hi"
+    assert time.monotonic() - start < 5
+
+
+def test_one_deadline_covers_all_retries(clients):
+    client = clients(lambda request: httpx.Response(503, text="busy"), max_retries=1000,
+                     backoff_base_s=0.05, backoff_max_s=0.05)
+    start = time.monotonic()
+    with pytest.raises(LLMError):
+        client.chat_sync(MESSAGES, timeout_s=0.5)
+    assert time.monotonic() - start < 2
@@ -0,0 +1,99 @@
+import os
+import time
+
+import pytest
+
+from clinical_rag.reports import ReportScheduler, normalize_study_id
+
+
+class Data:
+    """Data version and studies the scheduler sees; counts generate calls."""
+
+    def __init__(self):
+        self.version = "v1"
+        self.studies = ["Study 1", "Study 2"]
+        self.calls = []
+        self.version_checks = 0
+
+    def generate(self, study):
+        self.calls.append(study)
+        if study == "Study 3":
+            raise RuntimeError("LLM unavailable")
+        return f"Report for {study} at {self.version}"
+
+    def data_version(self):
+        self.version_checks += 1
+        return self.version
+
+
+@pytest.fixture
+def data():
+    return Data()
+
+
+@pytest.fixture
+def scheduler(data, tmp_path):
+    scheduler = ReportScheduler(data.generate, lambda: list(data.studies), data.data_version,
+                                cache_dir=str(tmp_path), requests_per_minute=0)
+    yield scheduler
+    scheduler.stop()
+
+
+def wait(scheduler, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while scheduler.status()["pending"]:
+        assert time.monotonic() < deadline, "reports still pending"
+        time.sleep(0.01)
+
+
+def test_normalize_study_id():
+    assert normalize_study_id("study 10") == normalize_study_id(" 10") == "Study 10"
+
+
+def test_refresh_generates_missing_reports(scheduler, data):
+    assert scheduler.refresh() == 2
+    wait(scheduler)
+    assert sorted(data.calls) == ["Study 1", "Study 2"]
+    report = scheduler.get_report("study 1")
+    assert report["report"] == "Report for Study 1 at v1" and report["data_version"] == "v1"
+    assert scheduler.status()["ready"] == 2
+
+
+def test_cached_reports_are_skipped_unless_forced(scheduler, data):
+    scheduler.refresh()
+    wait(scheduler)
+    assert scheduler.refresh() == 0
+    assert scheduler.refresh(force=True) == 2
+    wait(scheduler)
+    assert len(data.calls) == 4
+
+
+def test_new_data_version_regenerates_and_prunes(scheduler, data, tmp_path):
+    scheduler.refresh()
+    wait(scheduler)
+    data.version = "v2"
+    assert scheduler.refresh() == 2
+    wait(scheduler)
+    assert os.listdir(tmp_path) == ["v2"]
+    assert scheduler.get_report("Study 2")["report"] == "Report for Study 2 at v2"
+
+
+def test_failures_are_reported_and_retried(scheduler, data):
+    data.studies.append("Study 3")
+    scheduler.refresh()
+    wait(scheduler)
+    assert scheduler.status()["errors"] == {"Study 3": "LLM unavailable"}
+    assert scheduler.get_report("Study 3") is None
+    assert scheduler.refresh() == 1
+
+
+def test_serving_worker_caches_the_data_version(data, tmp_path):
+    serving = ReportScheduler(data.generate, lambda: list(data.studies), data.data_version,
+                              cache_dir=str(tmp_path), version_ttl=60)
+    for _ in range(5):
+        assert serving.current_version() == "v1"
+    assert data.version_checks == 1
+    serving.version_ttl = 0
+    data.version = "v2"
+    assert serving.current_version() == "v2"
+    serving.stop()
@@ -0,0 +1,47 @@
+import pytest
+
+retrieval = pytest.importorskip("clinical_rag.retrieval")
+RetrievalConfig = retrieval.RetrievalConfig
+rank_candidates = retrieval.rank_candidates
+
+
+def lookup(table):
+    """Doc id -> (priority, study) from a {doc_id: (priority, study)} table."""
+    return table.__getitem__
+
+
+def test_duplicates_are_dropped_and_priority_wins_over_mmr_rank():
+    meta = lookup({1: (3, "Study 1"), 2: (1, "Study 1"), 3: (0, "Study 2"), 4: (3, "Study 2")})
+    ranked = rank_candidates([1, 4, 1, 2, 3, 4], meta, k=10, config=RetrievalConfig())
+    assert ranked == [3, 2, 1, 4]
+
+
+def test_study_filter_normalizes_labels():
+    meta = lookup({1: (2, "Study 1"), 2: (2, "study 10"), 3: (2, " STUDY 10"), 4: (2, "Study 2")})
+    assert rank_candidates([1, 2, 3, 4], meta, k=4, config=RetrievalConfig(), study_filter="10") == [2, 3]
+
+
+def test_study_filter_is_ignored_when_too_few_documents_match():
+    meta = lookup({1: (2, "Study 1"), 2: (2, "Study 1"), 3: (2, "Study 1"), 4: (2, "Study 2")})
+    ranked = rank_candidates([1, 2, 3, 4], meta, k=4, config=RetrievalConfig(), study_filter="Study 3")
+    # Every study is kept (and balanced, Study 1's third document is backfill)
+    assert ranked == [1, 2, 4, 3]
+
+
+def test_studies_are_balanced_with_backfill():
+    # k=5: at most max(2, 5 // 5) = 2 subject docs per study before backfill
+    meta = lookup({1: (3, "A"), 2: (3, "A"), 3: (3, "A"), 4: (3, "A"), 5: (3, "B"), 6: (3, "C")})
+    assert rank_candidates([1, 2, 3, 4, 5, 6], meta, k=5, config=RetrievalConfig()) == [1, 2, 5, 6, 3]
+
+
+def test_high_priority_documents_bypass_study_balancing():
+    meta = lookup({1: (1, "A"), 2: (1, "A"), 3: (1, "A"), 4: (3, "B")})
+    assert rank_candidates([1, 2, 3, 4], meta, k=3, config=RetrievalConfig()) == [1, 2, 3]
+
+
+def test_sections_per_parent_are_capped():
+    meta = lookup({i: (1, "A") for i in range(1, 7)})
+    parents = {1: "cra-1", 2: "cra-1", 3: "cra-1", 4: "cra-1", 5: None, 6: "cra-2"}
+    config = RetrievalConfig(max_sections_per_parent=2)
+    ranked = rank_candidates([1, 2, 3, 4, 5, 6], meta, k=5, config=config, parent=parents.get)
+    assert ranked == [1, 2, 5, 6, 3]
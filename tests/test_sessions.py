@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from clinical_rag.sessions import ConversationMemory, MemorySessionStore, Session, SQLiteSessionStore
+
+
+def summarize(previous, turns):
+    return " | ".join(filter(None, [previous] + [content for _, content in turns]))
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemorySessionStore()
+    return SQLiteSessionStore(str(tmp_path / "sessions.sqlite"))
+
+
+def test_record_and_history(store):
+    memory = ConversationMemory(store, summarize=summarize, keep_recent_turns=3)
+    memory.record("s", "How many sites in Study 1?", "Twelve.")
+    session = memory.get("s")
+    assert session.turns == [("user", "How many sites in Study 1?"), ("assistant", "Twelve.")]
+    assert "Twelve." in memory.history("s")
+
+
+def test_compaction_folds_old_turns(store):
+    memory = ConversationMemory(store, summarize=summarize, keep_recent_turns=2)
+    for i in range(5):
+        memory.record("s", f"q{i}", f"a{i}")
+        memory.flush()
+    session = memory.get("s")
+    assert session.turns == [("user", "q3"), ("assistant", "a3"), ("user", "q4"), ("assistant", "a4")]
+    assert session.summarized_turns == 6
+    assert session.summary == "q0 | a0 | q1 | a1 | q2 | a2"
+    assert "Conversation summary" in memory.history("s")
+
+
+def test_summary_is_dropped_when_turns_were_folded_meanwhile(store):
+    memory = ConversationMemory(store, keep_recent_turns=1)
+    store.save(Session("s", turns=[("user", "q0"), ("assistant", "a0"), ("user", "q1"), ("assistant", "a1")]))
+
+    def slow_summary(previous, turns):
+        # Another worker folds the same turns while this summary is being written
+        def fold(current):
+            current.summary, current.turns, current.summarized_turns = "other", current.turns[2:], 2
+            return current
+        store.update("s", fold)
+        return "duplicate"
+
+    memory.summarize = slow_summary
+    memory._compact("s")
+    session = memory.get("s")
+    assert session.summary == "other"
+    assert session.turns == [("user", "q1"), ("assistant", "a1")]
+    assert session.summarized_turns == 2
+
+
+def test_seed_does_not_overwrite_existing_session(store):
+    memory = ConversationMemory(store)
+    memory.record("s", "q", "a")
+    memory.seed("s", [("user", "other"), ("assistant", "history")])
+    assert memory.get("s").turns == [("user", "q"), ("assistant", "a")]
+
+
+def test_seed_drops_the_pending_question(store):
+    memory = ConversationMemory(store)
+    memory.seed("s", [("user", "q0"), ("assistant", "a0"), ("user", "q1")], question="q1")
+    assert memory.get("s").turns == [("user", "q0"), ("assistant", "a0")]
+
+
+def test_workers_sharing_sqlite_do_not_lose_turns(tmp_path):
+    path = str(tmp_path / "sessions.sqlite")
+    workers = [ConversationMemory(SQLiteSessionStore(path), keep_recent_turns=1000) for _ in range(4)]
+
+    def talk(worker, n):
+        for i in range(25):
+            worker.record("shared", f"q{n}-{i}", f"a{n}-{i}")
+
+    threads = [threading.Thread(target=talk, args=(worker, n)) for n, worker in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(workers[0].get("shared").turns) == 4 * 25 * 2
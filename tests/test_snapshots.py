@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from clinical_rag.snapshots import (
+    CURRENT_FILE,
+    LEGACY_VERSION,
+    IndexManager,
+    active_version,
+    list_versions,
+    publish,
+    read_manifest,
+    snapshot_path,
+    staging_dir,
+)
+
+
+def build(root, data_hash: str, content: str = "index") -> str:
+    """Stage a fake build and publish it."""
+    staging = staging_dir(str(root), data_hash)
+    os.makedirs(staging, exist_ok=True)
+    with open(os.path.join(staging, "index.faiss"), "w") as f:
+        f.write(content)
+    return publish(str(root), staging, {"data_hash": data_hash}, keep=2)
+
+
+def read_index(path: str) -> str:
+    with open(os.path.join(path, "index.faiss")) as f:
+        return f.read()
+
+
+def test_no_index(tmp_path):
+    assert active_version(str(tmp_path)) is None
+    with pytest.raises(FileNotFoundError):
+        IndexManager(str(tmp_path), load=read_index, check_interval=0)
+
+
+def test_flat_layout_is_served_as_legacy(tmp_path):
+    (tmp_path / "index.faiss").write_text("old")
+    assert active_version(str(tmp_path)) == LEGACY_VERSION
+    assert snapshot_path(str(tmp_path)) == str(tmp_path)
+    assert IndexManager(str(tmp_path), load=read_index, check_interval=0).active.value == "old"
+
+
+def test_publish_activates_and_writes_manifest(tmp_path):
+    version = build(tmp_path, "abc")
+    assert version.endswith("-abc")
+    assert (tmp_path / CURRENT_FILE).read_text().strip() == version
+    manifest = read_manifest(snapshot_path(str(tmp_path)))
+    assert manifest["data_hash"] == "abc" and manifest["version"] == version
+    assert not os.path.exists(staging_dir(str(tmp_path), "abc"))
+
+
+def test_publish_prunes_old_snapshots(tmp_path, monkeypatch):
+    versions = []
+    for i in range(4):
+        monkeypatch.setattr("clinical_rag.snapshots.datetime", _FixedClock(i))
+        versions.append(build(tmp_path, f"h{i}"))
+    assert list_versions(str(tmp_path)) == versions[-2:]
+
+
+def test_manager_swaps_to_new_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr("clinical_rag.snapshots.datetime", _FixedClock(0))
+    first = build(tmp_path, "one", content="v1")
+    manager = IndexManager(str(tmp_path), load=read_index, check_interval=0)
+    swapped = []
+    manager.on_swap(lambda active: swapped.append(active.version))
+    assert manager.active.version == first and not manager.refresh()
+
+    monkeypatch.setattr("clinical_rag.snapshots.datetime", _FixedClock(1))
+    second = build(tmp_path, "two", content="v2")
+    assert manager.refresh()
+    assert manager.active.value == "v2" and swapped == [second]
+    assert manager.status()["swaps"] == 1
+
+
+def test_manager_keeps_serving_when_new_snapshot_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr("clinical_rag.snapshots.datetime", _FixedClock(0))
+    build(tmp_path, "one", content="v1")
+
+    def load(path):
+        if read_index(path) == "broken":
+            raise ValueError("corrupt index")
+        return read_index(path)
+
+    manager = IndexManager(str(tmp_path), load=load, check_interval=0)
+    monkeypatch.setattr("clinical_rag.snapshots.datetime", _FixedClock(1))
+    build(tmp_path, "two", content="broken")
+    assert not manager.refresh()
+    assert manager.active.value == "v1"
+    assert "corrupt index" in manager.status()["last_error"]
+
+
+class _FixedClock:
+    """Distinct build times without sleeping (versions sort by build time)."""
+
+    def __init__(self, seconds: int):
+        from datetime import datetime, timezone
+
+        self._now = datetime(2026, 1, 1, 0, 0, seconds, tzinfo=timezone.utc)
+
+    def now(self, tz=None):
+        return self._now
+
+    def fromtimestamp(self, *args, **kwargs):
+        from datetime import datetime
+
+        return datetime.fromtimestamp(*args, **kwargs)
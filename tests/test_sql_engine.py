@@ -0,0 +1,105 @@
+import json
+import threading
+
+import pytest
+
+sql_engine = pytest.importorskip("clinical_rag.sql_engine")
+import pyarrow as pa  # noqa: E402
+
+SUBJECTS = {
+    "Study": ["Study 1", "Study 1", "STUDY 2 ", "Study 2"],
+    "Site": ["Site 1", "Site 2", "Site 3", "Site 3"],
+    "Subject": ["S1", "S2", "S3", "S4"],
+    "missing_pages_count": [3, 0, 5, 1],
+    "risk_category": ["High", "Low", "Critical", "Critical"],
+}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    table = pa.table(SUBJECTS)
+    with pa.OSFile(str(tmp_path / "all_subjects_full.arrow"), "wb") as sink, \
+            pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    with open(tmp_path / "rag_study_documents.jsonl", "w", encoding="utf-8") as f:
+        for study in ("Study 1", "Study 2"):
+            f.write(json.dumps({"study": study, "total_subjects": 2, "document": "long text"}) + "\n")
+    (tmp_path / "outside.csv").write_text("a\n1\n")
+    return sql_engine.SqlEngine(str(tmp_path), max_rows=3)
+
+
+def test_select_with_parameters(engine):
+    result = engine.query(
+        "SELECT Site, sum(missing_pages_count) AS pages FROM subjects WHERE upper(trim(Study)) = $study "
+        "GROUP BY Site ORDER BY pages DESC",
+        {"study": "STUDY 1"},
+    )
+    assert result["columns"] == ["Site", "pages"]
+    assert result["rows"] == [["Site 1", 3], ["Site 2", 0]]
+    assert not result["truncated"] and result["data_version"] == engine.version
+
+
+def test_rows_are_capped(engine):
+    result = engine.query("SELECT Subject FROM subjects ORDER BY Subject")
+    assert result["row_count"] == 3 and result["truncated"]
+
+
+def test_document_text_is_not_loaded(engine):
+    assert {c["name"] for c in engine.tables()["studies"]} == {"study", "total_subjects"}
+
+
+@pytest.mark.parametrize("sql", [
+    "INSERT INTO subjects (Subject) VALUES ('S5')",
+    "DROP TABLE subjects",
+    "SELECT 1; DROP TABLE subjects",
+    "SET lock_configuration = false",
+    "SELEC 1",
+])
+def test_non_select_is_rejected(engine, sql):
+    with pytest.raises(ValueError):
+        engine.query(sql)
+    assert engine.query("SELECT count(*) FROM subjects")["rows"] == [[4]]
+
+
+def test_file_access_is_rejected(engine):
+    with pytest.raises(ValueError):
+        engine.query(f"SELECT * FROM read_csv_auto('{engine.base_path}/outside.csv')")
+
+
+def test_concurrent_queries(engine):
+    errors = []
+
+    def run():
+        try:
+            for _ in range(50):
+                engine.query("SELECT count(*) FROM subjects WHERE Study = ?", ["Study 1"])
+                with pytest.raises(ValueError):
+                    engine.query("DELETE FROM subjects")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def test_tool_plans_ranking_for_known_study(engine):
+    tool = sql_engine.SqlTool(engine)
+    assert tool.studies() == frozenset({"STUDY 1", "STUDY 2"})
+    call = tool.plan("Which 2 sites have the most missing pages in study 2?")
+    assert call.params == {"study": "STUDY 2", "limit": 2}
+    assert tool.run(call)["rows"] == [["Site 3", 2, 6]]
+
+
+def test_tool_skips_unknown_study_and_other_questions(engine):
+    tool = sql_engine.SqlTool(engine)
+    assert tool.plan("Which sites have the most missing pages in Study 9?") is None
+    assert tool.plan("Summarize the monitoring report") is None
+
+
+def test_tool_counts_subjects_by_risk(engine):
+    context = sql_engine.SqlTool(engine).context("How many critical risk subjects are there?")
+    assert "| 2 |" in context